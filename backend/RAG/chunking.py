@@ -0,0 +1,229 @@
+"""
+Découpage des documents markdown selon la hiérarchie des titres, en chunks mesurés en tokens.
+
+`RecursiveCharacterTextSplitter` coupe à taille fixe en caractères : les chunks chevauchent
+les sections, leur nombre de tokens varie du simple au double et un recouvrement de 300
+caractères gonfle le nombre de chunks d'environ 40 %. `MarkdownTokenSplitter` :
+    1. découpe la page en sections sur les titres `#`..`######` (hors blocs de code) ;
+    2. regroupe les sections consécutives tant que le chunk tient dans `chunk_tokens`
+       (tokens comptés avec l'encodage du modèle d'embedding) ;
+    3. découpe une section trop longue en phrases (paragraphes, puis lignes, puis phrases,
+       mots en dernier recours) ; seuls les chunks d'une même section se recouvrent, de
+       `chunk_overlap` tokens au plus (phrases entières, complétées par la fin de la phrase
+       précédente coupée entre deux mots) ;
+    4. ne termine jamais un chunk sur un titre seul.
+
+Chaque chunk est une tranche exacte du document (le recouvrement est donc un préfixe du
+chunk suivant, fusionné par `context.build_context`) et porte dans ses métadonnées
+`section_path` (« Titre > Section > Sous-section », titres communs à tout le chunk).
+"""
+
+import logging
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+SECTION_SEPARATOR = " > "
+
+_HEADING_RE = re.compile(r"(#{1,6})[ \t]+(.+?)[ \t#]*$")
+_FENCE_RE = re.compile(r"(```|~~~)")
+# Séparateurs de plus en plus fins pour une section plus longue qu'un chunk
+_SEPARATORS = [
+    re.compile(r"\n[ \t]*\n"),  # Paragraphes
+    re.compile(r"\n"),  # Lignes (listes, tableaux)
+    re.compile(r"(?<=[.!?…:;])\s+"),  # Phrases
+    re.compile(r"\s+"),  # Mots, seulement pour une phrase plus longue qu'un chunk
+]
+_WORD_LEVEL = len(_SEPARATORS) - 1
+_WORD_BOUNDARY_RE = _SEPARATORS[_WORD_LEVEL]
+
+
+def load_tokenizer(encoding_name: str) -> Tuple[str, Callable[[str], int]]:
+    """`(nom, compteur de tokens)` ; estimation à 4 caractères par token si tiktoken est indisponible."""
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding(encoding_name)
+        return encoding_name, lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception as e:  # tiktoken absent ou encodage non téléchargeable (hors-ligne)
+        logging.warning(f"[Chunking] Encodage tiktoken '{encoding_name}' indisponible ({e}), tokens estimés")
+        return "approx-4-chars", lambda text: len(text) // 4 + 1
+
+
+class _Unit:
+    """Tranche `[start, end)` du document, indivisible au moment du regroupement en chunks."""
+
+    __slots__ = ("start", "end", "tokens", "path", "section", "heading_only")
+
+    def __init__(self, start: int, end: int, tokens: int, path: Tuple[str, ...], section: Optional[int], heading_only: bool):
+        self.start = start
+        self.end = end
+        self.tokens = tokens
+        self.path = path
+        # Indice de la section découpée en phrases (None : section entière)
+        self.section = section
+        self.heading_only = heading_only
+
+
+def _is_heading_only(text: str) -> bool:
+    """Titre seul ou blanc : ne termine jamais un chunk."""
+    stripped = text.strip()
+    return not stripped or (stripped.startswith("#") and "\n" not in stripped)
+
+
+def _common_path(paths: Iterable[Tuple[str, ...]]) -> Tuple[str, ...]:
+    paths = list(paths)
+    common = paths[0]
+    for path in paths[1:]:
+        length = 0
+        while length < min(len(common), len(path)) and common[length] == path[length]:
+            length += 1
+        common = common[:length]
+    return common
+
+
+def markdown_sections(text: str) -> List[Tuple[int, int, Tuple[str, ...]]]:
+    """`(début, fin, chemin des titres)` de chaque section ; le titre ouvre sa section."""
+    sections = []
+    headings: List[Tuple[int, str]] = []
+    path: Tuple[str, ...] = ()
+    start = offset = 0
+    in_fence = False
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        if _FENCE_RE.match(stripped):
+            in_fence = not in_fence
+        elif not in_fence:
+            match = _HEADING_RE.match(stripped)
+            if match:
+                if offset > start:
+                    sections.append((start, offset, path))
+                level = len(match.group(1))
+                while headings and headings[-1][0] >= level:
+                    headings.pop()
+                headings.append((level, match.group(2).strip()))
+                path = tuple(title for _, title in headings)
+                start = offset
+        offset += len(line)
+    if len(text) > start:
+        sections.append((start, len(text), path))
+    return sections
+
+
+class MarkdownTokenSplitter:
+    """Découpage par sections markdown, chunks de `chunk_tokens` tokens au plus (voir le module)."""
+
+    def __init__(self, chunk_tokens: int, chunk_overlap: int = 0, encoding_name: str = "cl100k_base"):
+        if chunk_overlap >= chunk_tokens:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_tokens ({chunk_tokens})")
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+        self.tokenizer, self.count_tokens = load_tokenizer(encoding_name)
+
+    def settings(self) -> Dict[str, Any]:
+        """Paramètres enregistrés dans les manifestes d'indexation (un changement force une reconstruction)."""
+        return {
+            "chunker": "markdown_tokens",
+            "chunk_tokens": self.chunk_tokens,
+            "chunk_overlap_tokens": self.chunk_overlap,
+            "tokenizer": self.tokenizer,
+        }
+
+    def _pieces(self, text: str, start: int, end: int, level: int) -> List[Tuple[int, int, int]]:
+        """Tranches d'une section trop longue : découpée jusqu'aux phrases, aux mots si nécessaire."""
+        tokens = self.count_tokens(text[start:end])
+        if level > _WORD_LEVEL or (level == _WORD_LEVEL and tokens <= self.chunk_tokens):
+            return [(start, end, tokens)]
+        pieces = []
+        piece_start = start
+        # Chaque tranche garde son séparateur final : les tranches couvrent tout le document
+        for match in _SEPARATORS[level].finditer(text, start, end):
+            if match.end() >= end:
+                break
+            if match.end() > piece_start:
+                pieces.extend(self._pieces(text, piece_start, match.end(), level + 1))
+                piece_start = match.end()
+        pieces.extend(self._pieces(text, piece_start, end, level + 1))
+        return pieces
+
+    def _tail(self, text: str, unit: _Unit, budget: int) -> Optional[_Unit]:
+        """Fin de `unit` de `budget` tokens au plus, commençant au début d'un mot."""
+        tail = None
+        boundaries = [match.end() for match in _WORD_BOUNDARY_RE.finditer(text, unit.start, unit.end) if match.end() < unit.end]
+        for start in reversed(boundaries):
+            tokens = self.count_tokens(text[start:unit.end])
+            if tokens > budget:
+                break
+            tail = _Unit(start, unit.end, tokens, unit.path, unit.section, False)
+        return tail
+
+    def _overlap(self, text: str, previous_units: List[_Unit], unit: _Unit) -> List[_Unit]:
+        """Fin du chunk précédent reprise au début du suivant, au sein d'une même section découpée."""
+        overlap: List[_Unit] = []
+        budget = min(self.chunk_overlap, self.chunk_tokens - unit.tokens)
+        if unit.section is None or budget <= 0:
+            return overlap
+        for previous in reversed(previous_units):
+            if previous.section != unit.section:
+                break
+            if previous.tokens > budget:
+                tail = self._tail(text, previous, budget)
+                if tail is not None:
+                    overlap.insert(0, tail)
+                break
+            overlap.insert(0, previous)
+            budget -= previous.tokens
+        return overlap
+
+    def _units(self, text: str) -> List[_Unit]:
+        units = []
+        for index, (start, end, path) in enumerate(markdown_sections(text)):
+            section = text[start:end]
+            if not section.strip():
+                continue
+            tokens = self.count_tokens(section)
+            if tokens <= self.chunk_tokens:
+                units.append(_Unit(start, end, tokens, path, None, _is_heading_only(section)))
+                continue
+            for piece_start, piece_end, piece_tokens in self._pieces(text, start, end, 0):
+                units.append(_Unit(piece_start, piece_end, piece_tokens, path, index,
+                                   _is_heading_only(text[piece_start:piece_end])))
+        return units
+
+    def split_text_with_paths(self, text: str) -> List[Tuple[str, Tuple[str, ...]]]:
+        """`(texte du chunk, chemin des titres)` dans l'ordre du document."""
+        chunks: List[Tuple[str, Tuple[str, ...]]] = []
+
+        def emit(units: List[_Unit]) -> None:
+            chunk = text[units[0].start:units[-1].end].strip()
+            if chunk:
+                chunks.append((chunk, _common_path(unit.path for unit in units)))
+
+        current: List[_Unit] = []
+        current_tokens = 0
+        for unit in self._units(text):
+            if current and current_tokens + unit.tokens > self.chunk_tokens:
+                # Un titre sans contenu passe dans le chunk suivant
+                carried: List[_Unit] = []
+                while len(current) > 1 and current[-1].heading_only:
+                    carried.insert(0, current.pop())
+                emit(current)
+                current = carried or self._overlap(text, current, unit)
+                current_tokens = sum(previous.tokens for previous in current)
+            current.append(unit)
+            current_tokens += unit.tokens
+        if current:
+            emit(current)
+        return chunks
+
+    def split_text(self, text: str) -> List[str]:
+        return [chunk for chunk, _ in self.split_text_with_paths(text)]
+
+    def create_documents(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> List[Document]:
+        """Même interface que les splitters LangChain ; ajoute `section_path` aux métadonnées."""
+        documents = []
+        for i, text in enumerate(texts):
+            metadata = metadatas[i] if metadatas else {}
+            for chunk, path in self.split_text_with_paths(text):
+                documents.append(Document(page_content=chunk, metadata={**metadata, "section_path": SECTION_SEPARATOR.join(path)}))
+        return documents
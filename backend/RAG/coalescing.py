@@ -0,0 +1,332 @@
+"""
+Regroupement des requêtes identiques en cours d'exécution (« singleflight »).
+
+Quand la même question arrive plusieurs fois dans la même seconde (lien partagé dans
+un groupe de classe, double-clic…), une seule exécution du pipeline RAG est lancée :
+les requêtes suivantes attendent son résultat, ou rejouent son flux de tokens.
+
+Contrairement au cache sémantique, rien n'est conservé une fois l'exécution terminée.
+"""
+
+import asyncio
+import logging
+import re
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterator, List, Optional, Set, Tuple
+
+from . import metrics
+
+
+def normalize_question(question: str) -> str:
+    """Forme canonique utilisée dans la clé : casse et espaces ne distinguent pas deux questions."""
+    return re.sub(r"\s+", " ", question).strip().casefold()
+
+
+class _Broadcast:
+    """Tampon de chunks relu intégralement par chaque abonné.
+
+    Il n'y a pas de producteur dédié : l'abonné arrivé au bout du tampon tire le chunk
+    suivant du générateur dans son propre thread, puis le publie pour les autres. Avec
+    un seul client, le pipeline s'exécute donc directement dans sa requête.
+    """
+
+    def __init__(self, gen_fn: Callable[[], Iterator[str]], on_close: Callable[[], None]):
+        self._gen_fn = gen_fn
+        self._gen: Optional[Iterator[str]] = None
+        self._on_close = on_close
+        self._chunks: List[str] = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._pulling = False
+        self._cond = threading.Condition()
+        self.subscribers = 0  # modifié sous le verrou de RequestCoalescer
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def publish(self, chunk: str) -> None:
+        with self._cond:
+            self._chunks.append(chunk)
+            self._pulling = False
+            self._cond.notify_all()
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            self._done = True
+            self._error = error
+            self._pulling = False
+            self._cond.notify_all()
+
+    def cancel(self) -> None:
+        """Arrête le pipeline abandonné par tous ses abonnés (aucun n'est en train de le faire avancer)."""
+        self.close()
+        if self._gen is not None:
+            self._gen.close()
+
+    def subscribe(self) -> Iterator[str]:
+        position = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: position < len(self._chunks) or self._done or not self._pulling)
+                pending = self._chunks[position:]
+                done, error = self._done, self._error
+                pull = not pending and not done
+                if pull:
+                    self._pulling = True
+            if pull:
+                self._pull()
+                continue
+            # Les chunks sont émis hors du verrou : un client lent ne bloque pas les autres,
+            # l'abonné suivant arrivé au bout du tampon prend le relais
+            yield from pending
+            position += len(pending)
+            if done and position == len(self._chunks):
+                if error is not None:
+                    raise error
+                return
+
+    def _pull(self) -> None:
+        try:
+            if self._gen is None:
+                self._gen = iter(self._gen_fn())
+            chunk = next(self._gen)
+        except StopIteration:
+            self._finish(None)
+        except Exception as e:
+            logging.exception(f"Coalesced streaming pipeline failed: {e}")
+            self._finish(e)
+        except BaseException as e:
+            self._finish(e)
+            raise
+        else:
+            self.publish(chunk)
+
+    def _finish(self, error: Optional[BaseException]) -> None:
+        # Retirer la clé avant de clore : une requête arrivant ensuite relance le pipeline
+        self._on_close()
+        self.close(error)
+
+
+class _AsyncBroadcast:
+    """Équivalent asynchrone de `_Broadcast` (abonnés sur la même boucle).
+
+    Le chunk suivant est tiré dans une petite tâche, créée par l'abonné arrivé au bout du
+    tampon et attendue par tous : l'annulation d'un abonné (client déconnecté) n'interrompt
+    pas le générateur des autres. Toutes les opérations ont lieu sur la boucle : un simple
+    `asyncio.Event`, remplacé à chaque notification, suffit à réveiller les abonnés.
+    """
+
+    def __init__(self, gen_fn: Callable[[], AsyncIterator[str]], on_close: Callable[[], None]):
+        self._gen_fn = gen_fn
+        self._gen: Optional[AsyncIterator[str]] = None
+        self._on_close = on_close
+        self._chunks: List[str] = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+        self._pull: Optional["asyncio.Task"] = None
+        self.subscribers = 0
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def publish(self, chunk: str) -> None:
+        self._chunks.append(chunk)
+        self._notify()
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        self._done = True
+        self._error = error
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def cancel(self) -> Optional["asyncio.Task"]:
+        """Arrête le pipeline abandonné ; retourne la tâche de fermeture du générateur, s'il y en a une."""
+        self.close()
+        if self._pull is not None:
+            # L'annulation remonte dans le générateur, qui exécute ses blocs finally
+            self._pull.cancel()
+            return self._pull
+        if self._gen is not None:
+            return asyncio.ensure_future(self._gen.aclose())
+        return None
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        position = 0
+        while True:
+            if position < len(self._chunks):
+                pending = self._chunks[position:]
+                position += len(pending)
+                for chunk in pending:
+                    yield chunk
+            elif self._done:
+                if self._error is not None:
+                    raise self._error
+                return
+            else:
+                if self._pull is None:
+                    self._pull = asyncio.ensure_future(self._next())
+                await self._changed.wait()
+
+    async def _next(self) -> None:
+        try:
+            if self._gen is None:
+                self._gen = self._gen_fn()
+            chunk = await self._gen.__anext__()
+        except StopAsyncIteration:
+            self._finish(None)
+        except Exception as e:
+            logging.exception(f"Coalesced streaming pipeline failed: {e}")
+            self._finish(e)
+        except BaseException as e:
+            # Annulation (arrêt du serveur) : les abonnés ne doivent pas croire le flux complet
+            self._finish(e)
+            raise
+        else:
+            self.publish(chunk)
+        finally:
+            self._pull = None
+
+    def _finish(self, error: Optional[BaseException]) -> None:
+        self._on_close()
+        self.close(error)
+
+
+class RequestCoalescer:
+    """Partage une exécution entre les appels concurrents de même clé.
+
+    - `do` / `ado` : l'appelant qui ouvre la clé exécute la fonction, les autres
+      attendent et reçoivent le même résultat (ou la même exception).
+    - `stream` / `astream` : le générateur est consommé une seule fois, au rythme
+      des abonnés (sans thread ni tâche de fond) ; chaque abonné relit les chunks
+      depuis le début, ce qui permet de rejoindre un flux déjà commencé.
+
+    Le pipeline n'avance que pendant qu'au moins un client le lit, donc dans le créneau
+    d'admission de sa requête ; il est arrêté dès que le dernier client se déconnecte.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._acalls: Dict[Hashable, "asyncio.Task"] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self._astreams: Dict[Hashable, _AsyncBroadcast] = {}
+        self._closing: Set["asyncio.Task"] = set()
+        self.executions = 0
+        self.coalesced = 0
+
+    # ------------------------------------------------------------------
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Retourne `(résultat, partagé)` ; `partagé` vaut True pour les appels regroupés."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.executions += 1
+            else:
+                self.coalesced += 1
+                metrics.COALESCED_REQUESTS.inc()
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Variante asynchrone de `do`.
+
+        L'exécution tourne dans sa propre tâche, protégée par `shield` : l'annulation
+        de la requête initiale (client déconnecté) n'interrompt pas les autres.
+        """
+        task = self._acalls.get(key)
+        leader = task is None
+        if leader:
+            task = asyncio.ensure_future(fn())
+            self._acalls[key] = task
+            task.add_done_callback(lambda _: self._acalls.pop(key, None))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+            metrics.COALESCED_REQUESTS.inc()
+        return await asyncio.shield(task), not leader
+
+    def stream(self, key: Hashable, gen_fn: Callable[[], Iterator[str]]) -> Iterator[str]:
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is None:
+                broadcast = _Broadcast(gen_fn, lambda: self._forget(self._streams, key, broadcast))
+                self._streams[key] = broadcast
+                self.executions += 1
+            else:
+                self.coalesced += 1
+                metrics.COALESCED_REQUESTS.inc()
+                logging.info("Joining an in-flight streaming answer for an identical question.")
+            broadcast.subscribers += 1
+        try:
+            yield from broadcast.subscribe()
+        finally:
+            with self._lock:
+                broadcast.subscribers -= 1
+                abandoned = broadcast.subscribers == 0 and not broadcast.done
+                if abandoned:
+                    self._streams.pop(key, None)
+            if abandoned:
+                logging.info("All clients left a streaming answer: stopping its pipeline.")
+                broadcast.cancel()
+
+    async def astream(self, key: Hashable, gen_fn: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        broadcast = self._astreams.get(key)
+        if broadcast is None:
+            broadcast = _AsyncBroadcast(gen_fn, lambda: self._forget(self._astreams, key, broadcast))
+            self._astreams[key] = broadcast
+            self.executions += 1
+        else:
+            self.coalesced += 1
+            metrics.COALESCED_REQUESTS.inc()
+            logging.info("Joining an in-flight streaming answer for an identical question.")
+        broadcast.subscribers += 1
+        try:
+            async for chunk in broadcast.subscribe():
+                yield chunk
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.done:
+                self._forget(self._astreams, key, broadcast)
+                logging.info("All clients left a streaming answer: stopping its pipeline.")
+                closing = broadcast.cancel()
+                if closing is not None:
+                    # Référence forte jusqu'à la fin de la fermeture du générateur
+                    self._closing.add(closing)
+                    closing.add_done_callback(self._closing.discard)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls) + len(self._acalls) + len(self._streams) + len(self._astreams),
+        }
+
+    # ------------------------------------------------------------------
+    def _forget(self, streams: Dict[Hashable, Any], key: Hashable, broadcast: Any) -> None:
+        """Retire la clé si elle désigne encore ce flux (un flux annulé a pu être remplacé depuis)."""
+        with self._lock:
+            if streams.get(key) is broadcast:
+                del streams[key]
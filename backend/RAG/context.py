@@ -0,0 +1,170 @@
+"""
+Assemblage du contexte envoyé au LLM à partir des documents retrouvés.
+
+Les chunks adjacents d'une même section se recouvrent (`CHUNK_OVERLAP_TOKENS`) et
+les pages du site partagent des blocs entiers (menus, encarts) : concaténer les k
+documents tels quels répète une grande partie du contexte. `build_context` :
+    1. fusionne les chunks d'une même source qui se chevauchent (ou s'incluent) ;
+    2. retire les quasi-doublons entre sources (Jaccard des shingles de mots) ;
+    3. conserve l'ordre de pertinence du retrieval (reranker, RRF ou similarité) ;
+    4. s'arrête au budget de tokens du modèle (`context_window` dans AVAILABLE_MODELS).
+
+Les documents d'origine restent ceux renvoyés comme sources et évalués.
+"""
+
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from langchain_core.documents import Document
+
+from .config import Config
+from .llm import count_tokens
+
+_WORD_RE = re.compile(r"\w+")
+_SHINGLE_SIZE = 5
+
+
+def context_budget(model_id: str, max_tokens: Optional[int] = None) -> int:
+    """Tokens disponibles pour le contexte : fenêtre du modèle moins la réponse et le prompt, plafonnée."""
+    window = Config.AVAILABLE_MODELS.get(model_id, {}).get("context_window")
+    if not window:
+        return Config.CONTEXT_MAX_TOKENS
+    available = window - (max_tokens or Config.CONTEXT_ANSWER_RESERVE_TOKENS) - Config.CONTEXT_PROMPT_RESERVE_TOKENS
+    return max(0, min(Config.CONTEXT_MAX_TOKENS, available))
+
+
+def _source_key(doc: Document) -> str:
+    return doc.metadata.get("url") or doc.metadata.get("source") or doc.metadata.get("filename") or ""
+
+
+def _merge_overlap(first: str, second: str, min_overlap: int) -> Optional[str]:
+    """`first` suivi de `second` si la fin de l'un est le début de l'autre (ou si l'un contient l'autre)."""
+    if second in first:
+        return first
+    probe = second[:min_overlap]
+    if len(probe) < min_overlap:
+        return None
+    position = first.find(probe, max(0, len(first) - len(second)))
+    while position != -1:
+        if second.startswith(first[position:]):
+            return first + second[len(first) - position:]
+        position = first.find(probe, position + 1)
+    return None
+
+
+def _merge_source_chunks(texts: List[Tuple[int, str]], min_overlap: int) -> List[Tuple[str, List[int]]]:
+    """Fusionne les chunks d'une même source ; retourne `(texte, rangs des chunks fusionnés)`."""
+    blocks = [(text, [rank]) for rank, text in texts]
+    merged = True
+    while merged and len(blocks) > 1:
+        merged = False
+        for i in range(len(blocks)):
+            for j in range(len(blocks)):
+                if i == j:
+                    continue
+                text = _merge_overlap(blocks[i][0], blocks[j][0], min_overlap)
+                if text is not None:
+                    blocks[i] = (text, blocks[i][1] + blocks[j][1])
+                    del blocks[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return blocks
+
+
+def _shingles(text: str) -> Set[int]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= _SHINGLE_SIZE:
+        return {hash(tuple(words))}
+    return {hash(tuple(words[i:i + _SHINGLE_SIZE])) for i in range(len(words) - _SHINGLE_SIZE + 1)}
+
+
+def _is_near_duplicate(shingles: Set[int], kept: List[Set[int]], threshold: float) -> bool:
+    for other in kept:
+        intersection = len(shingles & other)
+        # Jaccard, ou bloc presque entièrement contenu dans un bloc déjà retenu
+        if intersection / len(shingles | other) >= threshold or intersection / len(shingles) >= threshold:
+            return True
+    return False
+
+
+def _truncate_to_budget(text: str, tokens: int, budget: int) -> str:
+    # Coupe proportionnelle (approximation), au dernier espace pour ne pas couper un mot
+    cut = text[:max(0, int(len(text) * budget / tokens))]
+    return cut.rsplit(" ", 1)[0] if " " in cut else cut
+
+
+def build_context(docs: List[Document], model_id: str, max_tokens: Optional[int] = None) -> Tuple[List[Document], Dict[str, Any]]:
+    """Documents de contexte dédupliqués et bornés au budget du modèle, et statistiques d'assemblage.
+
+    Chaque document retourné est un bloc (éventuellement issu de plusieurs chunks fusionnés)
+    dont les métadonnées sont celles du chunk le mieux classé, avec `merged_chunks`.
+    """
+    start = time.time()
+    budget = context_budget(model_id, max_tokens)
+    stats: Dict[str, Any] = {"chunks_in": len(docs), "budget_tokens": budget}
+
+    # 1. Fusion des chevauchements, source par source ; un bloc prend le rang de son meilleur chunk
+    by_source: Dict[str, List[Tuple[int, str]]] = {}
+    for rank, doc in enumerate(docs):
+        by_source.setdefault(_source_key(doc), []).append((rank, doc.page_content.strip()))
+    blocks = []
+    for source, texts in by_source.items():
+        if source:
+            blocks.extend(_merge_source_chunks(texts, Config.CONTEXT_MIN_OVERLAP_CHARS))
+        else:
+            blocks.extend((text, [rank]) for rank, text in texts)
+    blocks.sort(key=lambda block: min(block[1]))
+    stats["merged"] = len(docs) - len(blocks)
+
+    # 2-4. Quasi-doublons retirés, blocs ajoutés par pertinence jusqu'au budget
+    context_docs: List[Document] = []
+    kept_shingles: List[Set[int]] = []
+    used_tokens = 0
+    duplicates = 0
+    truncated = False
+    for text, ranks in blocks:
+        if not text:
+            continue
+        shingles = _shingles(text)
+        if _is_near_duplicate(shingles, kept_shingles, Config.CONTEXT_DEDUP_THRESHOLD):
+            duplicates += 1
+            continue
+        tokens = count_tokens(text, model_id)
+        if used_tokens + tokens > budget:
+            truncated = True
+            if context_docs:
+                break
+            # Le premier bloc dépasse à lui seul le budget : on le tronque
+            text = _truncate_to_budget(text, tokens, budget)
+            tokens = count_tokens(text, model_id)
+        best = docs[min(ranks)]
+        context_docs.append(Document(page_content=text, metadata={**best.metadata, "merged_chunks": len(ranks)}))
+        kept_shingles.append(shingles)
+        used_tokens += tokens
+
+    stats.update({
+        "duplicates": duplicates,
+        "blocks_out": len(context_docs),
+        "tokens": used_tokens,
+        "truncated": truncated,
+    })
+    stats["build_s"] = time.time() - start
+    logging.info(
+        f"[Context] {stats['chunks_in']} chunks -> {stats['blocks_out']} blocks "
+        f"({stats['merged']} merged, {duplicates} near-duplicates), {used_tokens}/{budget} tokens"
+        f"{' (budget reached)' if stats['truncated'] else ''} in {stats['build_s'] * 1000:.1f} ms"
+    )
+    return context_docs, stats
+
+
+def prepare_context(docs: List[Document], flags: Dict[str, Any], timings: Dict[str, float]) -> List[Document]:
+    """Contexte de génération pour une requête ; les documents bruts si l'assemblage est désactivé."""
+    if not Config.CONTEXT_BUILDER_ENABLED or not docs:
+        return docs
+    context_docs, stats = build_context(docs, flags["model"], flags.get("max_tokens"))
+    timings["context_build_s"] = stats["build_s"]
+    return context_docs
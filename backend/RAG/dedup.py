@@ -0,0 +1,167 @@
+"""
+Élimination des chunks quasi identiques à l'indexation (MinHash + LSH).
+
+Le site publie la même présentation de programme, le même paragraphe d'admission ou le
+même encart sur des dizaines de pages : chaque copie est embeddée, stockée, et occupe
+plusieurs places du top-k. `ChunkDeduplicator` :
+    1. calcule une signature MinHash (`num_perm` permutations) des 5-grammes de mots de
+       chaque chunk (empreintes CRC32, déterministes d'un processus à l'autre) ;
+    2. regroupe les candidats par LSH (`bands` bandes de `num_perm / bands` lignes) ;
+    3. parcourt les chunks dans l'ordre des documents : un chunk dont la similarité de
+       Jaccard estimée avec un chunk canonique déjà retenu atteint `threshold` y est
+       rattaché, sinon il devient canonique (pas de chaînage A ~ B ~ C).
+
+Le chunk canonique garde son texte et reçoit `source_urls` (URLs de toutes les copies,
+séparées par des espaces : Chroma n'accepte que des métadonnées scalaires) et
+`duplicates` (nombre de copies retirées). Les voisins (`prev_chunk_id`, `next_chunk_id`)
+d'un chunk retiré pointent vers son chunk canonique.
+"""
+
+import logging
+import re
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+_WORD_RE = re.compile(r"\w+")
+_SHINGLE_SIZE = 5
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+# Prix de text-embedding-3-small, en dollars par million de tokens (rapport d'économies)
+EMBEDDING_PRICE_PER_MILLION_TOKENS = 0.02
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= _SHINGLE_SIZE:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + _SHINGLE_SIZE]) for i in range(len(words) - _SHINGLE_SIZE + 1)]
+    return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in set(grams)), dtype=np.uint64)
+
+
+def _source_url(chunk: Document) -> str:
+    return str(chunk.metadata.get("url") or chunk.metadata.get("filename") or "")
+
+
+class DedupReport:
+    """Bilan d'une déduplication : chunks retirés, tokens non embeddés, taille d'index évitée."""
+
+    def __init__(self, chunks_in: int, clusters: List[Tuple[Document, List[Document]]], tokens_saved: int, bytes_saved: int):
+        self.chunks_in = chunks_in
+        self.clusters = clusters
+        self.removed = sum(len(duplicates) for _, duplicates in clusters)
+        self.tokens_saved = tokens_saved
+        self.text_bytes_saved = bytes_saved
+
+    def summary(self, dimensions: Optional[int] = None) -> str:
+        vectors = f", {self.removed * dimensions * 4 / 1e6:.2f} Mo de vecteurs float32" if dimensions else ""
+        return (
+            f"{self.removed}/{self.chunks_in} chunks quasi dupliqués retirés ({len(self.clusters)} groupes) ; "
+            f"{self.tokens_saved:,} tokens non embeddés (~{self.tokens_saved / 1e6 * EMBEDDING_PRICE_PER_MILLION_TOKENS:.4f} $), "
+            f"{self.text_bytes_saved / 1e6:.2f} Mo de texte{vectors} en moins dans l'index"
+        )
+
+    def to_dict(self, dimensions: Optional[int] = None, top: int = 50) -> Dict[str, Any]:
+        clusters = sorted(self.clusters, key=lambda cluster: len(cluster[1]), reverse=True)[:top]
+        return {
+            "chunks_in": self.chunks_in,
+            "chunks_kept": self.chunks_in - self.removed,
+            "chunks_removed": self.removed,
+            "groups": len(self.clusters),
+            "tokens_saved": self.tokens_saved,
+            "embedding_cost_saved_usd": round(self.tokens_saved / 1e6 * EMBEDDING_PRICE_PER_MILLION_TOKENS, 6),
+            "text_bytes_saved": self.text_bytes_saved,
+            "vector_bytes_saved": self.removed * dimensions * 4 if dimensions else None,
+            "largest_groups": [
+                {
+                    "chunk_id": canonical.metadata.get("chunk_id"),
+                    "copies": len(duplicates) + 1,
+                    "source_urls": canonical.metadata.get("source_urls", "").split(),
+                    "preview": canonical.page_content[:200],
+                }
+                for canonical, duplicates in clusters
+            ],
+        }
+
+
+class ChunkDeduplicator:
+    """Rattache les chunks quasi identiques à un chunk canonique (voir le module)."""
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, bands: int = 16, seed: int = 1,
+                 count_tokens: Optional[Callable[[str], int]] = None):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.count_tokens = count_tokens or (lambda text: len(text) // 4 + 1)
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = _shingle_hashes(text)
+        # Permutations (a·x + b) mod p, minimum par permutation (débordement uint64 comme datasketch)
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [band.tobytes() for band in signature.reshape(self.bands, self.rows)]
+
+    def deduplicate(self, documents: Dict[str, List[Document]]) -> DedupReport:
+        """Retire les quasi-doublons de `documents` (clé → chunks dans l'ordre), en place.
+
+        Les documents sont parcourus dans l'ordre des clés : le chunk canonique est la
+        première occurrence, stable tant que la page qui la contient ne change pas.
+        """
+        buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        canonicals: List[Tuple[Document, np.ndarray]] = []
+        duplicates_of: Dict[int, List[Document]] = {}
+        replaced: Dict[str, str] = {}
+        chunks_in = tokens_saved = bytes_saved = 0
+
+        for doc_key in sorted(documents):
+            kept = []
+            for chunk in documents[doc_key]:
+                chunks_in += 1
+                signature = self.signature(chunk.page_content)
+                keys = self._band_keys(signature)
+                candidates = {index for band, key in enumerate(keys) for index in buckets[band].get(key, ())}
+                match = None
+                for index in sorted(candidates):
+                    if np.mean(canonicals[index][1] == signature) >= self.threshold:
+                        match = index
+                        break
+                if match is None:
+                    for band, key in enumerate(keys):
+                        buckets[band].setdefault(key, []).append(len(canonicals))
+                    canonicals.append((chunk, signature))
+                    kept.append(chunk)
+                    continue
+                duplicates_of.setdefault(match, []).append(chunk)
+                replaced[chunk.metadata.get("chunk_id", "")] = canonicals[match][0].metadata.get("chunk_id", "")
+                tokens_saved += self.count_tokens(chunk.page_content)
+                bytes_saved += len(chunk.page_content.encode("utf-8"))
+            documents[doc_key] = kept
+
+        clusters = []
+        for index, duplicates in duplicates_of.items():
+            canonical = canonicals[index][0]
+            urls = [_source_url(canonical)] + [_source_url(duplicate) for duplicate in duplicates]
+            canonical.metadata["source_urls"] = " ".join(dict.fromkeys(url for url in urls if url))
+            canonical.metadata["duplicates"] = len(duplicates)
+            clusters.append((canonical, duplicates))
+        for chunks in documents.values():
+            for chunk in chunks:
+                for key in ("prev_chunk_id", "next_chunk_id"):
+                    if chunk.metadata.get(key) in replaced:
+                        chunk.metadata[key] = replaced[chunk.metadata[key]]
+
+        report = DedupReport(chunks_in, clusters, tokens_saved, bytes_saved)
+        logging.info(f"[Dedup] {report.summary()}")
+        return report
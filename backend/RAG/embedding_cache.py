@@ -0,0 +1,201 @@
+"""
+Cache disque des embeddings, adressé par le contenu.
+
+Changer les paramètres de découpage, reconstruire Chroma ou comparer des index recalcule
+les embeddings de textes déjà vus. `CachedEmbeddings` enveloppe un modèle d'embedding et
+conserve chaque vecteur sous la clé (modèle, dimensions, hash du texte) : une fois le
+cache rempli, les reconstructions ne coûtent plus d'appel à l'API et fonctionnent hors-ligne.
+
+Un répertoire par couple (modèle, dimensions) dans `Config.EMBEDDING_CACHE_DIR` :
+    meta.json     modèle, dimensions demandées et dimension des vecteurs
+    keys.bin      empreintes SHA-256 (16 octets) des textes, concaténées
+    vectors.bin   vecteurs float32 bruts, dans le même ordre que keys.bin
+
+Les deux fichiers sont en ajout seul (vecteurs écrits avant les clés) et partagés entre
+processus via un verrou fichier ; une écriture interrompue est tronquée au prochain ajout.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .config import Config
+from .local_index import embedding_model_name
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou inter-processus, un seul indexeur à la fois
+    fcntl = None
+
+KEY_BYTES = 16
+META_FILE = "meta.json"
+KEYS_FILE = "keys.bin"
+VECTORS_FILE = "vectors.bin"
+LOCK_FILE = ".lock"
+
+# Les requêtes peuvent être embeddées différemment des documents selon le modèle
+_DOCUMENT_PREFIX = b"document\0"
+_QUERY_PREFIX = b"query\0"
+
+
+@contextmanager
+def _file_lock(path: Path):
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings servis depuis le cache disque ; seuls les textes inconnus sont envoyés au modèle.
+
+    Les embeddings de documents sont toujours mis en cache ; ceux des requêtes seulement
+    avec `cache_queries` (le cache sémantique couvre déjà les questions répétées du serveur).
+    """
+
+    def __init__(self, underlying: Embeddings, cache_dir: Optional[Path] = None, *, cache_queries: bool = False):
+        self.underlying = underlying
+        # `model` est lu par embedding_model_name (manifestes de l'index local et de l'indexation)
+        self.model = embedding_model_name(underlying) or type(underlying).__name__
+        self.dimensions = getattr(underlying, "dimensions", None)
+        self.cache_queries = cache_queries
+        namespace = re.sub(r"[^A-Za-z0-9._-]", "_", f"{self.model}__{self.dimensions or 'default'}")
+        self.cache_dir = Path(cache_dir or Config.EMBEDDING_CACHE_DIR) / namespace
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._rows: Dict[bytes, int] = {}
+        self._count = 0
+        self._vector_dims: Optional[int] = None
+        self._vectors: Optional[np.ndarray] = None  # memmap (count, vector_dims)
+        self.hits = 0
+        self.misses = 0
+        with self._lock:
+            self._refresh()
+        logging.info(f"Embedding cache {self.cache_dir} ({self._count} vectors)")
+
+    # ------------------------------------------------------------------
+    # Stockage
+    # ------------------------------------------------------------------
+    def _refresh(self) -> None:
+        """Charge les entrées ajoutées depuis la dernière lecture (par ce processus ou un autre)."""
+        if self._vector_dims is None:
+            meta_path = self.cache_dir / META_FILE
+            if not meta_path.exists():
+                return
+            self._vector_dims = int(json.loads(meta_path.read_text(encoding="utf-8"))["vector_dims"])
+        keys_path, vectors_path = self.cache_dir / KEYS_FILE, self.cache_dir / VECTORS_FILE
+        if not keys_path.exists() or not vectors_path.exists():
+            return
+        row_bytes = self._vector_dims * 4
+        count = min(keys_path.stat().st_size // KEY_BYTES, vectors_path.stat().st_size // row_bytes)
+        if count <= self._count:
+            return
+        with open(keys_path, "rb") as f:
+            f.seek(self._count * KEY_BYTES)
+            data = f.read((count - self._count) * KEY_BYTES)
+        for i in range(count - self._count):
+            self._rows.setdefault(data[i * KEY_BYTES:(i + 1) * KEY_BYTES], self._count + i)
+        self._count = count
+        self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(count, self._vector_dims))
+
+    def _append(self, keys: List[bytes], vectors: np.ndarray) -> None:
+        keys_path, vectors_path = self.cache_dir / KEYS_FILE, self.cache_dir / VECTORS_FILE
+        with self._lock, _file_lock(self.cache_dir / LOCK_FILE):
+            self._refresh()
+            if self._vector_dims is None:
+                self._vector_dims = int(vectors.shape[1])
+                meta = {"model": self.model, "dimensions": self.dimensions, "vector_dims": self._vector_dims, "dtype": "float32"}
+                (self.cache_dir / META_FILE).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+            elif vectors.shape[1] != self._vector_dims:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match cache {self.cache_dir} ({self._vector_dims})")
+            new = [i for i, key in enumerate(keys) if key not in self._rows]
+            if not new:
+                return
+            # Reste d'une écriture interrompue (vecteurs sans clé) : tronqué avant d'ajouter
+            for path, size in ((vectors_path, self._count * self._vector_dims * 4), (keys_path, self._count * KEY_BYTES)):
+                if path.exists() and path.stat().st_size > size:
+                    os.truncate(path, size)
+            with open(vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(vectors[new], dtype=np.float32).tobytes())
+            with open(keys_path, "ab") as f:
+                f.write(b"".join(keys[i] for i in new))
+            self._refresh()
+
+    # ------------------------------------------------------------------
+    # Embeddings
+    # ------------------------------------------------------------------
+    def _partition(self, texts: List[str], prefix: bytes) -> Tuple[List[bytes], List[Optional[int]], List[str]]:
+        """Clés, lignes du cache (None si absent) et textes distincts à calculer."""
+        keys = [hashlib.sha256(prefix + text.encode("utf-8")).digest()[:KEY_BYTES] for text in texts]
+        with self._lock:
+            rows = [self._rows.get(key) for key in keys]
+            if None in rows:
+                # Entrées éventuellement ajoutées par un autre processus depuis le dernier chargement
+                self._refresh()
+                rows = [self._rows.get(key) for key in keys]
+        missing: Dict[bytes, str] = {}
+        for key, row, text in zip(keys, rows, texts):
+            if row is None:
+                missing.setdefault(key, text)
+        self.hits += len(texts) - rows.count(None)
+        self.misses += len(missing)
+        return keys, rows, list(missing.values())
+
+    def _assemble(self, keys: List[bytes], rows: List[Optional[int]], computed: Dict[bytes, List[float]]) -> List[List[float]]:
+        results: List[List[float]] = []
+        with self._lock:
+            vectors = self._vectors
+        for key, row in zip(keys, rows):
+            results.append(computed[key] if row is None else vectors[row].tolist())
+        return results
+
+    def _store(self, texts: List[str], vectors: List[List[float]], prefix: bytes) -> Dict[bytes, List[float]]:
+        keys = [hashlib.sha256(prefix + text.encode("utf-8")).digest()[:KEY_BYTES] for text in texts]
+        if vectors:
+            self._append(keys, np.asarray(vectors, dtype=np.float32))
+        return dict(zip(keys, vectors))
+
+    def _embed(self, texts: List[str], prefix: bytes, compute: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        keys, rows, missing = self._partition(texts, prefix)
+        computed = self._store(missing, compute(missing) if missing else [], prefix)
+        if len(texts) >= 100:
+            logging.info(f"[EmbeddingCache] {len(texts) - len(missing)}/{len(texts)} embeddings served from cache")
+        return self._assemble(keys, rows, computed)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts), _DOCUMENT_PREFIX, self.underlying.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        if not self.cache_queries:
+            return self.underlying.embed_query(text)
+        return self._embed([text], _QUERY_PREFIX, lambda texts: [self.underlying.embed_query(texts[0])])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        keys, rows, missing = self._partition(texts, _DOCUMENT_PREFIX)
+        vectors = await self.underlying.aembed_documents(missing) if missing else []
+        computed = await asyncio.to_thread(self._store, missing, vectors, _DOCUMENT_PREFIX)
+        return self._assemble(keys, rows, computed)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        if not self.cache_queries:
+            return await self.underlying.aembed_query(text)
+        keys, rows, missing = self._partition([text], _QUERY_PREFIX)
+        vectors = [await self.underlying.aembed_query(text)] if missing else []
+        computed = await asyncio.to_thread(self._store, missing, vectors, _QUERY_PREFIX)
+        return self._assemble(keys, rows, computed)[0]
@@ -1,6 +1,7 @@
 import logging
 from langchain_openai import OpenAIEmbeddings
 from .config import Config
+from .embedding_cache import CachedEmbeddings
 
 def initialize_embeddings():
     try:
@@ -31,6 +32,9 @@ def initialize_embeddings():
         
         embeddings = OpenAIEmbeddings(**embedding_kwargs)
         logging.info(f"Embeddings initialized successfully (dimension: {embedding_kwargs['dimensions']})")
+        if Config.EMBEDDING_CACHE_ENABLED:
+            # Cache disque partagé par le serveur et les scripts d'indexation (RAG/embedding_cache.py)
+            embeddings = CachedEmbeddings(embeddings, cache_queries=Config.EMBEDDING_CACHE_QUERIES)
         return embeddings
     except Exception as e:
         logging.exception(f"Error initializing embeddings: {e}")
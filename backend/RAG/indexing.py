@@ -0,0 +1,461 @@
+"""
+Indexation incrémentale des documents prétraités (`data/preprocessed/long_files`).
+
+Un manifeste JSON par backend (`Config.INDEX_MANIFEST_DIR`) conserve, pour chaque
+document, l'empreinte de son contenu et les identifiants de ses chunks. L'identifiant
+d'un chunk est dérivé de son contenu (nom du fichier + hash du texte et des métadonnées) :
+un chunk inchangé garde son identifiant d'une exécution à l'autre. Une réindexation :
+    1. ignore les documents dont l'empreinte n'a pas changé (ni découpage, ni embedding) ;
+    2. redécoupe les documents modifiés et n'envoie que les chunks nouveaux ;
+    3. supprime les chunks disparus des pages modifiées ou retirées.
+
+Chaque chunk porte les identifiants de ses voisins dans la page (`prev_chunk_id`,
+`next_chunk_id`) et, s'il est le chunk canonique d'un groupe de quasi-doublons (`dedup.py`),
+les URLs de toutes les copies. Le manifeste conserve une empreinte de ces métadonnées par
+chunk : un chunk inchangé dont elles changent est renvoyé (même identifiant) ; les
+vectorstores remplacent l'entrée existante. La déduplication portant sur tout le corpus,
+tous les documents sont alors redécoupés à chaque exécution (seuls les embeddings coûtent).
+
+L'absence de manifeste, un changement de découpage ou de modèle d'embedding, ou un
+vectorstore dont le nombre de vecteurs ne correspond pas au manifeste provoquent une
+reconstruction complète. Le manifeste n'est écrit qu'une fois le vectorstore à jour.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from .chunking import MarkdownTokenSplitter
+from .config import Config
+from .dedup import ChunkDeduplicator, DedupReport
+from .local_index import LocalVectorIndex, embedding_model_name, local_index_exists, write_local_index
+
+MANIFEST_VERSION = 3
+
+# Le chemin absolu du fichier dépend de la machine : il n'entre pas dans les empreintes
+_UNHASHED_METADATA = ("source", "chunk_id", "prev_chunk_id", "next_chunk_id", "source_urls", "duplicates")
+# Métadonnées dépendant des autres chunks : leur empreinte est conservée dans le manifeste
+_STATE_METADATA = ("prev_chunk_id", "next_chunk_id", "source_urls", "duplicates")
+
+# Taille des lots envoyés au vectorstore (Chroma limite la taille d'un lot, ~5000)
+_WRITE_BATCH_SIZE = 500
+
+
+# ------------------------------------------------------------------
+# Documents et chunks
+# ------------------------------------------------------------------
+def load_long_file(md_path: Path) -> Tuple[str, Dict[str, str]]:
+    """Contenu et métadonnées (source, filename, title, url) d'un fichier prétraité."""
+    content = md_path.read_text(encoding="utf-8")
+    metadata = {"source": str(md_path), "filename": md_path.name}
+    json_path = md_path.with_suffix(".json")
+    if json_path.exists():
+        try:
+            json_data = json.loads(json_path.read_text(encoding="utf-8"))
+            for field in ("title", "url"):
+                if field in json_data:
+                    metadata[field] = json_data[field]
+        except Exception as e:
+            logging.warning(f"Métadonnées illisibles pour {md_path}: {e}")
+    return content, metadata
+
+
+def load_long_files(long_files_dir: Optional[Path] = None) -> List[Tuple[str, str, Dict[str, str]]]:
+    """`(clé du document, contenu, métadonnées)` de chaque fichier markdown, triés par nom."""
+    long_files_dir = Path(long_files_dir or Config.LONG_FILES_DIR)
+    documents = []
+    for md_path in sorted(long_files_dir.glob("*.md")):
+        content, metadata = load_long_file(md_path)
+        documents.append((md_path.name, content, metadata))
+    return documents
+
+
+Splitter = Union[MarkdownTokenSplitter, RecursiveCharacterTextSplitter]
+
+
+def make_splitter(strategy: Optional[str] = None) -> Splitter:
+    """Découpage commun aux vectorstores et à l'index BM25 (`CHUNK_STRATEGY` par défaut)."""
+    strategy = strategy or Config.CHUNK_STRATEGY
+    if strategy == "characters":
+        return RecursiveCharacterTextSplitter(
+            chunk_size=Config.CHUNK_SIZE,
+            chunk_overlap=Config.CHUNK_OVERLAP,
+            length_function=len,
+        )
+    if strategy != "markdown_tokens":
+        raise ValueError(f"Unknown CHUNK_STRATEGY '{strategy}' (expected 'markdown_tokens' or 'characters')")
+    return MarkdownTokenSplitter(Config.CHUNK_TOKENS, Config.CHUNK_OVERLAP_TOKENS, Config.CHUNK_TOKENIZER)
+
+
+def chunking_settings(splitter: Splitter) -> Dict[str, Any]:
+    """Paramètres de découpage enregistrés dans les manifestes."""
+    if isinstance(splitter, MarkdownTokenSplitter):
+        return splitter.settings()
+    return {"chunker": "characters", "chunk_size": splitter._chunk_size, "chunk_overlap": splitter._chunk_overlap}
+
+
+def _hash(text: str, metadata: Dict[str, Any]) -> str:
+    hashed_metadata = {key: value for key, value in metadata.items() if key not in _UNHASHED_METADATA}
+    payload = json.dumps({"text": text, "metadata": hashed_metadata}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _id_prefix(doc_key: str, max_len: int = 200) -> str:
+    # Identifiants ASCII compatibles Pinecone (translittération puis caractères non autorisés remplacés)
+    normalized = unicodedata.normalize("NFKD", doc_key).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^A-Za-z0-9_-]", "_", normalized)[:max_len]
+
+
+def split_document(splitter: Splitter, doc_key: str, content: str, metadata: Dict[str, Any]) -> List[Document]:
+    """Chunks d'un document, avec un identifiant dérivé de leur contenu dans `metadata["chunk_id"]`
+    et les identifiants des chunks voisins de la page."""
+    chunks = splitter.create_documents(texts=[content], metadatas=[metadata])
+    prefix = _id_prefix(doc_key)
+    seen: Dict[str, int] = {}
+    for chunk in chunks:
+        chunk_id = f"{prefix}-{_hash(chunk.page_content, chunk.metadata)[:16]}"
+        # Un même texte répété dans la page : suffixe d'occurrence pour garder des identifiants uniques
+        seen[chunk_id] = seen.get(chunk_id, 0) + 1
+        if seen[chunk_id] > 1:
+            chunk_id = f"{chunk_id}-{seen[chunk_id]}"
+        chunk.metadata["chunk_id"] = chunk_id
+    # Chaînes vides plutôt que None : Chroma et Pinecone n'acceptent que des métadonnées scalaires
+    for i, chunk in enumerate(chunks):
+        chunk.metadata["prev_chunk_id"] = chunks[i - 1].metadata["chunk_id"] if i > 0 else ""
+        chunk.metadata["next_chunk_id"] = chunks[i + 1].metadata["chunk_id"] if i + 1 < len(chunks) else ""
+    return chunks
+
+
+def chunk_corpus(
+    documents: List[Tuple[str, str, Dict[str, Any]]],
+    splitter: Optional[Splitter] = None,
+) -> Tuple[Dict[str, List[Document]], Optional[DedupReport]]:
+    """Chunks canoniques de tout le corpus (clé du document → chunks) et bilan de la déduplication."""
+    splitter = splitter or make_splitter()
+    split = {doc_key: split_document(splitter, doc_key, content, metadata) for doc_key, content, metadata in documents}
+    deduplicator = make_deduplicator(splitter)
+    report = deduplicator.deduplicate(split) if deduplicator is not None else None
+    return split, report
+
+
+def write_chunks(path: Path, chunks: Dict[str, List[Document]]) -> None:
+    """Sauvegarde les chunks (JSON Lines, un chunk par ligne) ; écriture atomique."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for doc_key in sorted(chunks):
+            for chunk in chunks[doc_key]:
+                record = {"doc_key": doc_key, "text": chunk.page_content, "metadata": chunk.metadata}
+                f.write(json.dumps(record, ensure_ascii=False, sort_keys=True) + "\n")
+    os.replace(tmp_path, path)
+
+
+def read_chunks(path: Path) -> Dict[str, List[Document]]:
+    """Chunks sauvegardés par `write_chunks`, dans le même ordre."""
+    chunks: Dict[str, List[Document]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            chunks.setdefault(record["doc_key"], []).append(Document(page_content=record["text"], metadata=record["metadata"]))
+    return chunks
+
+
+# ------------------------------------------------------------------
+# Manifeste
+# ------------------------------------------------------------------
+def _chunk_state(chunk: Document) -> str:
+    state = json.dumps([chunk.metadata.get(key) for key in _STATE_METADATA], ensure_ascii=False)
+    return hashlib.sha256(state.encode("utf-8")).hexdigest()[:12]
+
+
+def make_deduplicator(splitter: Splitter) -> Optional[ChunkDeduplicator]:
+    """Déduplication MinHash configurée (`DEDUP_*`), ou None si désactivée."""
+    if not Config.DEDUP_ENABLED:
+        return None
+    return ChunkDeduplicator(
+        threshold=Config.DEDUP_THRESHOLD,
+        num_perm=Config.DEDUP_NUM_PERM,
+        bands=Config.DEDUP_BANDS,
+        count_tokens=getattr(splitter, "count_tokens", None),
+    )
+
+
+def save_dedup_report(backend: str, report: DedupReport, dimensions: Optional[int] = None) -> Path:
+    """Rapport JSON des quasi-doublons retirés, à côté du manifeste du backend."""
+    path = Path(Config.INDEX_MANIFEST_DIR) / f"{backend.lower()}_dedup.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report.to_dict(dimensions), ensure_ascii=False, indent=1), encoding="utf-8")
+    logging.info(f"[Dedup] Rapport des quasi-doublons : {path}")
+    return path
+
+
+def manifest_path(backend: str) -> Path:
+    return Path(Config.INDEX_MANIFEST_DIR) / f"{backend.lower()}.json"
+
+
+def load_manifest(path: Path) -> Optional[Dict[str, Any]]:
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        logging.warning(f"Manifeste d'indexation illisible ({path}), reconstruction complète: {e}")
+        return None
+
+
+def save_manifest(path: Path, manifest: Dict[str, Any]) -> None:
+    """Écriture atomique (fichier temporaire puis renommage)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    manifest = {**manifest, "updated_at": datetime.now().isoformat()}
+    tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    tmp_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def manifest_chunk_count(manifest: Optional[Dict[str, Any]]) -> int:
+    if not manifest:
+        return 0
+    return sum(len(entry["chunks"]) for entry in manifest.get("documents", {}).values())
+
+
+def mark_failed(manifest: Dict[str, Any], doc_keys: Iterable[str]) -> None:
+    """Marque des documents comme à renvoyer en entier à la prochaine exécution (écriture partielle)."""
+    for doc_key in doc_keys:
+        if doc_key in manifest["documents"]:
+            manifest["documents"][doc_key]["hash"] = None
+
+
+class IndexPlan:
+    """Différence entre les documents courants et le manifeste de la dernière indexation."""
+
+    def __init__(self, manifest: Dict[str, Any], full_rebuild: bool):
+        self.manifest = manifest
+        self.full_rebuild = full_rebuild
+        self.to_add: List[Document] = []
+        self.to_delete: List[str] = []
+        self.stats = {"unchanged": 0, "added": 0, "changed": 0, "removed": 0}
+        self.dedup: Optional[DedupReport] = None
+
+    def summary(self) -> str:
+        mode = "reconstruction complète" if self.full_rebuild else "incrémental"
+        return (
+            f"{mode} : {self.stats['added']} documents nouveaux, {self.stats['changed']} modifiés, "
+            f"{self.stats['removed']} supprimés, {self.stats['unchanged']} inchangés ; "
+            f"{len(self.to_add)} chunks à indexer, {len(self.to_delete)} à supprimer"
+        )
+
+
+def plan_index_update(
+    documents: List[Tuple[str, str, Dict[str, Any]]],
+    manifest: Optional[Dict[str, Any]],
+    splitter: Splitter,
+    settings: Dict[str, Any],
+    *,
+    full_rebuild: bool = False,
+    indexed_count: Optional[int] = None,
+    deduplicator: Optional[ChunkDeduplicator] = None,
+    chunks: Optional[Dict[str, List[Document]]] = None,
+) -> IndexPlan:
+    """Chunks à indexer et identifiants à supprimer pour amener le vectorstore à l'état de `documents`.
+
+    `settings` (découpage, modèle d'embedding) doit être identique à celui du manifeste pour
+    une mise à jour incrémentale ; `indexed_count`, s'il est connu, est comparé au manifeste.
+    Avec `deduplicator`, seuls les chunks canoniques sont indexés (`plan.dedup` : le bilan).
+    `chunks` fournit les chunks déjà découpés et dédupliqués (`chunk_corpus`) : ni découpage
+    ni déduplication ne sont alors refaits.
+    """
+    if manifest is None:
+        reason = "aucun manifeste"
+    elif manifest.get("version") != MANIFEST_VERSION or manifest.get("settings") != settings:
+        reason = "paramètres d'indexation modifiés"
+    elif indexed_count is not None and indexed_count != manifest_chunk_count(manifest):
+        reason = f"{indexed_count} vecteurs indexés pour {manifest_chunk_count(manifest)} dans le manifeste"
+    elif full_rebuild:
+        reason = "demandée"
+    else:
+        reason = None
+    if reason:
+        logging.info(f"[Indexing] Reconstruction complète ({reason})")
+    previous = {} if reason else manifest["documents"]
+
+    plan = IndexPlan({"version": MANIFEST_VERSION, "settings": settings, "documents": {}}, full_rebuild=bool(reason))
+    hashes: Dict[str, str] = {}
+    split: Dict[str, List[Document]] = {}
+    for doc_key, content, metadata in documents:
+        doc_hash = hashes[doc_key] = _hash(content, metadata)
+        old_entry = previous.get(doc_key)
+        if chunks is not None:
+            split[doc_key] = chunks.get(doc_key, [])
+            continue
+        if deduplicator is None and old_entry and old_entry["hash"] == doc_hash:
+            plan.manifest["documents"][doc_key] = old_entry
+            plan.stats["unchanged"] += 1
+            continue
+        split[doc_key] = split_document(splitter, doc_key, content, metadata)
+    if deduplicator is not None and chunks is None:
+        plan.dedup = deduplicator.deduplicate(split)
+
+    for doc_key, doc_chunks in split.items():
+        old_entry = previous.get(doc_key)
+        chunk_ids = [chunk.metadata["chunk_id"] for chunk in doc_chunks]
+        states = [_chunk_state(chunk) for chunk in doc_chunks]
+        # Document en échec lors de la dernière exécution (hash None) : renvoyé en entier
+        indexed = {}
+        if old_entry and old_entry["hash"] is not None:
+            indexed = dict(zip(old_entry["chunks"], old_entry["states"]))
+        # Chunk nouveau, ou inchangé mais dont les voisins ou les copies ont changé (métadonnées à jour)
+        plan.to_add.extend(chunk for chunk, chunk_id, state in zip(doc_chunks, chunk_ids, states) if indexed.get(chunk_id) != state)
+        if old_entry:
+            current = set(chunk_ids)
+            plan.to_delete.extend(chunk_id for chunk_id in old_entry["chunks"] if chunk_id not in current)
+        plan.manifest["documents"][doc_key] = {"hash": hashes[doc_key], "chunks": chunk_ids, "states": states}
+        if not old_entry:
+            plan.stats["added"] += 1
+        else:
+            plan.stats["unchanged" if old_entry["hash"] == hashes[doc_key] else "changed"] += 1
+
+    for doc_key in previous.keys() - plan.manifest["documents"].keys():
+        plan.to_delete.extend(previous[doc_key]["chunks"])
+        plan.stats["removed"] += 1
+    logging.info(f"[Indexing] {plan.summary()}")
+    return plan
+
+
+def _batches(items: List[Any], size: int = _WRITE_BATCH_SIZE) -> Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# ------------------------------------------------------------------
+# Backends
+# ------------------------------------------------------------------
+def sync_chroma(
+    embeddings: Embeddings,
+    persist_directory: Optional[Path] = None,
+    long_files_dir: Optional[Path] = None,
+    *,
+    full_rebuild: bool = False,
+    chunks: Optional[Dict[str, List[Document]]] = None,
+) -> IndexPlan:
+    """Met à jour le vectorstore Chroma persistant : seuls les chunks nouveaux sont envoyés à l'API d'embedding.
+
+    `chunks` : chunks déjà découpés (`chunk_corpus`, `read_chunks`), sinon découpés ici.
+    """
+    from langchain_community.vectorstores import Chroma
+
+    persist_directory = str(persist_directory or Config.VECTORSTORE_DIR)
+    path = manifest_path("Chroma")
+    vectorstore = Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+    splitter = make_splitter()
+    settings = {**chunking_settings(splitter), "embedding_model": embedding_model_name(embeddings)}
+    plan = plan_index_update(
+        load_long_files(long_files_dir), load_manifest(path), splitter, settings,
+        full_rebuild=full_rebuild, indexed_count=vectorstore._collection.count(),
+        deduplicator=make_deduplicator(splitter), chunks=chunks,
+    )
+    if plan.dedup is not None:
+        save_dedup_report("Chroma", plan.dedup, getattr(embeddings, "dimensions", None))
+
+    start = time.time()
+    if plan.full_rebuild:
+        # Les chunks d'une indexation sans manifeste n'ont pas d'identifiant stable : collection recréée
+        vectorstore.delete_collection()
+        vectorstore = Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+    for batch in _batches(plan.to_delete):
+        vectorstore.delete(ids=batch)
+    for batch in _batches(plan.to_add):
+        vectorstore.add_documents(batch, ids=[chunk.metadata["chunk_id"] for chunk in batch])
+    save_manifest(path, plan.manifest)
+    logging.info(f"[Indexing] Chroma à jour ({vectorstore._collection.count()} vecteurs) en {time.time() - start:.1f}s")
+    return plan
+
+
+def sync_local_index(
+    embeddings: Embeddings,
+    index_dir: Optional[Path] = None,
+    long_files_dir: Optional[Path] = None,
+    *,
+    full_rebuild: bool = False,
+    batch_size: int = 512,
+    chunks: Optional[Dict[str, List[Document]]] = None,
+) -> IndexPlan:
+    """Réécrit l'index local en réutilisant les vecteurs des chunks inchangés.
+
+    L'index est un fichier plat en lecture seule : il est toujours réécrit en entier, mais
+    seuls les chunks nouveaux passent par l'API d'embedding (la réécriture prend quelques
+    millisecondes pour quelques milliers de chunks).
+    """
+    index_dir = Path(index_dir or Config.LOCAL_INDEX_DIR)
+    path = manifest_path("Local")
+    previous = None
+    if local_index_exists(index_dir):
+        previous = LocalVectorIndex(index_dir, embeddings, check_embedding_model=False)
+    splitter = make_splitter()
+    settings = {**chunking_settings(splitter), "embedding_model": embedding_model_name(embeddings)}
+    plan = plan_index_update(
+        load_long_files(long_files_dir), load_manifest(path), splitter, settings,
+        full_rebuild=full_rebuild, indexed_count=len(previous) if previous is not None else 0,
+        deduplicator=make_deduplicator(splitter), chunks=chunks,
+    )
+    if plan.dedup is not None:
+        dimensions = previous.manifest["dimensions"] if previous is not None else getattr(embeddings, "dimensions", None)
+        save_dedup_report("Local", plan.dedup, dimensions)
+    unchanged_format = previous is not None and (previous.manifest["dtype"], previous.quantization) == (
+        Config.LOCAL_INDEX_DTYPE, Config.LOCAL_INDEX_QUANTIZATION)
+    if unchanged_format and not plan.full_rebuild and not plan.to_add and not plan.to_delete:
+        save_manifest(path, plan.manifest)
+        return plan
+
+    start = time.time()
+    added = {chunk.metadata["chunk_id"]: i for i, chunk in enumerate(plan.to_add)}
+    new_vectors = []
+    for batch in _batches([chunk.page_content for chunk in plan.to_add], batch_size):
+        new_vectors.extend(embeddings.embed_documents(batch))
+    rows = {}
+    if previous is not None and not plan.full_rebuild:
+        for row in range(len(previous)):
+            rows[previous._document(row).metadata.get("chunk_id")] = row
+
+    texts, metadatas, vectors = [], [], []
+    kept_rows, kept_positions = [], []
+    for entry in plan.manifest["documents"].values():
+        for chunk_id in entry["chunks"]:
+            if chunk_id in added:
+                chunk = plan.to_add[added[chunk_id]]
+                vectors.append(np.asarray(new_vectors[added[chunk_id]], dtype=np.float32))
+            else:
+                if chunk_id not in rows:
+                    raise RuntimeError(f"Chunk {chunk_id} absent de l'index local {index_dir} : relancez avec une reconstruction complète")
+                chunk = previous._document(rows[chunk_id])
+                kept_rows.append(rows[chunk_id])
+                kept_positions.append(len(vectors))
+                vectors.append(None)
+            texts.append(chunk.page_content)
+            metadatas.append(chunk.metadata)
+    if kept_rows:
+        for position, vector in zip(kept_positions, previous.get_vectors(kept_rows)):
+            vectors[position] = vector
+
+    dimensions = len(vectors[0]) if vectors else (previous.manifest["dimensions"] if previous is not None else 1)
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), dimensions)
+    write_local_index(
+        index_dir, matrix, texts, metadatas,
+        dtype=Config.LOCAL_INDEX_DTYPE,
+        quantization=Config.LOCAL_INDEX_QUANTIZATION,
+        embedding_model=embedding_model_name(embeddings),
+    )
+    save_manifest(path, plan.manifest)
+    logging.info(f"[Indexing] Index local à jour ({len(texts)} vecteurs, {len(kept_rows)} réutilisés) en {time.time() - start:.1f}s")
+    return plan
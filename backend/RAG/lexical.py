@@ -0,0 +1,241 @@
+"""
+Index lexical BM25 en mémoire, construit à partir des chunks de `data/preprocessed/long_files`.
+
+La recherche dense classe mal les requêtes composées de noms de programmes, de sigles
+ou de codes de cours (« ING2 GSI », « prépa intégrée ») : l'index BM25, fusionné avec
+le vectorstore par `HybridRetriever` (voir `retrieval.py`), les retrouve sans l'aller-retour
+réseau du reranker Cohere.
+
+Les chunks sont découpés avec les mêmes paramètres que le vectorstore (CHUNK_STRATEGY,
+voir `indexing.make_splitter`). L'index est sérialisé dans `Config.BM25_INDEX_PATH` et reconstruit
+automatiquement lorsque les fichiers sources ou les paramètres changent.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import pickle
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .config import Config
+from .indexing import chunk_corpus, chunking_settings, load_long_files, make_splitter
+
+# À incrémenter à chaque modification de la tokenisation : invalide les index sérialisés
+TOKENIZER_VERSION = 1
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Mots vides français (sans accents, après normalisation)
+FRENCH_STOPWORDS = frozenset("""
+a ai au aux avec c ca ce cela ces cet cette d dans de des du elle elles en est et etre eu eux
+il ils j je l la le les leur leurs lui m ma mais me meme mes moi mon n ne ni nos notre nous on
+ont ou par pas pour qu que quel quelle quelles quels qui s sa sans se ses si son sont sur t ta
+te tes toi ton tu un une vos votre vous y
+comment quoi quand combien
+""".split())
+
+# Suffixes dérivationnels retirés par le stemmer léger (du plus long au plus court)
+_SUFFIXES = (
+    "issements", "issement", "atrices", "ateurs", "ations", "atrice", "ateur", "ation",
+    "ements", "ement", "ments", "ment", "ismes", "istes", "iques", "ances", "ences",
+    "ables", "euses", "isme", "iste", "ique", "ance", "ence", "able", "euse", "ites",
+    "ives", "ite", "ive", "ifs", "eux", "if",
+)
+
+
+def _strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def french_stem(token: str) -> str:
+    """Stemmer léger pour le français (suffixes courants, pluriel, féminin).
+
+    Les tokens contenant un chiffre (codes de cours, « ing2 ») sont conservés tels quels.
+    """
+    if len(token) <= 3 or any(c.isdigit() for c in token):
+        return token
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    if token.endswith("aux") and len(token) > 4:
+        return token[:-3] + "al"
+    if token[-1] in "sx":
+        token = token[:-1]
+    # « intégrée » / « intégré » -> « integr »
+    while len(token) > 4 and token[-1] == "e":
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokenisation française : minuscules, sans accents, mots vides retirés, stemming léger.
+
+    Un sigle suivi d'un nombre (« ING 2 ») produit aussi le token collé (« ing2 »).
+    """
+    words = _WORD_RE.findall(_strip_accents(text.lower()))
+    tokens = []
+    for i, word in enumerate(words):
+        if word not in FRENCH_STOPWORDS:
+            tokens.append(french_stem(word))
+        if word.isdigit() and i > 0 and words[i - 1].isalpha():
+            tokens.append(words[i - 1] + word)
+    return tokens
+
+
+class BM25Index:
+    """Index inversé BM25 (Okapi).
+
+    Pour chaque terme, on stocke les identifiants des chunks qui le contiennent et la
+    contribution BM25 pré-calculée (idf × tf saturé normalisé par la longueur) : une
+    recherche se réduit à des additions dans un tableau numpy.
+    """
+
+    def __init__(self, documents: List[Document], k1: float = 1.2, b: float = 0.75, fingerprint: Optional[str] = None):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self.fingerprint = fingerprint
+
+        term_freqs: Dict[str, Dict[int, int]] = defaultdict(dict)
+        lengths = np.zeros(len(documents), dtype=np.float32)
+        for doc_id, doc in enumerate(documents):
+            tokens = tokenize(doc.page_content)
+            lengths[doc_id] = len(tokens)
+            for token in tokens:
+                postings = term_freqs[token]
+                postings[doc_id] = postings.get(doc_id, 0) + 1
+
+        n_docs = len(documents)
+        avgdl = float(lengths.mean()) if n_docs else 0.0
+        norm = k1 * (1 - b + b * lengths / avgdl) if avgdl else np.full(n_docs, k1, dtype=np.float32)
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, postings in term_freqs.items():
+            ids = np.fromiter(postings.keys(), dtype=np.int32, count=len(postings))
+            tfs = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            weights = idf * tfs * (k1 + 1) / (tfs + norm[ids])
+            self._postings[term] = (ids, weights.astype(np.float32))
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def search(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        """Retourne les `k` chunks de meilleur score BM25 (score > 0 uniquement)."""
+        if not self.documents or k <= 0:
+            return []
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                ids, weights = posting
+                scores[ids] += weights
+        matched = np.count_nonzero(scores)
+        if matched == 0:
+            return []
+        k = min(k, matched)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.documents[i], float(scores[i])) for i in top]
+
+    # ------------------------------------------------------------------
+    # Persistance
+    # ------------------------------------------------------------------
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "version": TOKENIZER_VERSION,
+            "fingerprint": self.fingerprint,
+            "k1": self.k1,
+            "b": self.b,
+            "documents": [(doc.page_content, doc.metadata) for doc in self.documents],
+            "postings": self._postings,
+        }
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["BM25Index"]:
+        """Charge un index sérialisé ; None s'il est absent ou d'une version de tokenisation différente."""
+        if not path.exists():
+            return None
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+        if payload.get("version") != TOKENIZER_VERSION:
+            return None
+        index = cls.__new__(cls)
+        index.documents = [Document(page_content=text, metadata=metadata) for text, metadata in payload["documents"]]
+        index.k1 = payload["k1"]
+        index.b = payload["b"]
+        index.fingerprint = payload["fingerprint"]
+        index._postings = payload["postings"]
+        return index
+
+
+def load_chunks(long_files_dir: Path) -> List[Document]:
+    """Découpe les fichiers de `long_files_dir` comme le script de création du vectorstore."""
+    # Mêmes chunks canoniques que le vectorstore : la fusion RRF compare les mêmes identifiants
+    documents, _ = chunk_corpus(load_long_files(long_files_dir))
+    return [chunk for doc_key in sorted(documents) for chunk in documents[doc_key]]
+
+
+def corpus_fingerprint(long_files_dir: Path, files: Optional[Iterable[Path]] = None) -> str:
+    """Empreinte des fichiers sources et des paramètres de l'index (nom, taille, date de modification)."""
+    digest = hashlib.sha1()
+    chunking = json.dumps(chunking_settings(make_splitter()), sort_keys=True)
+    dedup = f"{Config.DEDUP_ENABLED}|{Config.DEDUP_THRESHOLD}|{Config.DEDUP_NUM_PERM}|{Config.DEDUP_BANDS}"
+    digest.update(f"{TOKENIZER_VERSION}|{chunking}|{dedup}|{Config.BM25_K1}|{Config.BM25_B}".encode())
+    paths = files if files is not None else list(long_files_dir.glob("*.md")) + list(long_files_dir.glob("*.json"))
+    for path in sorted(paths):
+        stat = path.stat()
+        digest.update(f"|{path.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def build_bm25_index(long_files_dir: Optional[Path] = None, index_path: Optional[Path] = None,
+                     chunks: Optional[List[Document]] = None) -> BM25Index:
+    """Construit l'index à partir des fichiers prétraités (ou de leurs `chunks` déjà découpés) et le sérialise."""
+    long_files_dir = Path(long_files_dir or Config.LONG_FILES_DIR)
+    index_path = Path(index_path or Config.BM25_INDEX_PATH)
+    start = time.time()
+    fingerprint = corpus_fingerprint(long_files_dir)
+    if chunks is None:
+        chunks = load_chunks(long_files_dir)
+    index = BM25Index(chunks, k1=Config.BM25_K1, b=Config.BM25_B, fingerprint=fingerprint)
+    index.save(index_path)
+    logging.info(f"BM25 index built from {len(chunks)} chunks in {time.time() - start:.2f}s ({index_path})")
+    return index
+
+
+def initialize_bm25_index() -> Optional[BM25Index]:
+    """Index BM25 prêt à l'emploi, ou None si désactivé / aucun document disponible.
+
+    L'index sérialisé est réutilisé tant que l'empreinte des fichiers sources est inchangée.
+    """
+    if not Config.BM25_ENABLED:
+        logging.info("BM25 index disabled (BM25_ENABLED=false).")
+        return None
+    long_files_dir = Path(Config.LONG_FILES_DIR)
+    if not long_files_dir.exists() or not any(long_files_dir.glob("*.md")):
+        logging.warning(f"No preprocessed documents in {long_files_dir}: hybrid search disabled.")
+        return None
+    try:
+        index = BM25Index.load(Config.BM25_INDEX_PATH)
+        if index is not None and index.fingerprint == corpus_fingerprint(long_files_dir):
+            logging.info(f"BM25 index loaded from {Config.BM25_INDEX_PATH} ({len(index)} chunks).")
+            return index
+        return build_bm25_index(long_files_dir, Config.BM25_INDEX_PATH)
+    except Exception as e:
+        logging.exception(f"Failed to initialize BM25 index: {e}. Hybrid search disabled.")
+        return None
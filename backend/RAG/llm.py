@@ -1,8 +1,12 @@
+import functools
 import logging
+import threading
 import time
+import httpx
 import tiktoken
 from typing import Tuple, List, Any, Optional, Dict
 from langchain_openai import ChatOpenAI
+from langchain_core.runnables import Runnable
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema.output_parser import StrOutputParser
 from langchain_core.documents import Document
@@ -52,21 +56,34 @@ def get_helicone_headers(model_id: str, provider: str, source: str = "openai") -
     
     return helicone_headers
 
-def count_tokens(text: str, model: str = "gpt-4o") -> int:
-    """Count tokens for a given text using the appropriate tokenizer."""
+@functools.lru_cache(maxsize=None)
+def get_token_encoding(model: str = "gpt-4o") -> Optional["tiktoken.Encoding"]:
+    """Encodeur tiktoken du modèle, chargé une seule fois ; None s'il est indisponible.
+
+    Au premier appel, tiktoken télécharge l'encodage s'il n'est pas en cache : hors ligne,
+    l'échec est mémorisé pour ne pas relancer (et attendre) le téléchargement à chaque appel.
+    """
     try:
         if "gpt" in model:
             # For OpenAI models
-            encoding = tiktoken.encoding_for_model(model)
-            return len(encoding.encode(text))
-        else:
-            # For non-OpenAI models, use cl100k_base as a reasonable approximation
-            encoding = tiktoken.get_encoding("cl100k_base")
-            return len(encoding.encode(text))
+            return tiktoken.encoding_for_model(model)
+        # For non-OpenAI models, use cl100k_base as a reasonable approximation
+        return tiktoken.get_encoding("cl100k_base")
     except Exception as e:
-        logging.warning(f"Error counting tokens: {e}. Using approximate token count.")
+        logging.warning(f"Tokenizer unavailable for {model}: {e}. Using approximate token counts.")
+        return None
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Count tokens for a given text using the appropriate tokenizer."""
+    encoding = get_token_encoding(model)
+    if encoding is None:
         # Fallback: rough estimate based on words (approx 4 chars per token)
         return len(text) // 4
+    try:
+        return len(encoding.encode(text))
+    except Exception as e:
+        logging.warning(f"Error counting tokens: {e}. Using approximate token count.")
+        return len(text) // 4
 
 def calculate_cost(prompt_tokens: int, completion_tokens: int, model: str = "gpt-4o") -> float:
     """Calculate the cost of a request based on token counts and model."""
@@ -90,74 +107,85 @@ def calculate_cost(prompt_tokens: int, completion_tokens: int, model: str = "gpt
     
     return prompt_cost + completion_cost
 
-def initialize_openai_llm(
-    model_id: str,
-    *,
-    streaming: bool = False,
-    temperature: float = 1.0,
-    top_p: Optional[float] = None,
-    top_k: Optional[int] = None,
-    frequency_penalty: Optional[float] = None,
-    presence_penalty: Optional[float] = None,
-    repetition_penalty: Optional[float] = None,
-    seed: Optional[int] = None,
-    max_tokens: Optional[int] = None,
-) -> ChatOpenAI:
-    """Initialise un LLM OpenAI, en transmettant les paramètres d'échantillonnage facultatifs."""
+# ---------------------------------------------------------------------------
+# Registre des clients LLM ----------------------------------------------------
+# ---------------------------------------------------------------------------
+# Un client ChatOpenAI est construit une seule fois par (modèle, streaming) ; les
+# paramètres d'échantillonnage sont liés à l'appel via `bind`. Les clients d'un même
+# fournisseur partagent un pool de connexions HTTP keep-alive (une paire httpx
+# sync/async par base URL), ce qui évite de refaire la poignée de main TLS à chaque requête.
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+OPENROUTER_HELICONE_BASE_URL = "https://openrouter.helicone.ai/api/v1"
+
+OPENROUTER_PROVIDERS = ["anthropic", "google", "mistral", "xai", "deepseek", "qwen"]
+OPENROUTER_MODEL_KEYWORDS = ["claude", "gemini", "mistral", "grok", "deepseek", "qwen"]
+
+_registry_lock = threading.Lock()
+_llm_clients: Dict[Tuple[str, bool], ChatOpenAI] = {}
+_http_clients: Dict[str, Tuple[httpx.Client, httpx.AsyncClient]] = {}
+
+def get_http_clients(base_url: str) -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """Retourne le pool de connexions (sync, async) partagé pour une base URL."""
+    with _registry_lock:
+        if base_url not in _http_clients:
+            limits = httpx.Limits(
+                max_connections=Config.LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.LLM_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=Config.LLM_HTTP_KEEPALIVE_EXPIRY,
+            )
+            timeout = httpx.Timeout(Config.LLM_HTTP_TIMEOUT, connect=5.0)
+            _http_clients[base_url] = (
+                httpx.Client(limits=limits, timeout=timeout),
+                httpx.AsyncClient(limits=limits, timeout=timeout),
+            )
+            logging.info(f"HTTP connection pool created for {base_url}")
+        return _http_clients[base_url]
+
+def resolve_model(model: Optional[str] = None) -> Tuple[str, str, bool]:
+    """Détermine `(model_id, provider, use_openrouter)` pour le modèle demandé."""
+    # Vérifier si le modèle demandé est disponible
+    if model and model not in Config.AVAILABLE_MODELS:
+        logging.warning(f"Le modèle '{model}' n'est pas disponible. Utilisation du modèle par défaut: {Config.DEFAULT_MODEL}")
+    model_id = model if model and model in Config.AVAILABLE_MODELS else Config.DEFAULT_MODEL
+    
+    # Récupérer le fournisseur du modèle
+    provider = Config.AVAILABLE_MODELS.get(model_id, {}).get("provider", "")
+    
+    # Déterminer s'il faut utiliser OpenRouter
+    use_openrouter = bool(Config.OPENROUTER_API_KEY) and (
+        provider in OPENROUTER_PROVIDERS or
+        any(key in model_id for key in OPENROUTER_MODEL_KEYWORDS)
+    )
+    return model_id, provider, use_openrouter
+
+def _build_openai_client(model_id: str, streaming: bool) -> ChatOpenAI:
+    """Construit un client OpenAI direct (ou via Helicone) sans paramètres d'échantillonnage."""
     openai_kwargs: Dict[str, Any] = {
         "model": model_id,
-        "temperature": temperature,
+        "temperature": 1.0,
+        "api_key": Config.OPENAI_API_KEY,
     }
-    # Ajout des paramètres optionnels s'ils sont fournis (différent de None)
-    if top_p is not None:
-        openai_kwargs["top_p"] = top_p
-    if frequency_penalty is not None:
-        openai_kwargs["frequency_penalty"] = frequency_penalty
-    if presence_penalty is not None:
-        openai_kwargs["presence_penalty"] = presence_penalty
-    if seed is not None:
-        openai_kwargs["seed"] = seed
-    if max_tokens is not None:
-        openai_kwargs["max_tokens"] = max_tokens
-
     if streaming:
         openai_kwargs["streaming"] = True
     
     if Config.USE_HELICONE:
-        helicone_headers = get_helicone_headers(model_id, "openai", "direct")
+        base_url = Config.HELICONE_BASE_URL
         openai_kwargs.update({
-            "base_url": Config.HELICONE_BASE_URL,
-            "default_headers": helicone_headers,
-            "api_key": Config.OPENAI_API_KEY,
+            "base_url": base_url,
+            "default_headers": get_helicone_headers(model_id, "openai", "direct"),
         })
-        logging.info(f"OpenAI LLM initialized with Helicone integration for model {model_id} (temperature={temperature})")
+        logging.info(f"OpenAI LLM client created with Helicone integration for model {model_id}")
     else:
-        openai_kwargs["api_key"] = Config.OPENAI_API_KEY
-        logging.info(f"OpenAI LLM initialized directly (no Helicone) for model {model_id} (temperature={temperature})")
-    
-    # OpenAI API does not support top_k or repetition_penalty; skip them with a warning
-    if top_k is not None:
-        logging.info("top_k is not supported by OpenAI ChatCompletion API; parameter skipped.")
-    if repetition_penalty is not None:
-        logging.info("repetition_penalty is not supported by OpenAI ChatCompletion API; parameter skipped.")
+        base_url = OPENAI_BASE_URL
+        logging.info(f"OpenAI LLM client created directly (no Helicone) for model {model_id}")
     
+    openai_kwargs["http_client"], openai_kwargs["http_async_client"] = get_http_clients(base_url)
     return ChatOpenAI(**openai_kwargs)
 
-def initialize_openrouter_llm(
-    model_id: str,
-    provider: str,
-    *,
-    streaming: bool = False,
-    temperature: float = 1.0,
-    top_p: Optional[float] = None,
-    top_k: Optional[int] = None,
-    frequency_penalty: Optional[float] = None,
-    presence_penalty: Optional[float] = None,
-    repetition_penalty: Optional[float] = None,
-    seed: Optional[int] = None,
-    max_tokens: Optional[int] = None,
-) -> ChatOpenAI:
-    """Initialise un LLM via OpenRouter."""
+def _build_openrouter_client(model_id: str, provider: str, streaming: bool) -> ChatOpenAI:
+    """Construit un client OpenRouter (ou via la passerelle Helicone pour OpenRouter)."""
     # En-têtes de base pour OpenRouter
     openrouter_headers = {
         "HTTP-Referer": Config.SITE_URL,
@@ -166,49 +194,101 @@ def initialize_openrouter_llm(
     
     # Ajouter Helicone si configuré
     if Config.USE_HELICONE:
-        helicone_headers = get_helicone_headers(model_id, provider, "openrouter")
-        openrouter_headers.update(helicone_headers)
-        logging.info(f"OpenRouter headers enhanced with Helicone for model {model_id}")
-        
-        # Utiliser la passerelle Helicone pour OpenRouter
-        base_url = "https://openrouter.helicone.ai/api/v1"
+        openrouter_headers.update(get_helicone_headers(model_id, provider, "openrouter"))
+        base_url = OPENROUTER_HELICONE_BASE_URL
     else:
-        # Endpoint OpenRouter direct
-        base_url = "https://openrouter.ai/api/v1"
+        base_url = OPENROUTER_BASE_URL
     
+    http_client, http_async_client = get_http_clients(base_url)
     llm_kwargs: Dict[str, Any] = {
         "model": model_id,
         "base_url": base_url,
         "api_key": Config.OPENROUTER_API_KEY,
         "default_headers": openrouter_headers,
-        "temperature": temperature,
+        "temperature": 1.0,
+        "http_client": http_client,
+        "http_async_client": http_async_client,
     }
     if streaming:
         llm_kwargs["streaming"] = True
+
+    logging.info(f"OpenRouter LLM client created for model {model_id} via {base_url}")
+    return ChatOpenAI(**llm_kwargs)
+
+def get_llm_client(model: Optional[str] = None, *, streaming: bool = False) -> ChatOpenAI:
+    """Retourne le client partagé pour un modèle, en le créant au premier appel."""
+    model_id, provider, use_openrouter = resolve_model(model)
+    key = (model_id, streaming)
+    with _registry_lock:
+        client = _llm_clients.get(key)
+    if client is not None:
+        return client
+
+    if use_openrouter:
+        client = _build_openrouter_client(model_id, provider, streaming)
+    else:
+        client = _build_openai_client(model_id, streaming)
+    with _registry_lock:
+        # Un autre thread a pu créer le client entre-temps : on garde le premier
+        return _llm_clients.setdefault(key, client)
+
+def register_llm_client(model_id: str, client: ChatOpenAI, *, streaming: bool = False) -> None:
+    """Enregistre un client pré-construit (ex. modèle factice pour les benchmarks)."""
+    with _registry_lock:
+        _llm_clients[(model_id, streaming)] = client
+
+def clear_llm_clients() -> None:
+    """Vide le registre des clients (les pools HTTP sont conservés)."""
+    with _registry_lock:
+        _llm_clients.clear()
+
+def sampling_kwargs(
+    *,
+    use_openrouter: bool,
+    temperature: float = 1.0,
+    top_p: Optional[float] = None,
+    top_k: Optional[int] = None,
+    frequency_penalty: Optional[float] = None,
+    presence_penalty: Optional[float] = None,
+    repetition_penalty: Optional[float] = None,
+    seed: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Construit les paramètres d'échantillonnage transmis à l'appel du modèle."""
+    kwargs: Dict[str, Any] = {"temperature": temperature}
+    # Ajout des paramètres optionnels s'ils sont fournis (différent de None)
     if top_p is not None:
-        llm_kwargs["top_p"] = top_p
+        kwargs["top_p"] = top_p
     if frequency_penalty is not None:
-        llm_kwargs["frequency_penalty"] = frequency_penalty
+        kwargs["frequency_penalty"] = frequency_penalty
     if presence_penalty is not None:
-        llm_kwargs["presence_penalty"] = presence_penalty
+        kwargs["presence_penalty"] = presence_penalty
     if seed is not None:
-        llm_kwargs["seed"] = seed
+        kwargs["seed"] = seed
     if max_tokens is not None:
-        llm_kwargs["max_tokens"] = max_tokens
-    
-    # Provider-specific params to be forwarded via model_kwargs
-    extra_params: Dict[str, Any] = {}
-    if top_k is not None:
-        extra_params["top_k"] = top_k
-    if repetition_penalty is not None:
-        extra_params["repetition_penalty"] = repetition_penalty
-    if extra_params:
-        llm_kwargs["extra_body"] = extra_params
-
-    llm = ChatOpenAI(**llm_kwargs)
-    
-    logging.info(f"OpenRouter LLM initialized for model {model_id} via {base_url} (temperature={temperature})")
-    return llm
+        kwargs["max_tokens"] = max_tokens
+
+    if use_openrouter:
+        # Provider-specific params to be forwarded in the request body
+        extra_params: Dict[str, Any] = {}
+        if top_k is not None:
+            extra_params["top_k"] = top_k
+        if repetition_penalty is not None:
+            extra_params["repetition_penalty"] = repetition_penalty
+        if extra_params:
+            kwargs["extra_body"] = extra_params
+    else:
+        # OpenAI API does not support top_k or repetition_penalty; skip them with a warning
+        if top_k is not None:
+            logging.info("top_k is not supported by OpenAI ChatCompletion API; parameter skipped.")
+        if repetition_penalty is not None:
+            logging.info("repetition_penalty is not supported by OpenAI ChatCompletion API; parameter skipped.")
+    return kwargs
+
+def get_model_name(llm: Runnable) -> str:
+    """Nom du modèle d'un client ou d'un client lié (`RunnableBinding`)."""
+    client = getattr(llm, "bound", llm)
+    return getattr(client, "model_name", None) or Config.DEFAULT_MODEL
 
 def initialize_llm(
     model: Optional[str] = None,
@@ -222,70 +302,43 @@ def initialize_llm(
     repetition_penalty: Optional[float] = None,
     seed: Optional[int] = None,
     max_tokens: Optional[int] = None,
-) -> ChatOpenAI:
-    """Initialise le LLM approprié selon le modèle demandé et la configuration.
+) -> Runnable:
+    """Retourne le LLM approprié selon le modèle demandé, avec ses paramètres d'échantillonnage.
+    
+    Le client sous-jacent provient du registre partagé ; seuls les paramètres
+    d'échantillonnage sont propres à l'appel.
     
     Args:
         model: Identifiant du modèle à utiliser, si None utilise le modèle par défaut
-        streaming: Si True, initialise le LLM en mode streaming
+        streaming: Si True, utilise le client configuré en mode streaming
         temperature: Valeur de température pour le modèle (0.0 - 2.0), défaut 1.0
         
     Returns:
-        Une instance de LLM configurée
+        Le client LLM lié aux paramètres d'échantillonnage
     """
-    # Déterminer le modèle à utiliser
-    model_id = model if model and model in Config.AVAILABLE_MODELS else Config.DEFAULT_MODEL
-    
-    # Vérifier si le modèle demandé est disponible
-    if model and model not in Config.AVAILABLE_MODELS:
-        logging.warning(f"Le modèle '{model}' n'est pas disponible. Utilisation du modèle par défaut: {Config.DEFAULT_MODEL}")
-        model_id = Config.DEFAULT_MODEL
-    
-    # Récupérer le fournisseur du modèle
-    provider = Config.AVAILABLE_MODELS.get(model_id, {}).get("provider", "")
-    
-    # Déterminer s'il faut utiliser OpenRouter
-    use_openrouter = Config.OPENROUTER_API_KEY and (
-        provider in ["anthropic", "google", "mistral", "xai", "deepseek", "qwen"] or  
-        any(key in model_id for key in ["claude", "gemini", "mistral", "grok", "deepseek", "qwen"])
+    model_id, provider, use_openrouter = resolve_model(model)
+    client = get_llm_client(model_id, streaming=streaming)
+    logging.info(
+        f"Using {'OpenRouter' if use_openrouter else 'OpenAI directly'} for model {model_id} "
+        f"(provider: {provider}, temperature={temperature})"
     )
-    
-    # Initialiser le bon type de LLM
-    if use_openrouter:
-        logging.info(f"Using OpenRouter for model {model_id} (provider: {provider})")
-        return initialize_openrouter_llm(
-            model_id,
-            provider,
-            streaming=streaming,
-            temperature=temperature,
-            top_p=top_p,
-            top_k=top_k,
-            frequency_penalty=frequency_penalty,
-            presence_penalty=presence_penalty,
-            repetition_penalty=repetition_penalty,
-            seed=seed,
-            max_tokens=max_tokens,
-        )
-    else:
-        logging.info(f"Using OpenAI directly for model {model_id}")
-        return initialize_openai_llm(
-            model_id,
-            streaming=streaming,
-            temperature=temperature,
-            top_p=top_p,
-            top_k=top_k,
-            frequency_penalty=frequency_penalty,
-            presence_penalty=presence_penalty,
-            repetition_penalty=repetition_penalty,
-            seed=seed,
-            max_tokens=max_tokens,
-        )
+    return client.bind(**sampling_kwargs(
+        use_openrouter=use_openrouter,
+        temperature=temperature,
+        top_p=top_p,
+        top_k=top_k,
+        frequency_penalty=frequency_penalty,
+        presence_penalty=presence_penalty,
+        repetition_penalty=repetition_penalty,
+        seed=seed,
+        max_tokens=max_tokens,
+    ))
 
-def generate_answer(question: str, docs: List[Document], llm: ChatOpenAI, answer_prompt: ChatPromptTemplate) -> Tuple[str, float, Dict[str, Any]]:
+def generate_answer(question: str, docs: List[Document], llm: Runnable, answer_prompt: ChatPromptTemplate) -> Tuple[str, float, Dict[str, Any]]:
     """Génère une réponse à partir d'une question et de documents de contexte."""
     answer_start_time = time.time()
     token_metrics = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost": 0.0}
-    model_id = llm.model_name  # Récupérer le nom du modèle directement depuis l'instance LLM
+    model_id = get_model_name(llm)  # Récupérer le nom du modèle directement depuis l'instance LLM
     
     try:
         logging.info("[Timing] Starting answer generation...")
@@ -322,12 +375,12 @@ def generate_answer(question: str, docs: List[Document], llm: ChatOpenAI, answer
         logging.exception(f"[Timing] Answer generation failed after {answer_duration:.2f} seconds. Error: {e}")
         return f"Error during answer generation: {e}", answer_duration, token_metrics
 
-def evaluate_sources_function(docs: List[Document], question: str, llm: ChatOpenAI, 
+def evaluate_sources_function(docs: List[Document], question: str, llm: Runnable, 
                     source_evaluation_prompt: ChatPromptTemplate, formatted_sources: str) -> Tuple[str, float, Dict[str, Any]]:
     """Évalue la qualité et la pertinence des sources pour une question donnée."""
     eval_start_time = time.time()
     token_metrics = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost": 0.0}
-    model_id = getattr(llm, 'model', Config.DEFAULT_MODEL)
+    model_id = get_model_name(llm)
     
     if not docs:
         logging.warning("Skipping source evaluation: No documents provided.")
@@ -369,9 +422,14 @@ def evaluate_sources_function(docs: List[Document], question: str, llm: ChatOpen
         logging.error(f"[Timing] Source evaluation failed after {eval_duration:.2f} seconds. Error: {e}")
         return f"Error during source evaluation: {e}", eval_duration, token_metrics
 
-def generate_answer_stream(question: str, docs: List[Document], llm: ChatOpenAI, answer_prompt: ChatPromptTemplate):
-    """Generate an answer in a streaming fashion, yielding partial strings."""
-    model_id = llm.model_name  # Récupérer le nom du modèle directement depuis l'instance LLM
+def generate_answer_stream(question: str, docs: List[Document], llm: Runnable, answer_prompt: ChatPromptTemplate,
+                           token_metrics: Optional[Dict[str, Any]] = None):
+    """Generate an answer in a streaming fashion, yielding partial strings.
+
+    Token counts and cost are written into `token_metrics` (if provided) once the
+    stream is exhausted, so concurrent streams never share their metrics.
+    """
+    model_id = get_model_name(llm)  # Récupérer le nom du modèle directement depuis l'instance LLM
 
     if not docs:
         logging.warning("No documents found or provided for context. Answer quality may be poor.")
@@ -381,8 +439,6 @@ def generate_answer_stream(question: str, docs: List[Document], llm: ChatOpenAI,
     formatted_prompt = answer_prompt.format(context=context_string, question=question)
     prompt_tokens = count_tokens(formatted_prompt, model_id)
     
-    # Store the prompt tokens as a variable that will be accessible for the caller
-    # to include in the final metadata
     answer_chain = (answer_prompt | llm | StrOutputParser())
 
     # Store tokens for accumulation
@@ -403,9 +459,121 @@ def generate_answer_stream(question: str, docs: List[Document], llm: ChatOpenAI,
     logging.info(f"[Cost] Stream ${cost:.6f}")
     
     # Store metrics where the caller (rag_core.py) can access them
-    generate_answer_stream.token_metrics = {
-        "prompt_tokens": prompt_tokens,
-        "completion_tokens": completion_tokens,
-        "total_tokens": total_tokens,
-        "cost": cost
-    } 
\ No newline at end of file
+    if token_metrics is not None:
+        token_metrics.update({
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": total_tokens,
+            "cost": cost
+        }) 
+# ---------------------------------------------------------------------------
+# Variantes asynchrones (ainvoke / astream) ----------------------------------
+# ---------------------------------------------------------------------------
+
+async def agenerate_answer(question: str, docs: List[Document], llm: Runnable, answer_prompt: ChatPromptTemplate) -> Tuple[str, float, Dict[str, Any]]:
+    """Variante asynchrone de `generate_answer`, basée sur `ainvoke`."""
+    answer_start_time = time.time()
+    token_metrics = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost": 0.0}
+    model_id = get_model_name(llm)
+
+    try:
+        logging.info("[Timing] Starting async answer generation...")
+        if not docs:
+            logging.warning("No documents found or provided for context. Answer quality may be poor.")
+
+        context_string = "\n\n".join([doc.page_content for doc in docs]) if docs else "No context available."
+
+        formatted_prompt = answer_prompt.format(context=context_string, question=question)
+        prompt_tokens = count_tokens(formatted_prompt, model_id)
+        token_metrics["prompt_tokens"] = prompt_tokens
+
+        answer_chain = (answer_prompt | llm | StrOutputParser())
+        answer = await answer_chain.ainvoke({"context": context_string, "question": question})
+
+        completion_tokens = count_tokens(answer, model_id)
+        token_metrics["completion_tokens"] = completion_tokens
+        token_metrics["total_tokens"] = prompt_tokens + completion_tokens
+        token_metrics["cost"] = calculate_cost(prompt_tokens, completion_tokens, model_id)
+
+        answer_duration = time.time() - answer_start_time
+        logging.info(f"[Timing] Async answer generation finished in {answer_duration:.2f} seconds.")
+        logging.info(f"[Tokens] Prompt: {prompt_tokens}, Completion: {completion_tokens}, Total: {token_metrics['total_tokens']}")
+        logging.info(f"[Cost] ${token_metrics['cost']:.6f}")
+
+        return answer, answer_duration, token_metrics
+    except Exception as e:
+        answer_duration = time.time() - answer_start_time
+        logging.exception(f"[Timing] Async answer generation failed after {answer_duration:.2f} seconds. Error: {e}")
+        return f"Error during answer generation: {e}", answer_duration, token_metrics
+
+async def aevaluate_sources_function(docs: List[Document], question: str, llm: Runnable,
+                    source_evaluation_prompt: ChatPromptTemplate, formatted_sources: str) -> Tuple[str, float, Dict[str, Any]]:
+    """Variante asynchrone de `evaluate_sources_function`, basée sur `ainvoke`."""
+    eval_start_time = time.time()
+    token_metrics = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost": 0.0}
+    model_id = get_model_name(llm)
+
+    if not docs:
+        logging.warning("Skipping source evaluation: No documents provided.")
+        return "Aucune source n'a été trouvée pour répondre à cette question.", 0.0, token_metrics
+
+    try:
+        formatted_prompt = source_evaluation_prompt.format(sources=formatted_sources, question=question)
+        prompt_tokens = count_tokens(formatted_prompt, model_id)
+        token_metrics["prompt_tokens"] = prompt_tokens
+
+        evaluation_chain = (source_evaluation_prompt | llm | StrOutputParser())
+        evaluation = await evaluation_chain.ainvoke({
+            "sources": formatted_sources,
+            "question": question
+        })
+
+        completion_tokens = count_tokens(evaluation, model_id)
+        token_metrics["completion_tokens"] = completion_tokens
+        token_metrics["total_tokens"] = prompt_tokens + completion_tokens
+        token_metrics["cost"] = calculate_cost(prompt_tokens, completion_tokens, model_id)
+
+        eval_duration = time.time() - eval_start_time
+        logging.info(f"[Timing] Async source evaluation finished in {eval_duration:.2f} seconds.")
+        logging.info(f"[Tokens] Eval Prompt: {prompt_tokens}, Completion: {completion_tokens}, Total: {token_metrics['total_tokens']}")
+        logging.info(f"[Cost] Eval ${token_metrics['cost']:.6f}")
+
+        return evaluation, eval_duration, token_metrics
+    except Exception as e:
+        eval_duration = time.time() - eval_start_time
+        logging.error(f"[Timing] Async source evaluation failed after {eval_duration:.2f} seconds. Error: {e}")
+        return f"Error during source evaluation: {e}", eval_duration, token_metrics
+
+async def agenerate_answer_stream(question: str, docs: List[Document], llm: Runnable, answer_prompt: ChatPromptTemplate,
+                                  token_metrics: Optional[Dict[str, Any]] = None):
+    """Variante asynchrone de `generate_answer_stream`, basée sur `astream`."""
+    model_id = get_model_name(llm)
+
+    if not docs:
+        logging.warning("No documents found or provided for context. Answer quality may be poor.")
+
+    context_string = "\n\n".join([doc.page_content for doc in docs]) if docs else "No context available."
+    formatted_prompt = answer_prompt.format(context=context_string, question=question)
+    prompt_tokens = count_tokens(formatted_prompt, model_id)
+
+    answer_chain = (answer_prompt | llm | StrOutputParser())
+
+    completion_text = ""
+    async for chunk in answer_chain.astream({"context": context_string, "question": question}):
+        completion_text += chunk
+        yield chunk
+
+    completion_tokens = count_tokens(completion_text, model_id)
+    total_tokens = prompt_tokens + completion_tokens
+    cost = calculate_cost(prompt_tokens, completion_tokens, model_id)
+
+    logging.info(f"[Tokens] Async Stream Prompt: {prompt_tokens}, Completion: {completion_tokens}, Total: {total_tokens}")
+    logging.info(f"[Cost] Async Stream ${cost:.6f}")
+
+    if token_metrics is not None:
+        token_metrics.update({
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": total_tokens,
+            "cost": cost
+        })
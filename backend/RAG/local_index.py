@@ -0,0 +1,433 @@
+"""
+Index vectoriel local mappé en mémoire (`BDD_PROVIDER="Local"`).
+
+Le corpus (un site d'école, quelques milliers de chunks) tient dans une matrice :
+la recherche top-k est un unique produit matriciel NumPy, sans couche de persistance
+ni aller-retour réseau. Les fichiers sont ouverts en `mmap` (lecture seule), les pages
+sont donc partagées entre les workers d'un même serveur.
+
+Chaque écriture crée une nouvelle version de l'index dans un sous-répertoire ; le fichier
+`CURRENT` contient le nom de la version active et est remplacé par un seul renommage
+atomique. Un lecteur voit donc l'ancienne ou la nouvelle version, jamais un mélange.
+
+Contenu d'une version de l'index :
+    manifest.json   version, nombre de vecteurs, dimension, dtype, modèle d'embedding
+    vectors.npy     matrice (N, D) float32 ou float16, vecteurs normalisés (cosinus) ;
+                    float16 ne réduit que le disque : sans quantification, la matrice est
+                    convertie en float32 au chargement
+    records.bin     texte + métadonnées de chaque chunk (JSON UTF-8 concaténés)
+    offsets.npy     (N + 1) positions de début de chaque enregistrement dans records.bin
+    codes.npy       (optionnel) vecteurs quantifiés : int8 (N, D) ou binaires (N, D / 8)
+    scales.npy      (int8) pas de quantification de chaque dimension
+    centers.npy     (binaire) seuil de chaque dimension (moyenne du corpus)
+
+Avec un index quantifié, seuls les codes sont parcourus en entier : produits scalaires
+entiers int8 · int8 (cumulés en int32), ou distance de Hamming par popcount sur des mots
+de 64 bits pour les codes binaires. `vectors.npy` n'est écrit que si l'index reclasse ses
+candidats (`rescore`, toujours vrai en binaire : le classement par Hamming seul est trop
+grossier) : les `k × LOCAL_INDEX_RESCORE_FACTOR` meilleurs candidats sont alors relus
+depuis ce fichier (pages chargées à la demande par le mmap) et reclassés en pleine précision.
+"""
+
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from .config import Config
+
+INDEX_FORMAT_VERSION = 1
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+RECORDS_FILE = "records.bin"
+OFFSETS_FILE = "offsets.npy"
+CODES_FILE = "codes.npy"
+SCALES_FILE = "scales.npy"
+CENTERS_FILE = "centers.npy"
+
+QUANTIZATIONS = ("none", "int8", "binary")
+
+# Lignes float16 converties en float32 par bloc (recherche exacte sur un index quantifié)
+_SCORE_BLOCK_ROWS = 256
+
+
+def embedding_model_name(embedding: Embeddings) -> Optional[str]:
+    """Nom du modèle d'embedding (enregistré dans le manifeste pour détecter les incohérences)."""
+    return getattr(embedding, "model", None) or getattr(embedding, "model_name", None)
+
+
+def resolve_index_dir(index_dir: Path) -> Path:
+    """Répertoire de la version active (désignée par `CURRENT`), ou `index_dir` lui-même (index sans version)."""
+    index_dir = Path(index_dir)
+    try:
+        version = (index_dir / CURRENT_FILE).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return index_dir
+    return index_dir / version
+
+
+def local_index_exists(index_dir: Path) -> bool:
+    return (resolve_index_dir(index_dir) / MANIFEST_FILE).exists()
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantification scalaire symétrique, un pas par dimension : `vectors ≈ codes * scales`."""
+    scales = np.abs(vectors).max(axis=0) / 127.0 if len(vectors) else np.ones(vectors.shape[1])
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(vectors: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Un bit par dimension (au-dessus ou en dessous du centre), regroupés par octets.
+
+    Les composantes des embeddings ne sont pas centrées : comparer au signe brut
+    donnerait des bits presque constants sur certaines dimensions.
+    """
+    return np.packbits(vectors > centers, axis=1)
+
+
+if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+    _popcount = np.bitwise_count
+    _POPCOUNT_WORD = np.uint64
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    _POPCOUNT_WORD = np.uint8
+
+    def _popcount(values: np.ndarray) -> np.ndarray:
+        return _POPCOUNT_TABLE[values]
+
+
+def _as_words(codes: np.ndarray) -> np.ndarray:
+    """Codes binaires vus comme des mots de 64 bits : un popcount par mot plutôt que par octet."""
+    if codes.shape[-1] % np.dtype(_POPCOUNT_WORD).itemsize == 0:
+        return codes.view(_POPCOUNT_WORD)
+    return codes
+
+
+def write_local_index(
+    index_dir: Path,
+    vectors: np.ndarray,
+    texts: List[str],
+    metadatas: List[dict],
+    *,
+    dtype: str = "float32",
+    quantization: str = "none",
+    rescore: Optional[bool] = None,
+    embedding_model: Optional[str] = None,
+) -> Path:
+    """Écrit un index complet dans une nouvelle version, puis l'active en remplaçant `CURRENT`.
+
+    Le remplacement du pointeur est le seul renommage : il est atomique. Les anciennes
+    versions sont ensuite supprimées ; les processus qui les ont déjà ouvertes continuent
+    de lire leurs fichiers mappés jusqu'à leur rechargement.
+
+    `rescore` (index quantifié) : conserver `vectors.npy` pour reclasser les candidats en
+    pleine précision. Par défaut : toujours en binaire, `LOCAL_INDEX_INT8_RESCORE` en int8.
+    """
+    if dtype not in ("float32", "float16"):
+        raise ValueError(f"Unsupported local index dtype: {dtype} (expected float32 or float16)")
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unsupported local index quantization: {quantization} (expected one of {QUANTIZATIONS})")
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim != 2 or len(vectors) != len(texts) or len(texts) != len(metadatas):
+        raise ValueError("vectors, texts and metadatas must describe the same number of chunks")
+
+    index_dir = Path(index_dir)
+    version = f"v{time.time_ns()}-{os.getpid()}"
+    staging_dir = index_dir / version
+    staging_dir.mkdir(parents=True)
+
+    if quantization == "none":
+        rescore = False
+    elif rescore is None:
+        rescore = quantization == "binary" or Config.LOCAL_INDEX_INT8_RESCORE
+
+    vectors = _normalize_rows(vectors)
+    if quantization == "none" or rescore:
+        np.save(staging_dir / VECTORS_FILE, vectors.astype(dtype))
+    if quantization == "int8":
+        codes, scales = quantize_int8(vectors)
+        np.save(staging_dir / CODES_FILE, codes)
+        np.save(staging_dir / SCALES_FILE, scales)
+    elif quantization == "binary":
+        centers = vectors.mean(axis=0).astype(np.float32) if len(vectors) else np.zeros(vectors.shape[1], np.float32)
+        np.save(staging_dir / CODES_FILE, quantize_binary(vectors, centers))
+        np.save(staging_dir / CENTERS_FILE, centers)
+
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    with open(staging_dir / RECORDS_FILE, "wb") as f:
+        for i, (text, metadata) in enumerate(zip(texts, metadatas)):
+            record = json.dumps({"text": text, "metadata": metadata}, ensure_ascii=False).encode("utf-8")
+            f.write(record)
+            offsets[i + 1] = offsets[i] + len(record)
+    np.save(staging_dir / OFFSETS_FILE, offsets)
+
+    manifest = {
+        "version": INDEX_FORMAT_VERSION,
+        "count": int(vectors.shape[0]),
+        "dimensions": int(vectors.shape[1]),
+        "dtype": dtype,
+        "quantization": quantization,
+        "rescore": rescore,
+        "metric": "cosine",
+        "embedding_model": embedding_model,
+        "created_at": datetime.now().isoformat(),
+    }
+    # Le manifeste est écrit en dernier : un index sans manifeste est incomplet
+    (staging_dir / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    pointer_tmp = index_dir / f"{CURRENT_FILE}.tmp-{os.getpid()}"
+    pointer_tmp.write_text(version, encoding="utf-8")
+    os.replace(pointer_tmp, index_dir / CURRENT_FILE)
+    _remove_stale_versions(index_dir, version)
+    logging.info(
+        f"Local vector index written to {index_dir} ({manifest['count']} vectors, {dtype}, "
+        f"quantization={quantization}, rescore={rescore})"
+    )
+    return index_dir
+
+
+def _remove_stale_versions(index_dir: Path, current: str) -> None:
+    """Supprime les versions inactives (et les fichiers d'un index sans version, désormais masqués)."""
+    for entry in index_dir.iterdir():
+        if entry.is_dir() and entry.name.startswith("v") and entry.name != current:
+            shutil.rmtree(entry, ignore_errors=True)
+        elif entry.is_file() and entry.name in (MANIFEST_FILE, VECTORS_FILE, RECORDS_FILE, OFFSETS_FILE, CODES_FILE, SCALES_FILE, CENTERS_FILE):
+            try:
+                entry.unlink()
+            except OSError:
+                pass  # encore ouvert (Windows) : sera supprimé à la prochaine écriture
+
+
+class LocalVectorIndex(VectorStore):
+    """Recherche par produit scalaire sur des vecteurs normalisés (index plat).
+
+    Exacte par défaut ; sur les codes quantifiés si l'index a été construit avec
+    `quantization="int8"` ou `"binary"`, suivie d'un reclassement en pleine précision
+    des meilleurs candidats si l'index conserve ses vecteurs (`rescore`).
+    L'index est en lecture seule : il est réécrit par les scripts d'indexation
+    (`indexing.sync_local_index`, ou `from_documents` / `from_texts`).
+    """
+
+    def __init__(
+        self,
+        index_dir: Path,
+        embedding: Embeddings,
+        *,
+        check_embedding_model: bool = True,
+        rescore_factor: Optional[int] = None,
+    ):
+        self.index_dir = Path(index_dir)
+        self._embedding = embedding
+        self.rescore_factor = max(1, rescore_factor or Config.LOCAL_INDEX_RESCORE_FACTOR)
+
+        # Version résolue une seule fois : une réécriture concurrente n'affecte pas cette instance
+        files_dir = resolve_index_dir(self.index_dir)
+        manifest_path = files_dir / MANIFEST_FILE
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"Local vector index not found (missing {manifest_path})")
+        self.manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if self.manifest.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported local index version {self.manifest.get('version')} in {self.index_dir}")
+
+        indexed_model = self.manifest.get("embedding_model")
+        query_model = embedding_model_name(embedding)
+        if check_embedding_model and indexed_model and query_model and indexed_model != query_model:
+            raise ValueError(
+                f"Local index {self.index_dir} was built with '{indexed_model}' but queries use '{query_model}'. "
+                "Rebuild the index with the query embedding model."
+            )
+
+        self.quantization = self.manifest.get("quantization", "none")
+        # Index quantifié sans reclassement : pas de copie pleine précision des vecteurs
+        self.rescore = self.quantization != "none" and self.manifest.get("rescore", True)
+        self._vectors = np.load(files_dir / VECTORS_FILE, mmap_mode="r") if self.quantization == "none" or self.rescore else None
+        self._offsets = np.load(files_dir / OFFSETS_FILE, mmap_mode="r")
+        self._records = np.memmap(files_dir / RECORDS_FILE, dtype=np.uint8, mode="r") if self._offsets[-1] else None
+        self._codes = np.load(files_dir / CODES_FILE, mmap_mode="r") if self.quantization != "none" else None
+        self._scales = np.load(files_dir / SCALES_FILE) if self.quantization == "int8" else None
+        self._centers = np.load(files_dir / CENTERS_FILE) if self.quantization == "binary" else None
+        self._words = _as_words(self._codes) if self.quantization == "binary" else None
+        if self.quantization == "none" and self._vectors.dtype != np.float32:
+            # float16 : pas de BLAS en demi-précision, et reconvertir la matrice à chaque requête
+            # coûte plus cher que la recherche. Elle est convertie une fois : float16 n'allège que le disque.
+            self._vectors = np.asarray(self._vectors, dtype=np.float32)
+        logging.info(
+            f"Local vector index loaded from {self.index_dir} "
+            f"({len(self)} vectors, dim {self.manifest['dimensions']}, {self.manifest['dtype']}, "
+            f"quantization={self.quantization})"
+        )
+
+    def __len__(self) -> int:
+        return int(self.manifest["count"])
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+    def _document(self, i: int) -> Document:
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        record = json.loads(self._records[start:end].tobytes().decode("utf-8"))
+        return Document(page_content=record["text"], metadata=record["metadata"])
+
+    def get_vectors(self, ids: Iterable[int]) -> np.ndarray:
+        """Vecteurs normalisés (float32) des chunks `ids` ; reconstruits depuis les codes int8 sans `vectors.npy`."""
+        ids = np.fromiter(ids, dtype=np.int64)
+        if self._vectors is not None:
+            return np.asarray(self._vectors[ids], dtype=np.float32)
+        if self.quantization != "int8":
+            raise ValueError(f"Local index {self.index_dir} has no full-precision vectors")
+        return _normalize_rows(self._codes[ids].astype(np.float32) * self._scales)
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        if self._vectors.dtype == np.float32:
+            return self._vectors @ query
+        # float16 d'un index quantifié (recherche exacte demandée explicitement) : conversion
+        # par blocs dans un tampon float32 réutilisé, pour borner la mémoire
+        scores = np.empty(len(self), dtype=np.float32)
+        buffer = np.empty((_SCORE_BLOCK_ROWS, self._vectors.shape[1]), dtype=np.float32)
+        for start in range(0, len(self), _SCORE_BLOCK_ROWS):
+            block = self._vectors[start:start + _SCORE_BLOCK_ROWS]
+            np.copyto(buffer[:len(block)], block)
+            np.matmul(buffer[:len(block)], query, out=scores[start:start + len(block)])
+        return scores
+
+    def _approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """Scores de première étape calculés sur les codes quantifiés (même ordre que le cosinus)."""
+        if self.quantization == "int8":
+            # `codes · (query × scales)` avec la requête elle-même quantifiée en int8 :
+            # produits entiers cumulés en int32, sans convertir la matrice en flottants
+            scaled_query = query * self._scales
+            query_step = float(np.abs(scaled_query).max()) / 127.0 or 1.0
+            query_codes = np.rint(scaled_query / query_step).astype(np.int8)
+            scores = np.einsum("ij,j->i", self._codes, query_codes, dtype=np.int32)
+            # Ramené à l'échelle du cosinus (scores renvoyés tels quels sans reclassement)
+            return scores.astype(np.float32) * np.float32(query_step)
+        # Binaire : nombre de bits en désaccord (distance de Hamming), négatif pour trier par score décroissant
+        query_words = _as_words(quantize_binary(query[np.newaxis, :], self._centers))[0]
+        return -_popcount(self._words ^ query_words).sum(axis=1, dtype=np.int32).astype(np.float32)
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def search_ids(self, embedding: List[float], k: int, *, exact: bool = False, rescore: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """Retourne `(ids, scores)` des `k` vecteurs les plus proches, par score décroissant.
+
+        Sur un index quantifié, `exact=True` force le parcours complet en pleine précision et
+        `rescore=False` renvoie directement le classement (et les scores) de la première étape.
+        """
+        if len(self) == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        k = min(k, len(self))
+
+        if self.quantization == "none" or exact:
+            if self._vectors is None:
+                raise ValueError(f"Local index {self.index_dir} has no full-precision vectors for an exact search")
+            scores = self._scores(query)
+            top = self._top_k(scores, k)
+            return top, scores[top]
+
+        approximate = self._approximate_scores(query)
+        if not rescore or not self.rescore:
+            top = self._top_k(approximate, k)
+            return top, approximate[top]
+        candidates = np.sort(self._top_k(approximate, min(len(self), k * self.rescore_factor)))
+        # Lecture des seuls candidats dans vectors.npy (triés pour des accès disque séquentiels)
+        scores = np.asarray(self._vectors[candidates], dtype=np.float32) @ query
+        top = self._top_k(scores, k)
+        return candidates[top], scores[top]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        ids, scores = self.search_ids(embedding, k)
+        return [(self._document(int(i)), float(score)) for i, score in zip(ids, scores)]
+
+    def similarity_search_with_vectors(self, embedding: List[float], k: int = 4) -> Tuple[List[Document], np.ndarray]:
+        """Documents les plus proches et leurs vecteurs normalisés (pour MMR, sans seconde lecture)."""
+        ids, _ = self.search_ids(embedding, k)
+        return [self._document(int(i)) for i in ids], self.get_vectors(ids)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    async def asimilarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        # Seul l'embedding de la requête est une E/S ; la recherche elle-même prend moins d'une milliseconde
+        embedding = await self._embedding.aembed_query(query)
+        return self.similarity_search_by_vector_with_score(embedding, k)
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        # Similarité cosinus dans [-1, 1] ramenée dans [0, 1] (bornée : arrondis du float16)
+        return lambda score: min(1.0, max(0.0, (score + 1.0) / 2.0))
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError(
+            "LocalVectorIndex is read-only; update it with RAG.indexing.sync_local_index (scripts/preprocessing/create_vectorstore.py)."
+        )
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        index_dir: Optional[Path] = None,
+        dtype: Optional[str] = None,
+        quantization: Optional[str] = None,
+        batch_size: int = 512,
+        **kwargs: Any,
+    ) -> "LocalVectorIndex":
+        """Calcule les embeddings par lots, écrit l'index dans `index_dir` et l'ouvre."""
+        index_dir = Path(index_dir or Config.LOCAL_INDEX_DIR)
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        start = time.time()
+        vectors = []
+        for i in range(0, len(texts), batch_size):
+            vectors.extend(embedding.embed_documents(texts[i:i + batch_size]))
+        logging.info(f"Embedded {len(texts)} chunks for the local index in {time.time() - start:.1f}s")
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+        write_local_index(
+            index_dir, matrix, texts, metadatas,
+            dtype=dtype or Config.LOCAL_INDEX_DTYPE,
+            quantization=quantization or Config.LOCAL_INDEX_QUANTIZATION,
+            embedding_model=embedding_model_name(embedding),
+        )
+        return cls(index_dir, embedding)
@@ -1,29 +1,58 @@
+import atexit
+import gzip
 import json
 import logging
+import os
+import queue
+import shutil
+import threading
+import time
 from typing import Dict, List, Any, Optional
 from datetime import datetime
+from pathlib import Path
 from .config import Config
 
+# Marqueur de fin transmis au thread d'écriture
+_STOP = object()
+
 class SessionLogger:
-    def __init__(self):
-        self.session_log = {
-            "session_id": datetime.now().strftime('%Y%m%d_%H%M%S'),
-            "interactions": []
-        }
-        logging.info(f"Session logger initialized with ID: {self.session_log['session_id']}")
-    
+    """Journal des interactions au format JSONL (une interaction par ligne).
+
+    `log_interaction` ne fait que déposer l'enregistrement dans une file : l'écriture,
+    le fsync (par lots) et la rotation des fichiers sont réalisés par un thread dédié.
+    Aucun historique n'est conservé en mémoire, seulement un compteur.
+    """
+
+    def __init__(self, log_file: Optional[Path] = None):
+        self.session_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.log_file = Path(log_file or Config.LOG_FILE)
+        self.log_file.parent.mkdir(parents=True, exist_ok=True)
+
+        self._interaction_count = 0
+        self._dropped = 0
+        # log_interaction est appelé depuis plusieurs threads (pool, serveur WSGI)
+        self._count_lock = threading.Lock()
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=Config.LOG_QUEUE_MAX)
+        self._rotation_index = 0
+        self._writer = threading.Thread(target=self._run, name="session-log-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+        logging.info(f"Session logger initialized with ID: {self.session_id} (file: {self.log_file})")
+
     def log_interaction(
-        self, 
-        question: str, 
-        answer: str, 
-        sources: List[Dict[str, Any]], 
-        evaluation: Optional[str], 
-        processing_time: float, 
-        timing_breakdown: Dict[str, float], 
-        error: Optional[str] = None, 
+        self,
+        question: str,
+        answer: str,
+        sources: List[Dict[str, Any]],
+        evaluation: Optional[str],
+        processing_time: float,
+        timing_breakdown: Dict[str, float],
+        error: Optional[str] = None,
         flags: Optional[Dict[str, bool]] = None
     ) -> None:
         interaction = {
+            "session_id": self.session_id,
             "timestamp": datetime.now().isoformat(),
             "question": question,
             "answer": answer,
@@ -33,25 +62,134 @@ class SessionLogger:
             "timing_breakdown": timing_breakdown,
             "flags_used": flags if flags is not None else {}
         }
-        
+
         if error:
             interaction["error"] = str(error)
-        
-        self.session_log["interactions"].append(interaction)
-        self._save_to_file()
-    
-    def _save_to_file(self) -> None:
+
+        # Ne jamais bloquer la requête : si le disque ne suit pas, l'interaction est abandonnée
         try:
-            with open(Config.LOG_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.session_log, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logging.error(f"Failed to write log file {Config.LOG_FILE}: {e}")
-    
+            self._queue.put_nowait(interaction)
+        except queue.Full:
+            with self._count_lock:
+                self._dropped += 1
+                dropped = self._dropped
+            logging.warning(f"Session log queue full, dropped interaction ({dropped} dropped so far).")
+        else:
+            with self._count_lock:
+                self._interaction_count += 1
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Vide la file, écrit les derniers enregistrements sur disque et arrête le thread."""
+        if not self._writer.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._writer.join(timeout)
+
     def get_session_id(self) -> str:
-        return self.session_log["session_id"]
-    
+        return self.session_id
+
     def get_interaction_count(self) -> int:
-        return len(self.session_log["interactions"])
-    
-    def get_session_log(self) -> Dict[str, Any]:
-        return self.session_log 
\ No newline at end of file
+        return self._interaction_count
+
+    def get_log_file(self) -> Path:
+        return self.log_file
+
+    # ------------------------------------------------------------------
+    # Thread d'écriture
+    # ------------------------------------------------------------------
+    def _run(self) -> None:
+        handle = None
+        opened_at = time.monotonic()
+        unsynced = 0
+        last_sync = time.monotonic()
+
+        while True:
+            # Attendre au plus jusqu'à la prochaine échéance de fsync
+            timeout = max(0.0, Config.LOG_FLUSH_INTERVAL_SECONDS - (time.monotonic() - last_sync)) if unsynced else None
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                record = None
+
+            stop = record is _STOP
+            batch = [] if record is None or stop else [record]
+            # Regrouper tout ce qui est déjà en file (une seule écriture pour le lot)
+            while not stop:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    stop = True
+                else:
+                    batch.append(record)
+
+            try:
+                if batch:
+                    if handle is None:
+                        handle = open(self.log_file, 'a', encoding='utf-8')
+                        opened_at = time.monotonic()
+                    lines = self._serialize(batch)
+                    handle.write("".join(lines))
+                    unsynced += len(lines)
+
+                if handle is not None and unsynced and (
+                    stop
+                    or unsynced >= Config.LOG_FSYNC_EVERY
+                    or time.monotonic() - last_sync >= Config.LOG_FLUSH_INTERVAL_SECONDS
+                ):
+                    handle.flush()
+                    os.fsync(handle.fileno())
+                    unsynced = 0
+                    last_sync = time.monotonic()
+
+                if handle is not None and not unsynced and self._should_rotate(handle, opened_at):
+                    handle.close()
+                    handle = None
+                    self._rotate()
+            except Exception as e:
+                logging.error(f"Failed to write log file {self.log_file}: {e}")
+                unsynced = 0
+                if handle is not None:
+                    try:
+                        handle.close()
+                    except Exception:
+                        pass
+                    handle = None
+
+            if stop:
+                if handle is not None:
+                    handle.close()
+                return
+
+    @staticmethod
+    def _serialize(batch: List[Dict[str, Any]]) -> List[str]:
+        """Une ligne JSON par enregistrement ; un enregistrement non sérialisable est ignoré seul."""
+        lines = []
+        for record in batch:
+            try:
+                # default=str : métadonnées de documents (dates, numpy, Path…) écrites sous forme de texte
+                lines.append(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            except (TypeError, ValueError) as e:
+                logging.error(f"Skipping unserializable session log record ({record.get('timestamp')}): {e}")
+        return lines
+
+    @staticmethod
+    def _should_rotate(handle, opened_at: float) -> bool:
+        max_bytes = Config.LOG_ROTATE_MAX_BYTES
+        max_age = Config.LOG_ROTATE_INTERVAL_SECONDS
+        if max_bytes and handle.tell() >= max_bytes:
+            return True
+        return bool(max_age) and time.monotonic() - opened_at >= max_age
+
+    def _rotate(self) -> None:
+        """Renomme le fichier courant (`<nom>.<n>.jsonl`, compressé en option) ; le suivant repart de zéro."""
+        self._rotation_index += 1
+        rotated = self.log_file.with_name(f"{self.log_file.stem}.{self._rotation_index}{self.log_file.suffix}")
+        os.replace(self.log_file, rotated)
+        if Config.LOG_ROTATE_GZIP:
+            with open(rotated, 'rb') as src, gzip.open(f"{rotated}.gz", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            rotated.unlink()
+            rotated = Path(f"{rotated}.gz")
+        logging.info(f"Session log rotated to {rotated}")
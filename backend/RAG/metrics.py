@@ -0,0 +1,98 @@
+"""
+Métriques Prometheus du pipeline RAG (client officiel `prometheus_client`).
+
+Les histogrammes de latence par étape (retrieval, reranking, expansion multi-query,
+génération, time-to-first-token, évaluation des sources) et les compteurs (tokens,
+coût, erreurs, cache) sont exposés par `/api/metrics` ; les percentiles p50/p95/p99
+s'obtiennent côté Prometheus avec `histogram_quantile`.
+"""
+
+from typing import Dict
+
+from prometheus_client import CONTENT_TYPE_LATEST as CONTENT_TYPE, Counter, Gauge, Histogram, generate_latest
+
+# Bornes (secondes) adaptées à des étapes allant de quelques ms (recherche) à la minute (génération)
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+# ---------------------------------------------------------------------------
+# Métriques du pipeline RAG --------------------------------------------------
+# ---------------------------------------------------------------------------
+
+STAGE_DURATION = Histogram(
+    "rag_stage_duration_seconds",
+    "Duration of each pipeline stage (retrieval, vector_search, rerank, multi_query_expansion, answer_generation, source_evaluation).",
+    ("stage", "model", "retrieval_mode"),
+    buckets=DEFAULT_LATENCY_BUCKETS,
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "rag_time_to_first_token_seconds",
+    "Time from request start to the first streamed answer token.",
+    ("model", "retrieval_mode"),
+    buckets=DEFAULT_LATENCY_BUCKETS,
+)
+REQUEST_DURATION = Histogram(
+    "rag_request_duration_seconds",
+    "End-to-end duration of answered questions.",
+    ("mode", "model", "retrieval_mode", "cache"),
+    buckets=DEFAULT_LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    "rag_requests_total",
+    "Questions answered by the RAG pipeline.",
+    ("mode", "model", "retrieval_mode", "outcome"),
+)
+TOKENS = Counter(
+    "rag_tokens_total",
+    "LLM tokens consumed (answer generation and source evaluation).",
+    ("model", "type"),
+)
+COST = Counter(
+    "rag_cost_usd_total",
+    "Estimated LLM cost in USD.",
+    ("model",),
+)
+ERRORS = Counter(
+    "rag_errors_total",
+    "Errors by pipeline stage.",
+    ("stage",),
+)
+CACHE_LOOKUPS = Counter(
+    "rag_semantic_cache_lookups_total",
+    "Semantic cache lookups by result.",
+    ("result",),
+)
+COALESCED_REQUESTS = Counter(
+    "rag_coalesced_requests_total",
+    "Requests served by joining an identical in-flight pipeline execution.",
+)
+
+# Contrôle d'admission (app/admission.py)
+ADMISSION_ACTIVE = Gauge(
+    "rag_admission_active",
+    "Requests currently holding an admission slot.",
+    ("endpoint",),
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "rag_admission_queue_depth",
+    "Requests waiting for an admission slot.",
+    ("endpoint",),
+)
+ADMISSION_WAIT = Histogram(
+    "rag_admission_wait_seconds",
+    "Time spent in the admission queue before being served.",
+    ("endpoint",),
+    buckets=DEFAULT_LATENCY_BUCKETS,
+)
+ADMISSION_REJECTED = Counter(
+    "rag_admission_rejected_total",
+    "Requests rejected by admission control.",
+    ("endpoint", "reason"),
+)
+
+
+def observe_stages(timings: Dict[str, float], model: str, retrieval_mode: str) -> None:
+    """Enregistre les durées d'un dict `{étape}_s` (ex. `timing_breakdown`, timings du retrieval)."""
+    for key, seconds in timings.items():
+        if key.endswith("_s") and seconds:
+            STAGE_DURATION.labels(stage=key[:-2], model=model, retrieval_mode=retrieval_mode).observe(seconds)
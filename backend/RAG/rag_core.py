@@ -1,61 +1,115 @@
 """Advanced RAG implementation with support for multiple LLM providers and reranking."""
 
+import asyncio
 import time
 import logging
 import json
-from typing import Dict, List, Any, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Hashable, Tuple
+
+import numpy as np
 
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
 
 from .config import Config
 from .embeddings import initialize_embeddings
-from .vectorstore import initialize_vectorstore
-from .retrieval import (initialize_retrievers, initialize_reranker, retrieve_documents, format_sources, collect_source_metadata)
-from .llm import (initialize_llm, generate_answer, evaluate_sources_function, generate_answer_stream)
+from .vectorstore import initialize_vectorstore, vectorstore_fingerprint
+from .retrieval import (initialize_retrievers, initialize_reranker, retrieve_documents, aretrieve_documents,
+                        format_sources, collect_source_metadata)
+from .llm import (initialize_llm, get_llm_client, generate_answer, agenerate_answer, evaluate_sources_function,
+                  aevaluate_sources_function, generate_answer_stream, agenerate_answer_stream)
 from .prompts import initialize_prompts
+from .context import prepare_context
 from .logging_utils import SessionLogger
+from .semantic_cache import SemanticCache
+from .coalescing import RequestCoalescer, normalize_question
+from . import metrics
+
+# Paramètres d'échantillonnage transmis tels quels au LLM (réponse et évaluation)
+SAMPLING_PARAMS = (
+    "temperature", "top_p", "top_k", "frequency_penalty", "presence_penalty",
+    "repetition_penalty", "seed", "max_tokens",
+)
+
+def _empty_token_metrics() -> Dict[str, Any]:
+    return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost": 0.0}
+
+def _add_token_metrics(total: Dict[str, Any], part: Dict[str, Any]) -> None:
+    for key in ("prompt_tokens", "completion_tokens", "total_tokens", "cost"):
+        total[key] += part[key]
 
 class AdvancedRAG:
     """Advanced RAG implementation with support for reranking and source evaluation."""
-    
-    def __init__(self):
-        self.embeddings = initialize_embeddings()
-        self.vectorstore = initialize_vectorstore(self.embeddings)
-        self.llm = initialize_llm(streaming=False)
-        self.retrievers = initialize_retrievers(self.vectorstore, self.llm)
-        self.reranker_compressor = initialize_reranker()
+
+    def __init__(
+        self,
+        *,
+        embeddings: Optional[Embeddings] = None,
+        vectorstore: Optional[VectorStore] = None,
+        retrievers: Optional[Dict[str, Any]] = None,
+        reranker_compressor: Optional[Any] = None,
+    ):
+        """Les composants peuvent être injectés (benchmarks, tests) ; sinon ils sont créés depuis Config.
+
+        Le LLM provient toujours du registre de `llm.py` (voir `register_llm_client`).
+        """
+        self.embeddings = embeddings if embeddings is not None else initialize_embeddings()
+        self.vectorstore = vectorstore if vectorstore is not None else initialize_vectorstore(self.embeddings)
+        self.llm = get_llm_client()
+        self.retrievers = retrievers if retrievers is not None else initialize_retrievers(self.vectorstore, self.llm)
+        self.reranker_compressor = reranker_compressor if reranker_compressor is not None else initialize_reranker()
         self.answer_prompt, self.source_evaluation_prompt = initialize_prompts()
-        
+        self.semantic_cache = SemanticCache(
+            self.embeddings,
+            threshold=Config.SEMANTIC_CACHE_THRESHOLD,
+            max_entries=Config.SEMANTIC_CACHE_MAX_ENTRIES,
+            ttl_seconds=Config.SEMANTIC_CACHE_TTL_SECONDS,
+            fingerprint_fn=vectorstore_fingerprint,
+        ) if Config.SEMANTIC_CACHE_ENABLED else None
+        self.coalescer = RequestCoalescer() if Config.REQUEST_COALESCING_ENABLED else None
+
+        # Pool partagé pour exécuter l'évaluation des sources en parallèle de la génération
+        self.executor = ThreadPoolExecutor(
+            max_workers=Config.EVALUATION_WORKERS, thread_name_prefix="rag-eval"
+        )
+
         self.logger = SessionLogger()
-        
+
         logging.info(f"AdvancedRAG initialized with session ID: {self.logger.get_session_id()}")
-    
-    def answer_question(
-        self,
-        question: str,
+
+    # ------------------------------------------------------------------
+    # Shared helpers ----------------------------------------------------
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _build_flags(
         *,
-        use_reranker: bool = False,
-        use_multi_query: bool = False,
-        evaluate_sources: bool = False,
-        model: Optional[str] = None,
-        temperature: float = 1.0,
-        top_p: Optional[float] = None,
-        top_k: Optional[int] = None,
-        frequency_penalty: Optional[float] = None,
-        presence_penalty: Optional[float] = None,
-        repetition_penalty: Optional[float] = None,
-        seed: Optional[int] = None,
-        max_tokens: Optional[int] = None,
-        k: Optional[int] = None,
-        rerank_k: Optional[int] = None,
+        use_reranker: bool,
+        use_multi_query: bool,
+        use_hybrid: Optional[bool],
+        use_mmr: Optional[bool],
+        evaluate_sources: bool,
+        model: Optional[str],
+        temperature: float,
+        top_p: Optional[float],
+        top_k: Optional[int],
+        frequency_penalty: Optional[float],
+        presence_penalty: Optional[float],
+        repetition_penalty: Optional[float],
+        seed: Optional[int],
+        max_tokens: Optional[int],
+        k: Optional[int],
+        rerank_k: Optional[int],
     ) -> Dict[str, Any]:
-        total_start_time = time.time()
-        model_used = model if model and model in Config.AVAILABLE_MODELS else Config.DEFAULT_MODEL
-        flags_used = {
+        """Flags effectifs d'une requête (journalisés et utilisés comme clé de cache)."""
+        return {
             "use_reranker": use_reranker,
             "use_multi_query": use_multi_query,
+            "use_hybrid": Config.HYBRID_SEARCH_DEFAULT if use_hybrid is None else bool(use_hybrid),
+            "use_mmr": Config.MMR_DEFAULT if use_mmr is None else bool(use_mmr),
             "evaluate_sources": evaluate_sources,
-            "model": model_used,
+            "model": model if model and model in Config.AVAILABLE_MODELS else Config.DEFAULT_MODEL,
             "temperature": temperature,
             "top_p": top_p,
             "top_k": top_k,
@@ -67,204 +121,497 @@ class AdvancedRAG:
             "k": k,
             "rerank_k": rerank_k,
         }
-        logging.info(f"--- Starting answer_question for: '{question[:50]}...' (Flags: {flags_used}) ---")
 
-        # Initialize token metrics
-        token_metrics = {
+    @staticmethod
+    def _sampling(flags: Dict[str, Any]) -> Dict[str, Any]:
+        return {name: flags[name] for name in SAMPLING_PARAMS}
+
+    def _retrieval_mode(self, flags: Dict[str, Any]) -> str:
+        """Mode de retrieval effectif (label des métriques), même priorité que `retrieve_documents`."""
+        if flags["use_reranker"] and self.reranker_compressor:
+            mode = "rerank"
+        else:
+            mode = "multi_query" if flags["use_multi_query"] else "base"
+        if flags["use_hybrid"] and "hybrid" in self.retrievers:
+            return "hybrid" if mode == "base" else f"{mode}_hybrid"
+        return mode
+
+    def _record_metrics(
+        self,
+        mode: str,
+        flags: Dict[str, Any],
+        outcome: str,
+        duration: float,
+        timing_breakdown: Optional[Dict[str, float]] = None,
+        token_metrics: Optional[Dict[str, Any]] = None,
+        time_to_first_token: Optional[float] = None,
+    ) -> None:
+        """Alimente les histogrammes et compteurs exposés par `/api/metrics`."""
+        model, retrieval_mode = flags["model"], self._retrieval_mode(flags)
+        metrics.REQUESTS.labels(mode=mode, model=model, retrieval_mode=retrieval_mode, outcome=outcome).inc()
+        metrics.REQUEST_DURATION.labels(
+            mode=mode, model=model, retrieval_mode=retrieval_mode, cache="hit" if outcome == "cache_hit" else "miss"
+        ).observe(duration)
+        if timing_breakdown:
+            metrics.observe_stages(timing_breakdown, model, retrieval_mode)
+        if time_to_first_token is not None:
+            metrics.TIME_TO_FIRST_TOKEN.labels(model=model, retrieval_mode=retrieval_mode).observe(time_to_first_token)
+        if token_metrics:
+            metrics.TOKENS.labels(model=model, type="prompt").inc(token_metrics["prompt_tokens"])
+            metrics.TOKENS.labels(model=model, type="completion").inc(token_metrics["completion_tokens"])
+            metrics.COST.labels(model=model).inc(token_metrics["cost"])
+
+    def _retrieval_error_result(self, question: str, flags: Dict[str, Any], error: Exception, start_time: float) -> Dict[str, Any]:
+        retrieval_duration = time.time() - start_time
+        error_result = {
+            "answer": "Error during document retrieval phase. Cannot proceed.",
+            "source_evaluation": None,
+            "sources": [],
+            "processing_time": time.time() - start_time,
+            "error": str(error),
+            "flags": flags,
             "prompt_tokens": 0,
             "completion_tokens": 0,
             "total_tokens": 0,
-            "cost": 0.0
+            "cost": 0.0,
+            "cache": self._cache_info(False),
         }
 
-        # Step 1: Document Retrieval
-        try:
-            # Si l'utilisateur a fourni des valeurs k personnalisées, créez des retrieveurs temporaires
-            if k is not None or rerank_k is not None:
-                # Sauvegarder les valeurs originales
-                original_k = Config.DEFAULT_K
-                original_rerank_k = Config.RERANK_K
-
-                # Appliquer les valeurs temporaires
-                if k is not None:
-                    Config.DEFAULT_K = k
-                    logging.info(f"DEBUG: Temporarily set Config.DEFAULT_K to {Config.DEFAULT_K}")
-                if rerank_k is not None:
-                    Config.RERANK_K = rerank_k
-                    logging.info(f"DEBUG: Temporarily set Config.RERANK_K to {Config.RERANK_K}")
-
-                # Réinitialiser les retrieveurs avec les nouvelles valeurs
-                temp_retrievers = initialize_retrievers(self.vectorstore, self.llm)
-
-                docs, retrieval_duration, retriever_used = retrieve_documents(
-                    question,
-                    temp_retrievers,
-                    self.reranker_compressor,
-                    use_reranker,
-                    use_multi_query=use_multi_query
-                )
-
-                # Restaurer les anciennes valeurs pour éviter les effets de bord
-                Config.DEFAULT_K = original_k
-                Config.RERANK_K = original_rerank_k
-                logging.info(f"DEBUG: Restored Config.DEFAULT_K to {Config.DEFAULT_K}, Config.RERANK_K to {Config.RERANK_K}")
-            else:
-                docs, retrieval_duration, retriever_used = retrieve_documents(
-                question, 
-                self.retrievers,
-                self.reranker_compressor, 
-                use_reranker,
-                use_multi_query=use_multi_query
-            )
-        except Exception as e:
-            retrieval_duration = time.time() - total_start_time
-            logging.exception(f"[Timing] Document retrieval failed after {retrieval_duration:.2f} seconds. Error: {e}")
-            
-            error_result = {
-                "answer": "Error during document retrieval phase. Cannot proceed.",
-                "source_evaluation": None,
-                "sources": [],
-                "processing_time": time.time() - total_start_time,
-                "error": str(e),
-                "flags": flags_used,
-                "prompt_tokens": 0,
-                "completion_tokens": 0,
-                "total_tokens": 0,
-                "cost": 0.0
-            }
-            
-            self.logger.log_interaction(
-                question=question, 
-                answer=error_result['answer'], 
-                sources=[], 
-                evaluation=None, 
-                processing_time=error_result['processing_time'],
-                timing_breakdown={"retrieval_s": retrieval_duration}, 
-                error=str(e), 
-                flags=flags_used
-            )
-            
-            return error_result
-
-        # Step 2: Answer Generation
-        # Si un modèle spécifique est demandé, initialiser un nouveau LLM avec la température spécifiée
-        if model and model != Config.DEFAULT_MODEL:
-            llm = initialize_llm(
-                model=model,
-                temperature=temperature,
-                top_p=top_p,
-                top_k=top_k,
-                frequency_penalty=frequency_penalty,
-                presence_penalty=presence_penalty,
-                repetition_penalty=repetition_penalty,
-                seed=seed,
-                max_tokens=max_tokens,
-                streaming=False,
-            )
-            logging.info(f"Using specific model for this generation: {model} (temperature={temperature})")
-        else:
-            # Utiliser le LLM par défaut mais avec la température spécifiée
-            llm = initialize_llm(
-                temperature=temperature,
-                top_p=top_p,
-                top_k=top_k,
-                frequency_penalty=frequency_penalty,
-                presence_penalty=presence_penalty,
-                repetition_penalty=repetition_penalty,
-                seed=seed,
-                max_tokens=max_tokens,
-                streaming=False,
-            )
-            logging.info(f"Using default model with temperature={temperature}")
-            
-        answer, answer_duration, answer_metrics = generate_answer(
-            question=question, 
-            docs=docs, 
-            llm=llm,
-            answer_prompt=self.answer_prompt
+        self.logger.log_interaction(
+            question=question,
+            answer=error_result['answer'],
+            sources=[],
+            evaluation=None,
+            processing_time=error_result['processing_time'],
+            timing_breakdown={"retrieval_s": retrieval_duration},
+            error=str(error),
+            flags=flags
         )
-        
-        # Update token metrics
-        token_metrics["prompt_tokens"] += answer_metrics["prompt_tokens"]
-        token_metrics["completion_tokens"] += answer_metrics["completion_tokens"]
-        token_metrics["total_tokens"] += answer_metrics["total_tokens"]
-        token_metrics["cost"] += answer_metrics["cost"]
-
-        # Step 3: Optional Source Evaluation
-        source_evaluation = None
-        evaluation_duration = 0.0
-        
-        if evaluate_sources and docs:
-            formatted_sources = format_sources(docs)
-            # Pour l'évaluation des sources, utiliser le même paramètre de température
-            eval_llm = initialize_llm(
-                temperature=temperature,
-                top_p=top_p,
-                top_k=top_k,
-                frequency_penalty=frequency_penalty,
-                presence_penalty=presence_penalty,
-                repetition_penalty=repetition_penalty,
-                seed=seed,
-                max_tokens=max_tokens,
-            )
-            source_evaluation, evaluation_duration, eval_metrics = evaluate_sources_function(
-                docs=docs, 
-                question=question, 
-                llm=eval_llm,
-                source_evaluation_prompt=self.source_evaluation_prompt,
-                formatted_sources=formatted_sources
-            )
-            
-            # Update token metrics with evaluation metrics
-            token_metrics["prompt_tokens"] += eval_metrics["prompt_tokens"]
-            token_metrics["completion_tokens"] += eval_metrics["completion_tokens"]
-            token_metrics["total_tokens"] += eval_metrics["total_tokens"]
-            token_metrics["cost"] += eval_metrics["cost"]
-            
-        elif evaluate_sources:
-            logging.warning("[Timing] Skipping source evaluation because no documents were retrieved.")
-            source_evaluation = "Evaluation skipped: No documents retrieved."
-        else:
-            logging.info("[Timing] Skipping source evaluation (evaluate_sources=False).")
+        metrics.ERRORS.labels(stage="retrieval").inc()
+        self._record_metrics("answer", flags, "error", error_result['processing_time'])
+        return error_result
 
-        # Step 4: Collect source metadata
+    def _finalize_answer(
+        self,
+        question: str,
+        flags: Dict[str, Any],
+        docs: List[Document],
+        answer: str,
+        source_evaluation: Optional[str],
+        timing_breakdown: Dict[str, float],
+        token_metrics: Dict[str, Any],
+        question_vector: Optional[np.ndarray],
+        start_time: float,
+    ) -> Dict[str, Any]:
+        """Journalise l'interaction, alimente le cache et construit le résultat final."""
+        # Collect source metadata
         sources = collect_source_metadata(docs)
 
         # Calculate total processing time
-        total_processing_time = time.time() - total_start_time
+        total_processing_time = time.time() - start_time
 
-        # Step 5: Log the interaction
+        # Log the interaction
         self.logger.log_interaction(
-            question=question, 
-            answer=answer, 
-            sources=sources, 
+            question=question,
+            answer=answer,
+            sources=sources,
             evaluation=source_evaluation,
             processing_time=total_processing_time,
-            timing_breakdown={
-                "retrieval_s": retrieval_duration,
-                "answer_generation_s": answer_duration,
-                "source_evaluation_s": evaluation_duration
-            },
-            flags=flags_used
+            timing_breakdown=timing_breakdown,
+            flags=flags
         )
 
-        logging.info(f"--- Finished answer_question in {total_processing_time:.2f} seconds (Flags: {flags_used}) ---")
+        logging.info(f"--- Finished answer_question in {total_processing_time:.2f} seconds (Flags: {flags}) ---")
         logging.info(f"--- Total tokens: {token_metrics['total_tokens']} (Prompt: {token_metrics['prompt_tokens']}, Completion: {token_metrics['completion_tokens']}) ---")
         logging.info(f"--- Total cost: ${token_metrics['cost']:.6f} ---")
 
+        # Store in the semantic cache (only successful generations)
+        answer_failed = answer.startswith("Error during answer generation")
+        if answer_failed:
+            metrics.ERRORS.labels(stage="answer_generation").inc()
+        if source_evaluation and source_evaluation.startswith("Error during source evaluation"):
+            metrics.ERRORS.labels(stage="source_evaluation").inc()
+        self._record_metrics(
+            "answer", flags, "error" if answer_failed else "ok", total_processing_time,
+            timing_breakdown=timing_breakdown, token_metrics=token_metrics,
+        )
+        if not answer_failed:
+            self._cache_store(question_vector, flags, question, {
+                "answer": answer,
+                "source_evaluation": source_evaluation,
+                "sources": sources,
+                "model": flags["model"],
+                "temperature": flags["temperature"],
+            })
+
         # Return the final result with token metrics
         return {
             "answer": answer,
             "source_evaluation": source_evaluation,
             "sources": sources,
             "processing_time": total_processing_time,
-            "model": model_used,
-            "temperature": temperature,  # Inclure la température dans la réponse
+            "model": flags["model"],
+            "temperature": flags["temperature"],  # Inclure la température dans la réponse
             "prompt_tokens": token_metrics["prompt_tokens"],
             "completion_tokens": token_metrics["completion_tokens"],
             "total_tokens": token_metrics["total_tokens"],
-            "cost": token_metrics["cost"]
-        } 
+            "cost": token_metrics["cost"],
+            "cache": self._cache_info(False),
+        }
+
+    def _stream_metadata(self, flags: Dict[str, Any], docs: List[Document], token_metrics: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+        """Métadonnées émises en fin de stream (format attendu par le frontend)."""
+        return {
+            "type": "metadata",
+            "sources": collect_source_metadata(docs),
+            "processingTime": time.time() - start_time,
+            "model": flags["model"],
+            "temperature": flags["temperature"],  # Inclure la température dans les métadonnées
+            "promptTokens": token_metrics["prompt_tokens"],
+            "completionTokens": token_metrics["completion_tokens"],
+            "totalTokens": token_metrics["total_tokens"],
+            "cost": token_metrics["cost"],
+            "cache": self._cache_info(False),
+        }
+
+    def _add_stream_evaluation(self, metadata: Dict[str, Any], evaluation_text: str, eval_metrics: Dict[str, Any]) -> None:
+        metadata["evaluation"] = evaluation_text
+
+        # Add evaluation tokens and cost to the total
+        metadata["promptTokens"] += eval_metrics["prompt_tokens"]
+        metadata["completionTokens"] += eval_metrics["completion_tokens"]
+        metadata["totalTokens"] += eval_metrics["total_tokens"]
+        metadata["cost"] += eval_metrics["cost"]
+
+    def _finalize_stream(
+        self,
+        question: str,
+        flags: Dict[str, Any],
+        metadata: Dict[str, Any],
+        answer_chunks: List[str],
+        question_vector: Optional[np.ndarray],
+        timing_breakdown: Dict[str, float],
+        time_to_first_token: Optional[float],
+    ) -> None:
+        evaluation = metadata.get("evaluation")
+        if evaluation and evaluation.startswith("Error during source evaluation"):
+            metrics.ERRORS.labels(stage="source_evaluation").inc()
+        self._record_metrics(
+            "stream", flags, "ok", metadata["processingTime"],
+            timing_breakdown=timing_breakdown,
+            token_metrics={
+                "prompt_tokens": metadata["promptTokens"],
+                "completion_tokens": metadata["completionTokens"],
+                "cost": metadata["cost"],
+            },
+            time_to_first_token=time_to_first_token,
+        )
+        self._cache_store(question_vector, flags, question, {
+            "answer": "".join(answer_chunks),
+            "source_evaluation": metadata.get("evaluation"),
+            "sources": metadata["sources"],
+            "model": flags["model"],
+            "temperature": flags["temperature"],
+        })
+
+        # Log total tokens and cost
+        logging.info(f"--- Total tokens for streaming: {metadata['totalTokens']} (Prompt: {metadata['promptTokens']}, Completion: {metadata['completionTokens']}) ---")
+        logging.info(f"--- Total cost for streaming: ${metadata['cost']:.6f} ---")
+
+    # ------------------------------------------------------------------
+    # Semantic cache ----------------------------------------------------
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _cache_partition(flags: Dict[str, Any]) -> Hashable:
+        """Clé de partition du cache : une réponse n'est réutilisée qu'à flags identiques."""
+        return tuple(sorted(flags.items()))
+
+    def _cache_lookup(self, question: str, flags: Dict[str, Any]) -> Tuple[Optional[np.ndarray], Optional[Tuple[Dict[str, Any], float]]]:
+        """Retourne `(embedding de la question, (payload, similarité) ou None)`.
+
+        Une erreur du cache (ex. embeddings indisponibles) n'est jamais bloquante :
+        la requête suit alors le pipeline normal.
+        """
+        if self.semantic_cache is None:
+            return None, None
+        try:
+            vector = self.semantic_cache.embed(question)
+            cached = self.semantic_cache.lookup(vector, self._cache_partition(flags), question)
+            metrics.CACHE_LOOKUPS.labels(result="miss" if cached is None else "hit").inc()
+            return vector, cached
+        except Exception as e:
+            logging.warning(f"Semantic cache lookup failed, continuing without cache: {e}")
+            return None, None
+
+    async def _acache_lookup(self, question: str, flags: Dict[str, Any]) -> Tuple[Optional[np.ndarray], Optional[Tuple[Dict[str, Any], float]]]:
+        """Variante asynchrone de `_cache_lookup` (embedding calculé sans bloquer la boucle)."""
+        if self.semantic_cache is None:
+            return None, None
+        try:
+            vector = await self.semantic_cache.aembed(question)
+            cached = self.semantic_cache.lookup(vector, self._cache_partition(flags), question)
+            metrics.CACHE_LOOKUPS.labels(result="miss" if cached is None else "hit").inc()
+            return vector, cached
+        except Exception as e:
+            logging.warning(f"Semantic cache lookup failed, continuing without cache: {e}")
+            return None, None
+
+    def _retrieval_vector(self, question_vector: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Embedding du cache réutilisable pour la recherche : seulement si le vectorstore
+        utilise le même modèle (pas Pinecone, dont l'embedding est intégré à l'index)."""
+        if question_vector is None or getattr(self.vectorstore, "embeddings", None) is not self.embeddings:
+            return None
+        return question_vector
+
+    def _cache_store(self, vector: Optional[np.ndarray], flags: Dict[str, Any], question: str, payload: Dict[str, Any]) -> None:
+        if self.semantic_cache is None or vector is None:
+            return
+        try:
+            self.semantic_cache.store(vector, self._cache_partition(flags), question, payload)
+        except Exception as e:
+            logging.warning(f"Semantic cache store failed: {e}")
+
+    def _cache_info(self, hit: bool, similarity: Optional[float] = None) -> Dict[str, Any]:
+        info: Dict[str, Any] = {"hit": hit}
+        if similarity is not None:
+            info["similarity"] = similarity
+        if self.semantic_cache is not None:
+            stats = self.semantic_cache.stats()
+            info["hits"] = stats["hits"]
+            info["misses"] = stats["misses"]
+        return info
+
+    def _cache_hit_result(self, question: str, flags: Dict[str, Any], cached: Tuple[Dict[str, Any], float], start_time: float) -> Dict[str, Any]:
+        payload, similarity = cached
+        total_processing_time = time.time() - start_time
+        self.logger.log_interaction(
+            question=question,
+            answer=payload["answer"],
+            sources=payload["sources"],
+            evaluation=payload["source_evaluation"],
+            processing_time=total_processing_time,
+            timing_breakdown={"cache_lookup_s": total_processing_time},
+            flags={**flags, "cache_hit": True}
+        )
+        logging.info(f"--- Semantic cache hit (similarity={similarity:.3f}) in {total_processing_time:.3f} seconds ---")
+        self._record_metrics("answer", flags, "cache_hit", total_processing_time)
+        return {
+            **payload,
+            "processing_time": total_processing_time,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_tokens": 0,
+            "cost": 0.0,
+            "cache": self._cache_info(True, similarity),
+        }
+
+    def _cache_hit_stream(self, flags: Dict[str, Any], cached: Tuple[Dict[str, Any], float], start_time: float) -> List[str]:
+        """Chunks émis pour un hit en streaming : la réponse complète puis les métadonnées."""
+        payload, similarity = cached
+        logging.info(f"--- Semantic cache hit for streaming (similarity={similarity:.3f}) ---")
+        self._record_metrics("stream", flags, "cache_hit", time.time() - start_time)
+        metadata = {
+            "type": "metadata",
+            "sources": payload["sources"],
+            "processingTime": time.time() - start_time,
+            "model": payload["model"],
+            "temperature": payload["temperature"],
+            "promptTokens": 0,
+            "completionTokens": 0,
+            "totalTokens": 0,
+            "cost": 0.0,
+            "cache": self._cache_info(True, similarity),
+        }
+        if payload["source_evaluation"] is not None:
+            metadata["evaluation"] = payload["source_evaluation"]
+        return [payload["answer"], json.dumps(metadata)]
+
+    # ------------------------------------------------------------------
+    # Request coalescing ------------------------------------------------
+    # ------------------------------------------------------------------
+    def _coalescing_key(self, question: str, flags: Dict[str, Any]) -> Hashable:
+        """Deux requêtes partagent une exécution si la question normalisée et les flags effectifs sont identiques."""
+        return normalize_question(question), self._cache_partition(flags)
+
+    def _coalesced_result(self, question: str, flags: Dict[str, Any], result: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+        """Résultat renvoyé à une requête regroupée : la réponse partagée, sans recompter tokens ni coût."""
+        total_processing_time = time.time() - start_time
+        self.logger.log_interaction(
+            question=question,
+            answer=result["answer"],
+            sources=result["sources"],
+            evaluation=result["source_evaluation"],
+            processing_time=total_processing_time,
+            timing_breakdown={"coalesced_wait_s": total_processing_time},
+            error=result.get("error"),
+            flags={**flags, "coalesced": True}
+        )
+        logging.info(f"--- Shared an in-flight answer for an identical question in {total_processing_time:.2f} seconds ---")
+        return {
+            **result,
+            "processing_time": total_processing_time,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_tokens": 0,
+            "cost": 0.0,
+            "coalesced": True,
+        }
+
+    # ------------------------------------------------------------------
+    # Source evaluation -------------------------------------------------
+    # ------------------------------------------------------------------
+    def _submit_source_evaluation(self, question: str, docs: List[Document], **sampling: Any) -> "Future":
+        """Lance l'évaluation des sources dans le pool, pendant que la réponse est générée.
+
+        `evaluate_sources_function` ne dépend que des documents récupérés et capture ses
+        propres erreurs : le Future renvoie toujours `(évaluation, durée, token_metrics)`.
+        """
+        # Pour l'évaluation des sources, utiliser les mêmes paramètres d'échantillonnage
+        eval_llm = initialize_llm(**sampling)
+        return self.executor.submit(
+            evaluate_sources_function,
+            docs=docs,
+            question=question,
+            llm=eval_llm,
+            source_evaluation_prompt=self.source_evaluation_prompt,
+            formatted_sources=format_sources(docs),
+        )
+
+    def _create_source_evaluation_task(self, question: str, docs: List[Document], **sampling: Any) -> "asyncio.Task":
+        """Équivalent asynchrone de `_submit_source_evaluation` (tâche sur la boucle courante)."""
+        eval_llm = initialize_llm(**sampling)
+        return asyncio.create_task(aevaluate_sources_function(
+            docs=docs,
+            question=question,
+            llm=eval_llm,
+            source_evaluation_prompt=self.source_evaluation_prompt,
+            formatted_sources=format_sources(docs),
+        ))
+
+    # ------------------------------------------------------------------
+    # Synchronous pipeline ----------------------------------------------
+    # ------------------------------------------------------------------
+    def answer_question(
+        self,
+        question: str,
+        *,
+        use_reranker: bool = False,
+        use_multi_query: bool = False,
+        use_hybrid: Optional[bool] = None,
+        use_mmr: Optional[bool] = None,
+        evaluate_sources: bool = False,
+        model: Optional[str] = None,
+        temperature: float = 1.0,
+        top_p: Optional[float] = None,
+        top_k: Optional[int] = None,
+        frequency_penalty: Optional[float] = None,
+        presence_penalty: Optional[float] = None,
+        repetition_penalty: Optional[float] = None,
+        seed: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        k: Optional[int] = None,
+        rerank_k: Optional[int] = None,
+        use_cache: bool = True,
+    ) -> Dict[str, Any]:
+        total_start_time = time.time()
+        flags_used = self._build_flags(
+            use_reranker=use_reranker, use_multi_query=use_multi_query, use_hybrid=use_hybrid, use_mmr=use_mmr,
+            evaluate_sources=evaluate_sources,
+            model=model, temperature=temperature, top_p=top_p, top_k=top_k,
+            frequency_penalty=frequency_penalty, presence_penalty=presence_penalty,
+            repetition_penalty=repetition_penalty, seed=seed, max_tokens=max_tokens, k=k, rerank_k=rerank_k,
+        )
+        logging.info(f"--- Starting answer_question for: '{question[:50]}...' (Flags: {flags_used}) ---")
+
+        # Step 0: Semantic cache lookup
+        question_vector, cached = self._cache_lookup(question, flags_used) if use_cache else (None, None)
+        if cached is not None:
+            return self._cache_hit_result(question, flags_used, cached, total_start_time)
+
+        if self.coalescer is None:
+            return self._answer_pipeline(question, flags_used, question_vector, total_start_time)
+        result, shared = self.coalescer.do(
+            self._coalescing_key(question, flags_used),
+            lambda: self._answer_pipeline(question, flags_used, question_vector, total_start_time),
+        )
+        return self._coalesced_result(question, flags_used, result, total_start_time) if shared else result
+
+    def _answer_pipeline(
+        self, question: str, flags_used: Dict[str, Any], question_vector: Optional[np.ndarray], total_start_time: float
+    ) -> Dict[str, Any]:
+        """Retrieval, génération et évaluation pour `answer_question` (après le cache)."""
+        # Initialize token metrics
+        token_metrics = _empty_token_metrics()
+
+        # Step 1: Document Retrieval
+        retrieval_timings: Dict[str, float] = {}
+        try:
+            # Les valeurs k/rerank_k sont passées à l'appel : ni Config ni les retrievers partagés ne sont modifiés
+            docs, retrieval_duration, retriever_used = retrieve_documents(
+                question,
+                self.vectorstore,
+                self.retrievers,
+                self.reranker_compressor,
+                flags_used["use_reranker"],
+                use_multi_query=flags_used["use_multi_query"],
+                use_hybrid=flags_used["use_hybrid"],
+                use_mmr=flags_used["use_mmr"],
+                k=flags_used["k"],
+                rerank_k=flags_used["rerank_k"],
+                query_vector=self._retrieval_vector(question_vector),
+                timings=retrieval_timings
+            )
+        except Exception as e:
+            logging.exception(f"[Timing] Document retrieval failed after {time.time() - total_start_time:.2f} seconds. Error: {e}")
+            return self._retrieval_error_result(question, flags_used, e, total_start_time)
+
+        # Step 2: Optional Source Evaluation, started first so that it runs
+        # concurrently with answer generation (it only needs the retrieved docs)
+        source_evaluation = None
+        evaluation_duration = 0.0
+        evaluation_future = None
+
+        if flags_used["evaluate_sources"] and docs:
+            evaluation_future = self._submit_source_evaluation(question, docs, **self._sampling(flags_used))
+        elif flags_used["evaluate_sources"]:
+            logging.warning("[Timing] Skipping source evaluation because no documents were retrieved.")
+            source_evaluation = "Evaluation skipped: No documents retrieved."
+        else:
+            logging.info("[Timing] Skipping source evaluation (evaluate_sources=False).")
+
+        # Step 3: Answer Generation
+        # Le client du modèle provient du registre partagé ; seuls les paramètres
+        # d'échantillonnage (température, etc.) sont propres à cette requête
+        llm = initialize_llm(model=flags_used["model"], streaming=False, **self._sampling(flags_used))
+
+        # Chunks fusionnés, dédupliqués et bornés au budget du modèle (les sources restent `docs`)
+        context_docs = prepare_context(docs, flags_used, retrieval_timings)
+        answer, answer_duration, answer_metrics = generate_answer(
+            question=question,
+            docs=context_docs,
+            llm=llm,
+            answer_prompt=self.answer_prompt
+        )
+        _add_token_metrics(token_metrics, answer_metrics)
+
+        # Merge the evaluation once both tasks are done
+        if evaluation_future is not None:
+            source_evaluation, evaluation_duration, eval_metrics = evaluation_future.result()
+            _add_token_metrics(token_metrics, eval_metrics)
+
+        # Step 4: Log, cache and return
+        return self._finalize_answer(
+            question, flags_used, docs, answer, source_evaluation,
+            timing_breakdown={
+                "retrieval_s": retrieval_duration,
+                **retrieval_timings,
+                "answer_generation_s": answer_duration,
+                "source_evaluation_s": evaluation_duration
+            },
+            token_metrics=token_metrics,
+            question_vector=question_vector,
+            start_time=total_start_time,
+        )
 
     # ------------------------------------------------------------------
     # Streaming variant -------------------------------------------------
@@ -275,6 +622,8 @@ class AdvancedRAG:
         *,
         use_reranker: bool = False,
         use_multi_query: bool = False,
+        use_hybrid: Optional[bool] = None,
+        use_mmr: Optional[bool] = None,
         evaluate_sources: bool = False,
         model: Optional[str] = None,
         temperature: float = 1.0,
@@ -287,158 +636,375 @@ class AdvancedRAG:
         max_tokens: Optional[int] = None,
         k: Optional[int] = None,
         rerank_k: Optional[int] = None,
+        use_cache: bool = True,
     ):
         """Same as `answer_question` but streams the answer tokens.
 
         Yields successive chunks of the answer (strings). The caller can
         forward these via SSE / chunked HTTP response. All heavy lifting of
         retrieval is done upfront so that streaming is only for generation.
-        
+
         Args:
             question: Question to answer
             use_reranker: Whether to use reranker
             use_multi_query: Whether to use multi-query
+            use_hybrid: Whether to fuse BM25 lexical results with vector results (None = Config default)
+            use_mmr: Whether to diversify results (MMR + per-URL cap, None = Config default)
             evaluate_sources: Whether to evaluate sources
             model: Model to use
             temperature: Temperature parameter for the LLM (0.0-2.0)
+            use_cache: Whether to serve semantically similar questions from the cache
         """
-        model_used = model if model and model in Config.AVAILABLE_MODELS else Config.DEFAULT_MODEL
-        flags_used = {
-            "use_reranker": use_reranker,
-            "use_multi_query": use_multi_query,
-            "evaluate_sources": evaluate_sources,
-            "model": model_used,
-            "temperature": temperature,
-            "top_p": top_p,
-            "top_k": top_k,
-            "frequency_penalty": frequency_penalty,
-            "presence_penalty": presence_penalty,
-            "repetition_penalty": repetition_penalty,
-            "seed": seed,
-            "max_tokens": max_tokens,
-            "k": k,
-            "rerank_k": rerank_k,
-        }
+        flags_used = self._build_flags(
+            use_reranker=use_reranker, use_multi_query=use_multi_query, use_hybrid=use_hybrid, use_mmr=use_mmr,
+            evaluate_sources=evaluate_sources,
+            model=model, temperature=temperature, top_p=top_p, top_k=top_k,
+            frequency_penalty=frequency_penalty, presence_penalty=presence_penalty,
+            repetition_penalty=repetition_penalty, seed=seed, max_tokens=max_tokens, k=k, rerank_k=rerank_k,
+        )
         logging.info(f"--- Starting answer_question_stream for: '{question[:50]}...' (Flags: {flags_used}) ---")
 
         # Mark the start time to compute total processing duration later
         start_time = time.time()
 
-        # 1. Retrieve documents (non-streaming, because retrieval is fast compared to generation)
-        if k is not None or rerank_k is not None:
-            original_k = Config.DEFAULT_K
-            original_rerank_k = Config.RERANK_K
-
-            if k is not None:
-                Config.DEFAULT_K = k
-            if rerank_k is not None:
-                Config.RERANK_K = rerank_k if rerank_k is not None else (k or Config.RERANK_K)
+        # 0. Semantic cache: on a hit, the whole answer is emitted as a single chunk
+        question_vector, cached = self._cache_lookup(question, flags_used) if use_cache else (None, None)
+        if cached is not None:
+            yield from self._cache_hit_stream(flags_used, cached, start_time)
+            return
 
-            temp_retrievers = initialize_retrievers(self.vectorstore, self.llm)
+        if self.coalescer is None:
+            yield from self._answer_stream_pipeline(question, flags_used, question_vector, start_time)
+            return
+        # Les requêtes identiques simultanées relisent le même flux de tokens
+        yield from self.coalescer.stream(
+            self._coalescing_key(question, flags_used),
+            lambda: self._answer_stream_pipeline(question, flags_used, question_vector, start_time),
+        )
 
-            docs, _retrieval_duration, _ = retrieve_documents(
+    def _answer_stream_pipeline(
+        self, question: str, flags_used: Dict[str, Any], question_vector: Optional[np.ndarray], start_time: float
+    ):
+        """Retrieval puis génération en streaming pour `answer_question_stream` (après le cache)."""
+        # 1. Retrieve documents (non-streaming, because retrieval is fast compared to generation)
+        stream_timings: Dict[str, float] = {}
+        try:
+            docs, stream_timings["retrieval_s"], _ = retrieve_documents(
                 question,
-                temp_retrievers,
+                self.vectorstore,
+                self.retrievers,
                 self.reranker_compressor,
-                use_reranker,
-                use_multi_query=use_multi_query
+                flags_used["use_reranker"],
+                use_multi_query=flags_used["use_multi_query"],
+                use_hybrid=flags_used["use_hybrid"],
+                use_mmr=flags_used["use_mmr"],
+                k=flags_used["k"],
+                rerank_k=flags_used["rerank_k"],
+                query_vector=self._retrieval_vector(question_vector),
+                timings=stream_timings
             )
+        except Exception:
+            metrics.ERRORS.labels(stage="retrieval").inc()
+            raise
 
-            Config.DEFAULT_K = original_k
-            Config.RERANK_K = original_rerank_k
-        else:
-            docs, _retrieval_duration, _ = retrieve_documents(
-            question,
-            self.retrievers,
-            self.reranker_compressor,
-            use_reranker,
-            use_multi_query=use_multi_query
+        # 2. Start the optional source evaluation in the background
+        evaluation_future = None
+        if flags_used["evaluate_sources"] and docs:
+            evaluation_future = self._submit_source_evaluation(question, docs, **self._sampling(flags_used))
+        evaluation_emitted = False
+
+        try:
+            # 3. Stream the answer generation
+            # Streaming client from the shared registry, bound to this request's sampling parameters
+            streaming_llm = initialize_llm(model=flags_used["model"], streaming=True, **self._sampling(flags_used))
+            context_docs = prepare_context(docs, flags_used, stream_timings)
+
+            token_metrics = _empty_token_metrics()
+            generation_start = time.time()
+            time_to_first_token = None
+            stream_generator = generate_answer_stream(
+                question=question,
+                docs=context_docs,
+                llm=streaming_llm,
+                answer_prompt=self.answer_prompt,
+                token_metrics=token_metrics
+            )
+
+            # Simply yield the chunks upstream; the Flask endpoint will be
+            # responsible for wrapping them into SSE or another transport format.
+            # The evaluation is emitted as its own JSON event as soon as it is ready.
+            answer_chunks: List[str] = []
+            try:
+                for chunk in stream_generator:
+                    if time_to_first_token is None:
+                        time_to_first_token = time.time() - start_time
+                    answer_chunks.append(chunk)
+                    yield chunk
+                    if evaluation_future is not None and not evaluation_emitted and evaluation_future.done():
+                        yield json.dumps({"type": "evaluation", "evaluation": evaluation_future.result()[0]})
+                        evaluation_emitted = True
+            except Exception:
+                metrics.ERRORS.labels(stage="answer_generation").inc()
+                raise
+            stream_timings["answer_generation_s"] = time.time() - generation_start
+
+            # 4. Emit metadata JSON at the end
+            try:
+                metadata = self._stream_metadata(flags_used, docs, token_metrics, start_time)
+
+                # Optional source evaluation (still included here for clients reading only the metadata)
+                if evaluation_future is not None:
+                    evaluation_text, stream_timings["source_evaluation_s"], eval_metrics = evaluation_future.result()
+                    if not evaluation_emitted:
+                        yield json.dumps({"type": "evaluation", "evaluation": evaluation_text})
+                    self._add_stream_evaluation(metadata, evaluation_text, eval_metrics)
+
+                yield json.dumps(metadata)
+                self._finalize_stream(question, flags_used, metadata, answer_chunks, question_vector, stream_timings, time_to_first_token)
+
+            except Exception as e:
+                logging.exception(f"Failed to emit metadata: {e}")
+        finally:
+            # Client déconnecté (GeneratorExit) ou erreur : ne pas laisser l'évaluation orpheline
+            if evaluation_future is not None:
+                evaluation_future.cancel()
+
+    # ------------------------------------------------------------------
+    # Asynchronous pipeline ---------------------------------------------
+    # ------------------------------------------------------------------
+    async def aanswer_question(
+        self,
+        question: str,
+        *,
+        use_reranker: bool = False,
+        use_multi_query: bool = False,
+        use_hybrid: Optional[bool] = None,
+        use_mmr: Optional[bool] = None,
+        evaluate_sources: bool = False,
+        model: Optional[str] = None,
+        temperature: float = 1.0,
+        top_p: Optional[float] = None,
+        top_k: Optional[int] = None,
+        frequency_penalty: Optional[float] = None,
+        presence_penalty: Optional[float] = None,
+        repetition_penalty: Optional[float] = None,
+        seed: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        k: Optional[int] = None,
+        rerank_k: Optional[int] = None,
+        use_cache: bool = True,
+    ) -> Dict[str, Any]:
+        """Asynchronous variant of `answer_question` built on `ainvoke`.
+
+        Retrieval, generation and source evaluation are awaited on the event loop,
+        so a single process can keep many questions in flight without a thread each.
+        """
+        total_start_time = time.time()
+        flags_used = self._build_flags(
+            use_reranker=use_reranker, use_multi_query=use_multi_query, use_hybrid=use_hybrid, use_mmr=use_mmr,
+            evaluate_sources=evaluate_sources,
+            model=model, temperature=temperature, top_p=top_p, top_k=top_k,
+            frequency_penalty=frequency_penalty, presence_penalty=presence_penalty,
+            repetition_penalty=repetition_penalty, seed=seed, max_tokens=max_tokens, k=k, rerank_k=rerank_k,
         )
+        logging.info(f"--- Starting aanswer_question for: '{question[:50]}...' (Flags: {flags_used}) ---")
 
-        # 2. Stream the answer generation
-        # Initialize streaming LLM with temperature
-        streaming_llm = initialize_llm(
-            model=model,
-            streaming=True,
-            temperature=temperature,
-            top_p=top_p,
-            top_k=top_k,
-            frequency_penalty=frequency_penalty,
-            presence_penalty=presence_penalty,
-            repetition_penalty=repetition_penalty,
-            seed=seed,
-            max_tokens=max_tokens,
+        question_vector, cached = await self._acache_lookup(question, flags_used) if use_cache else (None, None)
+        if cached is not None:
+            return self._cache_hit_result(question, flags_used, cached, total_start_time)
+
+        if self.coalescer is None:
+            return await self._aanswer_pipeline(question, flags_used, question_vector, total_start_time)
+        result, shared = await self.coalescer.ado(
+            self._coalescing_key(question, flags_used),
+            lambda: self._aanswer_pipeline(question, flags_used, question_vector, total_start_time),
         )
-        
-        stream_generator = generate_answer_stream(
+        return self._coalesced_result(question, flags_used, result, total_start_time) if shared else result
+
+    async def _aanswer_pipeline(
+        self, question: str, flags_used: Dict[str, Any], question_vector: Optional[np.ndarray], total_start_time: float
+    ) -> Dict[str, Any]:
+        """Équivalent asynchrone de `_answer_pipeline`."""
+        token_metrics = _empty_token_metrics()
+
+        retrieval_timings: Dict[str, float] = {}
+        try:
+            docs, retrieval_duration, retriever_used = await aretrieve_documents(
+                question,
+                self.vectorstore,
+                self.retrievers,
+                self.reranker_compressor,
+                flags_used["use_reranker"],
+                use_multi_query=flags_used["use_multi_query"],
+                use_hybrid=flags_used["use_hybrid"],
+                use_mmr=flags_used["use_mmr"],
+                k=flags_used["k"],
+                rerank_k=flags_used["rerank_k"],
+                query_vector=self._retrieval_vector(question_vector),
+                timings=retrieval_timings
+            )
+        except Exception as e:
+            logging.exception(f"[Timing] Document retrieval failed after {time.time() - total_start_time:.2f} seconds. Error: {e}")
+            return self._retrieval_error_result(question, flags_used, e, total_start_time)
+
+        source_evaluation = None
+        evaluation_duration = 0.0
+        evaluation_task = None
+        if flags_used["evaluate_sources"] and docs:
+            evaluation_task = self._create_source_evaluation_task(question, docs, **self._sampling(flags_used))
+        elif flags_used["evaluate_sources"]:
+            logging.warning("[Timing] Skipping source evaluation because no documents were retrieved.")
+            source_evaluation = "Evaluation skipped: No documents retrieved."
+
+        llm = initialize_llm(model=flags_used["model"], streaming=False, **self._sampling(flags_used))
+        context_docs = prepare_context(docs, flags_used, retrieval_timings)
+        answer, answer_duration, answer_metrics = await agenerate_answer(
             question=question,
-            docs=docs,
-            llm=streaming_llm,
+            docs=context_docs,
+            llm=llm,
             answer_prompt=self.answer_prompt
         )
+        _add_token_metrics(token_metrics, answer_metrics)
+
+        if evaluation_task is not None:
+            source_evaluation, evaluation_duration, eval_metrics = await evaluation_task
+            _add_token_metrics(token_metrics, eval_metrics)
 
-        # Simply yield the chunks upstream; the Flask endpoint will be
-        # responsible for wrapping them into SSE or another transport format.
-        for chunk in stream_generator:
+        return self._finalize_answer(
+            question, flags_used, docs, answer, source_evaluation,
+            timing_breakdown={
+                "retrieval_s": retrieval_duration,
+                **retrieval_timings,
+                "answer_generation_s": answer_duration,
+                "source_evaluation_s": evaluation_duration
+            },
+            token_metrics=token_metrics,
+            question_vector=question_vector,
+            start_time=total_start_time,
+        )
+
+    async def aanswer_question_stream(
+        self,
+        question: str,
+        *,
+        use_reranker: bool = False,
+        use_multi_query: bool = False,
+        use_hybrid: Optional[bool] = None,
+        use_mmr: Optional[bool] = None,
+        evaluate_sources: bool = False,
+        model: Optional[str] = None,
+        temperature: float = 1.0,
+        top_p: Optional[float] = None,
+        top_k: Optional[int] = None,
+        frequency_penalty: Optional[float] = None,
+        presence_penalty: Optional[float] = None,
+        repetition_penalty: Optional[float] = None,
+        seed: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        k: Optional[int] = None,
+        rerank_k: Optional[int] = None,
+        use_cache: bool = True,
+    ):
+        """Asynchronous variant of `answer_question_stream` built on `astream`.
+
+        Yields the same sequence of chunks: answer text, an optional evaluation
+        event as soon as it is ready, then the final metadata JSON.
+        """
+        flags_used = self._build_flags(
+            use_reranker=use_reranker, use_multi_query=use_multi_query, use_hybrid=use_hybrid, use_mmr=use_mmr,
+            evaluate_sources=evaluate_sources,
+            model=model, temperature=temperature, top_p=top_p, top_k=top_k,
+            frequency_penalty=frequency_penalty, presence_penalty=presence_penalty,
+            repetition_penalty=repetition_penalty, seed=seed, max_tokens=max_tokens, k=k, rerank_k=rerank_k,
+        )
+        logging.info(f"--- Starting aanswer_question_stream for: '{question[:50]}...' (Flags: {flags_used}) ---")
+        start_time = time.time()
+
+        question_vector, cached = await self._acache_lookup(question, flags_used) if use_cache else (None, None)
+        if cached is not None:
+            for chunk in self._cache_hit_stream(flags_used, cached, start_time):
+                yield chunk
+            return
+
+        if self.coalescer is None:
+            async for chunk in self._aanswer_stream_pipeline(question, flags_used, question_vector, start_time):
+                yield chunk
+            return
+        async for chunk in self.coalescer.astream(
+            self._coalescing_key(question, flags_used),
+            lambda: self._aanswer_stream_pipeline(question, flags_used, question_vector, start_time),
+        ):
             yield chunk
 
-        # 3. Emit metadata JSON at the end
+    async def _aanswer_stream_pipeline(
+        self, question: str, flags_used: Dict[str, Any], question_vector: Optional[np.ndarray], start_time: float
+    ):
+        """Équivalent asynchrone de `_answer_stream_pipeline`."""
+        stream_timings: Dict[str, float] = {}
         try:
-            # Get token metrics from the streaming function
-            token_metrics = getattr(generate_answer_stream, 'token_metrics', {
-                "prompt_tokens": 0,
-                "completion_tokens": 0,
-                "total_tokens": 0,
-                "cost": 0.0
-            })
-            
-            sources_meta = collect_source_metadata(docs)
-            metadata: Dict[str, Any] = {
-                "type": "metadata",
-                "sources": sources_meta,
-                "processingTime": time.time() - start_time,
-                "model": model_used,
-                "temperature": temperature,  # Inclure la température dans les métadonnées
-                "promptTokens": token_metrics["prompt_tokens"],
-                "completionTokens": token_metrics["completion_tokens"],
-                "totalTokens": token_metrics["total_tokens"],
-                "cost": token_metrics["cost"]
-            }
-
-            # Optional source evaluation
-            if evaluate_sources and docs:
-                # Pour l'évaluation des sources, utiliser le même paramètre de température
-                eval_llm = initialize_llm(
-                    temperature=temperature,
-                    top_p=top_p,
-                    top_k=top_k,
-                    frequency_penalty=frequency_penalty,
-                    presence_penalty=presence_penalty,
-                    repetition_penalty=repetition_penalty,
-                    seed=seed,
-                    max_tokens=max_tokens,
-                )
-                formatted_sources = format_sources(docs)
-                evaluation_text, _, eval_metrics = evaluate_sources_function(
-                    docs=docs,
-                    question=question,
-                    llm=eval_llm,
-                    source_evaluation_prompt=self.source_evaluation_prompt,
-                    formatted_sources=formatted_sources,
-                )
-                metadata["evaluation"] = evaluation_text
-                
-                # Add evaluation tokens and cost to the total
-                metadata["promptTokens"] += eval_metrics["prompt_tokens"]
-                metadata["completionTokens"] += eval_metrics["completion_tokens"]
-                metadata["totalTokens"] += eval_metrics["total_tokens"]
-                metadata["cost"] += eval_metrics["cost"]
+            docs, stream_timings["retrieval_s"], _ = await aretrieve_documents(
+                question,
+                self.vectorstore,
+                self.retrievers,
+                self.reranker_compressor,
+                flags_used["use_reranker"],
+                use_multi_query=flags_used["use_multi_query"],
+                use_hybrid=flags_used["use_hybrid"],
+                use_mmr=flags_used["use_mmr"],
+                k=flags_used["k"],
+                rerank_k=flags_used["rerank_k"],
+                query_vector=self._retrieval_vector(question_vector),
+                timings=stream_timings
+            )
+        except Exception:
+            metrics.ERRORS.labels(stage="retrieval").inc()
+            raise
+
+        evaluation_task = None
+        if flags_used["evaluate_sources"] and docs:
+            evaluation_task = self._create_source_evaluation_task(question, docs, **self._sampling(flags_used))
+        evaluation_emitted = False
+
+        streaming_llm = initialize_llm(model=flags_used["model"], streaming=True, **self._sampling(flags_used))
+        context_docs = prepare_context(docs, flags_used, stream_timings)
+        token_metrics = _empty_token_metrics()
+        answer_chunks: List[str] = []
+        generation_start = time.time()
+        time_to_first_token = None
+        try:
+            async for chunk in agenerate_answer_stream(
+                question=question,
+                docs=context_docs,
+                llm=streaming_llm,
+                answer_prompt=self.answer_prompt,
+                token_metrics=token_metrics
+            ):
+                if time_to_first_token is None:
+                    time_to_first_token = time.time() - start_time
+                answer_chunks.append(chunk)
+                yield chunk
+                if evaluation_task is not None and not evaluation_emitted and evaluation_task.done():
+                    yield json.dumps({"type": "evaluation", "evaluation": evaluation_task.result()[0]})
+                    evaluation_emitted = True
+        except BaseException as e:
+            if isinstance(e, Exception):
+                metrics.ERRORS.labels(stage="answer_generation").inc()
+            # Client déconnecté ou erreur de génération : ne pas laisser l'évaluation orpheline
+            if evaluation_task is not None:
+                evaluation_task.cancel()
+            raise
+        stream_timings["answer_generation_s"] = time.time() - generation_start
+
+        try:
+            metadata = self._stream_metadata(flags_used, docs, token_metrics, start_time)
+            if evaluation_task is not None:
+                evaluation_text, stream_timings["source_evaluation_s"], eval_metrics = await evaluation_task
+                if not evaluation_emitted:
+                    yield json.dumps({"type": "evaluation", "evaluation": evaluation_text})
+                self._add_stream_evaluation(metadata, evaluation_text, eval_metrics)
 
             yield json.dumps(metadata)
-            
-            # Log total tokens and cost
-            logging.info(f"--- Total tokens for streaming: {metadata['totalTokens']} (Prompt: {metadata['promptTokens']}, Completion: {metadata['completionTokens']}) ---")
-            logging.info(f"--- Total cost for streaming: ${metadata['cost']:.6f} ---")
-            
+            self._finalize_stream(question, flags_used, metadata, answer_chunks, question_vector, stream_timings, time_to_first_token)
+
         except Exception as e:
-            logging.exception(f"Failed to emit metadata: {e}") 
\ No newline at end of file
+            logging.exception(f"Failed to emit metadata: {e}")
@@ -1,15 +1,20 @@
+import asyncio
 import logging
 import time
-from typing import List, Tuple, Any, Optional, Dict, Union
+import numpy as np
+from typing import List, Tuple, Any, Optional, Dict, Union, Callable, Awaitable
 from langchain_community.vectorstores import Chroma
 from langchain_pinecone import Pinecone as LangchainPinecone
-from langchain.retrievers import ContextualCompressionRetriever
 from langchain.retrievers.multi_query import MultiQueryRetriever
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
 from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
 from langchain_core.retrievers import BaseRetriever
 from langchain_cohere import CohereRerank
 from langchain_openai import ChatOpenAI
 from .config import Config
+from .lexical import BM25Index, initialize_bm25_index
+from .local_index import LocalVectorIndex
 
 def _initialize_chroma_retrievers(vectorstore: Chroma, llm: ChatOpenAI) -> Dict[str, BaseRetriever]:
     base_retriever = vectorstore.as_retriever(
@@ -57,20 +62,290 @@ def _initialize_pinecone_retrievers(vectorstore: LangchainPinecone, llm: ChatOpe
         "multi_query": multi_query_retriever,
     }
 
-def initialize_retrievers(vectorstore: Union[Chroma, LangchainPinecone], llm: ChatOpenAI) -> Dict[str, BaseRetriever]:
+def _initialize_local_retrievers(vectorstore: LocalVectorIndex, llm: ChatOpenAI) -> Dict[str, BaseRetriever]:
+    """Initialise les retrievers de l'index local (même disposition que Chroma)."""
+    base_retriever = vectorstore.as_retriever(search_kwargs={"k": Config.DEFAULT_K})
+    rerank_base_retriever = vectorstore.as_retriever(search_kwargs={"k": Config.RERANK_K})
+    multi_query_retriever = MultiQueryRetriever.from_llm(retriever=base_retriever, llm=llm)
+    logging.info(f"Retrievers de l'index local initialisés ({len(vectorstore)} vecteurs, "
+                 f"k={Config.DEFAULT_K}, rerank k={Config.RERANK_K}).")
+    return {
+        "base": base_retriever,
+        "rerank_base": rerank_base_retriever,
+        "multi_query": multi_query_retriever,
+    }
+
+def initialize_retrievers(vectorstore: Union[Chroma, LangchainPinecone, LocalVectorIndex], llm: ChatOpenAI) -> Dict[str, BaseRetriever]:
     """Initialise les retrievers en fonction du type de vectorstore fourni."""
     provider = Config.BDD_PROVIDER 
     # Note: On pourrait aussi vérifier isinstance(vectorstore, Chroma) ou LangchainPinecone
     # pour plus de robustesse, au lieu de se fier uniquement à Config.BDD_PROVIDER ici.
 
     if provider == "Pinecone" and isinstance(vectorstore, LangchainPinecone):
-        return _initialize_pinecone_retrievers(vectorstore, llm)
+        retrievers = _initialize_pinecone_retrievers(vectorstore, llm)
     elif provider == "Chroma" and isinstance(vectorstore, Chroma):
-        return _initialize_chroma_retrievers(vectorstore, llm)
+        retrievers = _initialize_chroma_retrievers(vectorstore, llm)
+    elif provider == "Local" and isinstance(vectorstore, LocalVectorIndex):
+        retrievers = _initialize_local_retrievers(vectorstore, llm)
     else:
         logging.error(f"Type de vectorstore incompatible ('{type(vectorstore)}') pour le BDD_PROVIDER configuré ('{provider}').")
         raise ValueError(f"Configuration de vectorstore invalide pour {provider}.")
 
+    bm25_index = initialize_bm25_index()
+    if bm25_index is not None:
+        retrievers["hybrid"] = HybridRetriever(vectorstore=vectorstore, bm25_index=bm25_index, k=Config.DEFAULT_K)
+        logging.info(f"Retriever hybride BM25 + {provider} (RRF) initialisé ({len(bm25_index)} chunks).")
+    return retrievers
+
+def _fusion_key(doc: Document) -> Tuple[str, str]:
+    # Les métadonnées diffèrent selon l'origine (Chroma, Pinecone, index BM25) : on identifie un chunk par son texte et sa page
+    return doc.page_content, str(doc.metadata.get("url") or doc.metadata.get("filename") or "")
+
+def reciprocal_rank_fusion(
+    ranked_lists: List[List[Document]],
+    weights: Optional[List[float]] = None,
+    rrf_k: int = 60
+) -> List[Tuple[Document, float]]:
+    """Fusionne des listes classées : score(d) = Σ poids / (rrf_k + rang).
+
+    Seuls les rangs comptent, ce qui permet de combiner des scores d'échelles différentes
+    (similarité cosinus, BM25). Pour un chunk présent dans plusieurs listes, le document
+    de la première liste est conservé.
+    """
+    weights = weights or [1.0] * len(ranked_lists)
+    scores: Dict[Tuple[str, str], float] = {}
+    docs: Dict[Tuple[str, str], Document] = {}
+    for ranked, weight in zip(ranked_lists, weights):
+        for rank, doc in enumerate(ranked, start=1):
+            key = _fusion_key(doc)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return [(docs[key], score) for key, score in fused]
+
+def dense_search(vectorstore: VectorStore, query: str, k: int, query_vector: Optional[np.ndarray] = None) -> List[Document]:
+    """Recherche vectorielle ; avec `query_vector` (embedding déjà calculé de `query`), sans nouvel appel d'embedding."""
+    if query_vector is not None:
+        return vectorstore.similarity_search_by_vector(np.asarray(query_vector, dtype=np.float32).tolist(), k=k)
+    return vectorstore.similarity_search(query, k=k)
+
+async def adense_search(vectorstore: VectorStore, query: str, k: int, query_vector: Optional[np.ndarray] = None) -> List[Document]:
+    """Variante asynchrone de `dense_search`."""
+    if query_vector is not None:
+        return await vectorstore.asimilarity_search_by_vector(np.asarray(query_vector, dtype=np.float32).tolist(), k=k)
+    return await vectorstore.asimilarity_search(query, k=k)
+
+class HybridRetriever(BaseRetriever):
+    """Recherche hybride : résultats du vectorstore et de l'index BM25 fusionnés par RRF."""
+
+    vectorstore: VectorStore
+    bm25_index: BM25Index
+    k: int = Config.DEFAULT_K
+
+    def _fuse(self, dense: List[Document], lexical: List[Document], k: int) -> List[Document]:
+        fused = reciprocal_rank_fusion(
+            [dense, lexical],
+            weights=[Config.HYBRID_VECTOR_WEIGHT, Config.HYBRID_LEXICAL_WEIGHT],
+            rrf_k=Config.HYBRID_RRF_K,
+        )
+        return [
+            Document(page_content=doc.page_content, metadata={**doc.metadata, "hybrid_score": score})
+            for doc, score in fused[:k]
+        ]
+
+    def _lexical_search(self, query: str, fetch_k: int, timings: Optional[Dict[str, float]]) -> List[Document]:
+        lexical_start = time.time()
+        lexical = [doc for doc, _ in self.bm25_index.search(query, fetch_k)]
+        if timings is not None:
+            # Cumulé : le multi-query appelle la recherche une fois par variante
+            timings["lexical_search_s"] = timings.get("lexical_search_s", 0.0) + time.time() - lexical_start
+        return lexical
+
+    def search(self, query: str, k: int, timings: Optional[Dict[str, float]] = None,
+               query_vector: Optional[np.ndarray] = None) -> List[Document]:
+        fetch_k = max(k, Config.HYBRID_FETCH_K)
+        dense = dense_search(self.vectorstore, query, fetch_k, query_vector)
+        return self._fuse(dense, self._lexical_search(query, fetch_k, timings), k)
+
+    async def asearch(self, query: str, k: int, timings: Optional[Dict[str, float]] = None,
+                      query_vector: Optional[np.ndarray] = None) -> List[Document]:
+        fetch_k = max(k, Config.HYBRID_FETCH_K)
+        dense = await adense_search(self.vectorstore, query, fetch_k, query_vector)
+        # BM25 est un calcul numpy de quelques millisecondes : exécuté directement sur la boucle
+        return self._fuse(dense, self._lexical_search(query, fetch_k, timings), k)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.search(query, self.k)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        return await self.asearch(query, self.k)
+
+def _hybrid_retriever(retrievers: Dict[str, Any], use_hybrid: bool) -> Optional[HybridRetriever]:
+    if not use_hybrid:
+        return None
+    hybrid = retrievers.get("hybrid")
+    if hybrid is None:
+        logging.warning("Hybrid search was requested but the BM25 index is not available. Falling back to vector search.")
+    return hybrid
+
+# ---------------------------------------------------------------------------
+# Diversité : MMR et plafond par URL ----------------------------------------
+# ---------------------------------------------------------------------------
+
+def _source_url(doc: Document) -> str:
+    return str(doc.metadata.get("url") or doc.metadata.get("filename") or doc.metadata.get("source") or "")
+
+def cap_per_source(docs: List[Document], max_per_source: int, k: int) -> List[Document]:
+    """Garde au plus `max_per_source` documents par URL (dans l'ordre), puis les `k` premiers."""
+    if max_per_source <= 0:
+        return docs[:k]
+    counts: Dict[str, int] = {}
+    kept = []
+    for doc in docs:
+        url = _source_url(doc)
+        if counts.get(url, 0) < max_per_source or not url:
+            counts[url] = counts.get(url, 0) + 1
+            kept.append(doc)
+            if len(kept) == k:
+                break
+    return kept
+
+def mmr_select(
+    query_vector: np.ndarray,
+    doc_vectors: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.7,
+    sources: Optional[List[str]] = None,
+    max_per_source: int = 0
+) -> List[int]:
+    """Indices choisis par Maximal Marginal Relevance, avec au plus `max_per_source` documents par source.
+
+    Les similarités requête/documents et documents/documents sont calculées en deux produits
+    matriciels ; chaque sélection ne fait ensuite qu'une mise à jour vectorisée du maximum
+    de similarité avec les documents déjà retenus.
+    """
+    if len(doc_vectors) == 0 or k <= 0:
+        return []
+    vectors = np.asarray(doc_vectors, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+
+    source_ids = None
+    if sources is not None and max_per_source > 0:
+        _, source_ids = np.unique(np.asarray(sources, dtype=object), return_inverse=True)
+        source_counts = np.zeros(source_ids.max() + 1, dtype=np.int32)
+    available = np.ones(len(vectors), dtype=bool)
+    max_similarity = np.zeros(len(vectors), dtype=np.float32)
+    selected: List[int] = []
+    while len(selected) < k and available.any():
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+        if source_ids is not None and sources[best]:
+            source_counts[source_ids[best]] += 1
+            if source_counts[source_ids[best]] >= max_per_source:
+                available[source_ids == source_ids[best]] = False
+    return selected
+
+def _search_with_vectors(
+    vectorstore: VectorStore, query: str, fetch_k: int, query_vector: Optional[np.ndarray] = None
+) -> Optional[Tuple[List[Document], np.ndarray, np.ndarray]]:
+    """Candidats et leurs vecteurs en une seule requête au vectorstore ; None si non supporté."""
+    if not isinstance(vectorstore, (LocalVectorIndex, Chroma, LangchainPinecone)):
+        return None
+    if query_vector is None:
+        query_vector = vectorstore.embeddings.embed_query(query)
+    query_vector = np.asarray(query_vector, dtype=np.float32).tolist()
+    if isinstance(vectorstore, LocalVectorIndex):
+        docs, vectors = vectorstore.similarity_search_with_vectors(query_vector, fetch_k)
+        return docs, vectors, np.asarray(query_vector, dtype=np.float32)
+    if isinstance(vectorstore, Chroma):
+        results = vectorstore._collection.query(
+            query_embeddings=[query_vector], n_results=fetch_k,
+            include=["documents", "metadatas", "embeddings"],
+        )
+        docs = [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(results["documents"][0], results["metadatas"][0])
+        ]
+        return docs, np.asarray(results["embeddings"][0], dtype=np.float32), np.asarray(query_vector, dtype=np.float32)
+    if isinstance(vectorstore, LangchainPinecone):
+        results = vectorstore.index.query(
+            vector=query_vector, top_k=fetch_k, include_values=True, include_metadata=True,
+            namespace=vectorstore._namespace,
+        )
+        matches = results["matches"]
+        docs = []
+        for match in matches:
+            metadata = dict(match["metadata"])
+            docs.append(Document(page_content=metadata.pop(vectorstore._text_key, ""), metadata=metadata))
+        return docs, np.asarray([match["values"] for match in matches], dtype=np.float32), np.asarray(query_vector, dtype=np.float32)
+
+def diverse_search(vectorstore: VectorStore, query: str, k: int, query_vector: Optional[np.ndarray] = None) -> List[Document]:
+    """Recherche vectorielle diversifiée : `k × MMR_FETCH_FACTOR` candidats, MMR et plafond par URL.
+
+    Les vecteurs des candidats sont demandés avec les résultats (Chroma, Pinecone, index
+    local) : pas d'aller-retour ni de calcul d'embedding supplémentaire. Pour un autre
+    vectorstore, seul le plafond par URL est appliqué.
+    """
+    fetch_k = max(k, k * Config.MMR_FETCH_FACTOR)
+    result = _search_with_vectors(vectorstore, query, fetch_k, query_vector)
+    if result is None:
+        return cap_per_source(dense_search(vectorstore, query, fetch_k, query_vector), Config.MAX_CHUNKS_PER_URL, k)
+    docs, vectors, query_vector = result
+    selected = mmr_select(
+        query_vector, vectors, k, Config.MMR_LAMBDA,
+        sources=[_source_url(doc) for doc in docs], max_per_source=Config.MAX_CHUNKS_PER_URL,
+    )
+    return [docs[i] for i in selected]
+
+def _known_vector(question: str, question_vector: Optional[np.ndarray]) -> Callable[[str], Optional[np.ndarray]]:
+    # L'embedding de la question ne sert que pour la question elle-même (pas pour les variantes multi-query)
+    return lambda query: question_vector if query == question else None
+
+def _search_function(
+    vectorstore: VectorStore, hybrid: Optional[HybridRetriever], timings: Dict[str, float], use_mmr: bool = False,
+    question: Optional[str] = None, question_vector: Optional[np.ndarray] = None
+) -> Callable[[str, int], List[Document]]:
+    """Recherche de candidats (vectorielle, ou hybride si disponible) utilisée par toutes les branches.
+
+    Avec `use_mmr`, la recherche vectorielle est diversifiée (MMR) ; les résultats hybrides,
+    qui mêlent des chunks BM25 sans vecteur, sont seulement plafonnés par URL.
+    `question_vector` (embedding de `question`) évite de recalculer l'embedding de la question.
+    """
+    vector = _known_vector(question, question_vector)
+    if hybrid is None:
+        if use_mmr:
+            return lambda query, k: diverse_search(vectorstore, query, k, vector(query))
+        return lambda query, k: dense_search(vectorstore, query, k, vector(query))
+    if use_mmr:
+        return lambda query, k: cap_per_source(
+            hybrid.search(query, k * Config.MMR_FETCH_FACTOR, timings, vector(query)), Config.MAX_CHUNKS_PER_URL, k)
+    return lambda query, k: hybrid.search(query, k, timings, vector(query))
+
+def _asearch_function(
+    vectorstore: VectorStore, hybrid: Optional[HybridRetriever], timings: Dict[str, float], use_mmr: bool = False,
+    question: Optional[str] = None, question_vector: Optional[np.ndarray] = None
+) -> Callable[[str, int], Awaitable[List[Document]]]:
+    vector = _known_vector(question, question_vector)
+    if hybrid is None:
+        if use_mmr:
+            # Clients Chroma / Pinecone synchrones : exécutés hors de la boucle d'événements
+            return lambda query, k: asyncio.to_thread(diverse_search, vectorstore, query, k, vector(query))
+        return lambda query, k: adense_search(vectorstore, query, k, vector(query))
+    if use_mmr:
+        async def capped_search(query: str, k: int) -> List[Document]:
+            docs = await hybrid.asearch(query, k * Config.MMR_FETCH_FACTOR, timings, vector(query))
+            return cap_per_source(docs, Config.MAX_CHUNKS_PER_URL, k)
+        return capped_search
+    return lambda query, k: hybrid.asearch(query, k, timings, vector(query))
+
 def initialize_reranker() -> Optional[CohereRerank]:
     if Config.COHERE_API_KEY:
         try:
@@ -87,49 +362,218 @@ def initialize_reranker() -> Optional[CohereRerank]:
         logging.info("Cohere Reranker not initialized (API key missing).")
         return None
 
+def _unique_documents(docs: List[Document]) -> List[Document]:
+    """Supprime les doublons en conservant l'ordre (même logique que MultiQueryRetriever)."""
+    seen = set()
+    unique_docs = []
+    for doc in docs:
+        key = (doc.page_content, tuple(sorted((k, str(v)) for k, v in doc.metadata.items())))
+        if key not in seen:
+            seen.add(key)
+            unique_docs.append(doc)
+    return unique_docs
+
+def _rerank_documents(
+    reranker_compressor: CohereRerank,
+    question: str,
+    docs: List[Document],
+    top_n: int
+) -> List[Document]:
+    """Reranke `docs` avec Cohere et garde les `top_n` meilleurs, sans modifier le reranker partagé."""
+    if not docs:
+        return []
+    results = reranker_compressor.rerank(docs, question, top_n=top_n)
+    reranked = []
+    for res in results:
+        doc = docs[res["index"]]
+        reranked.append(Document(
+            page_content=doc.page_content,
+            metadata={**doc.metadata, "relevance_score": res["relevance_score"]},
+        ))
+    return reranked
+
+def _multi_query_search(
+    question: str,
+    search: Callable[[str, int], List[Document]],
+    multi_query_retriever: MultiQueryRetriever,
+    k: int,
+    timings: Dict[str, float]
+) -> List[Document]:
+    """Génère les variantes de la question puis lance `search` avec `k` par variante."""
+    expansion_start = time.time()
+    queries = multi_query_retriever.generate_queries(
+        question, CallbackManagerForRetrieverRun.get_noop_manager()
+    )
+    timings["multi_query_expansion_s"] = time.time() - expansion_start
+    if getattr(multi_query_retriever, "include_original", False):
+        queries.append(question)
+    search_start = time.time()
+    docs = []
+    for query in queries:
+        docs.extend(search(query, k))
+    timings["vector_search_s"] = time.time() - search_start
+    return _unique_documents(docs)
+
 def retrieve_documents(
     question: str, 
+    vectorstore: VectorStore,
     retrievers: Dict[str, Any],
     reranker_compressor: Optional[CohereRerank], 
     use_reranker: bool,
-    use_multi_query: bool
+    use_multi_query: bool,
+    k: Optional[int] = None,
+    rerank_k: Optional[int] = None,
+    timings: Optional[Dict[str, float]] = None,
+    use_hybrid: bool = False,
+    use_mmr: bool = False,
+    query_vector: Optional[np.ndarray] = None
 ) -> Tuple[List[Document], float, str]:
+    """Récupère les documents pour une question avec des paramètres k propres à l'appel.
+
+    Les recherches passent directement par le vectorstore déjà initialisé : aucun état
+    global (Config, retrievers partagés) n'est modifié, ce qui permet à des requêtes
+    concurrentes d'utiliser des valeurs de k différentes.
+
+    Avec `use_hybrid`, chaque recherche de candidats (y compris avant reranking et pour
+    chaque variante multi-query) fusionne vectorstore et index BM25 par RRF. Avec `use_mmr`,
+    ces candidats sont diversifiés (MMR, au plus `MAX_CHUNKS_PER_URL` chunks par page)
+    avant d'être rerankés ou renvoyés.
+
+    `query_vector`, l'embedding de `question` déjà calculé (cache sémantique) avec le modèle
+    du vectorstore, remplace l'appel d'embedding de la recherche de la question.
+
+    Si `timings` est fourni, il reçoit la durée de chaque sous-étape
+    (`vector_search_s`, `lexical_search_s`, `rerank_s`, `multi_query_expansion_s`).
+    """
     retrieval_start_time = time.time()
     retriever_used = "Unknown"
+    k = k if k is not None else Config.DEFAULT_K
+    rerank_k = rerank_k if rerank_k is not None else Config.RERANK_K
+    timings = timings if timings is not None else {}
+    hybrid = _hybrid_retriever(retrievers, use_hybrid)
+    search = _search_function(vectorstore, hybrid, timings, use_mmr, question, query_vector)
     
     if use_reranker and reranker_compressor:
-        logging.info(f"[Timing] Starting retrieval for reranking (k={Config.RERANK_K})...")
+        logging.info(f"[Timing] Starting retrieval for reranking (k={rerank_k}, top_n={k})...")
         retriever_used = "Rerank Base Retriever + Compression Retriever"
         
-        compression_retriever = ContextualCompressionRetriever(
-            base_compressor=reranker_compressor,
-            base_retriever=retrievers["rerank_base"]
-        )
-        
-        docs = compression_retriever.get_relevant_documents(question)
+        search_start = time.time()
+        candidates = search(question, rerank_k)
+        timings["vector_search_s"] = time.time() - search_start
+        rerank_start = time.time()
+        docs = _rerank_documents(reranker_compressor, question, candidates, top_n=k)
+        timings["rerank_s"] = time.time() - rerank_start
     elif use_multi_query:
         retriever_used = "Multi-Query Retriever"
-        logging.info(f"[Timing] Starting multi-query document retrieval (k={Config.DEFAULT_K})...")
-        docs = retrievers["multi_query"].get_relevant_documents(question)
+        logging.info(f"[Timing] Starting multi-query document retrieval (k={k})...")
+        docs = _multi_query_search(question, search, retrievers["multi_query"], k, timings)
     else:
         retriever_used = "Base Retriever"
-        logging.info(f"[Timing] Starting standard document retrieval (k={Config.DEFAULT_K})...")
-        docs = retrievers["base"].get_relevant_documents(question)
+        logging.info(f"[Timing] Starting standard document retrieval (k={k})...")
+        search_start = time.time()
+        docs = search(question, k)
+        timings["vector_search_s"] = time.time() - search_start
         
         if use_reranker and not reranker_compressor:
             logging.warning("Reranker was requested but is not available. Falling back to standard retrieval.")
+    if hybrid is not None:
+        retriever_used += " + BM25 (RRF)"
+    if use_mmr:
+        retriever_used += " + MMR"
     
     retrieval_duration = time.time() - retrieval_start_time
     logging.info(f"[Timing] Document retrieval finished in {retrieval_duration:.2f} seconds. Found {len(docs)} documents.")
     
     return docs, retrieval_duration, retriever_used
 
+async def _amulti_query_search(
+    question: str,
+    search: Callable[[str, int], Awaitable[List[Document]]],
+    multi_query_retriever: MultiQueryRetriever,
+    k: int,
+    timings: Dict[str, float]
+) -> List[Document]:
+    """Variante asynchrone de `_multi_query_search` : les variantes sont recherchées en parallèle."""
+    expansion_start = time.time()
+    queries = await multi_query_retriever.agenerate_queries(
+        question, AsyncCallbackManagerForRetrieverRun.get_noop_manager()
+    )
+    timings["multi_query_expansion_s"] = time.time() - expansion_start
+    if getattr(multi_query_retriever, "include_original", False):
+        queries.append(question)
+    search_start = time.time()
+    results = await asyncio.gather(*(search(query, k) for query in queries))
+    timings["vector_search_s"] = time.time() - search_start
+    return _unique_documents([doc for docs in results for doc in docs])
+
+async def aretrieve_documents(
+    question: str,
+    vectorstore: VectorStore,
+    retrievers: Dict[str, Any],
+    reranker_compressor: Optional[CohereRerank],
+    use_reranker: bool,
+    use_multi_query: bool,
+    k: Optional[int] = None,
+    rerank_k: Optional[int] = None,
+    timings: Optional[Dict[str, float]] = None,
+    use_hybrid: bool = False,
+    use_mmr: bool = False,
+    query_vector: Optional[np.ndarray] = None
+) -> Tuple[List[Document], float, str]:
+    """Variante asynchrone de `retrieve_documents` (mêmes paramètres, même résultat).
+
+    Le client Cohere n'ayant pas d'API asynchrone dans langchain_cohere, le reranking
+    est exécuté dans un thread pour ne pas bloquer la boucle d'événements.
+    """
+    retrieval_start_time = time.time()
+    k = k if k is not None else Config.DEFAULT_K
+    rerank_k = rerank_k if rerank_k is not None else Config.RERANK_K
+    timings = timings if timings is not None else {}
+    hybrid = _hybrid_retriever(retrievers, use_hybrid)
+    search = _asearch_function(vectorstore, hybrid, timings, use_mmr, question, query_vector)
+
+    if use_reranker and reranker_compressor:
+        logging.info(f"[Timing] Starting async retrieval for reranking (k={rerank_k}, top_n={k})...")
+        retriever_used = "Rerank Base Retriever + Compression Retriever"
+        search_start = time.time()
+        candidates = await search(question, rerank_k)
+        timings["vector_search_s"] = time.time() - search_start
+        rerank_start = time.time()
+        docs = await asyncio.to_thread(_rerank_documents, reranker_compressor, question, candidates, k)
+        timings["rerank_s"] = time.time() - rerank_start
+    elif use_multi_query:
+        retriever_used = "Multi-Query Retriever"
+        logging.info(f"[Timing] Starting async multi-query document retrieval (k={k})...")
+        docs = await _amulti_query_search(question, search, retrievers["multi_query"], k, timings)
+    else:
+        retriever_used = "Base Retriever"
+        logging.info(f"[Timing] Starting async standard document retrieval (k={k})...")
+        search_start = time.time()
+        docs = await search(question, k)
+        timings["vector_search_s"] = time.time() - search_start
+
+        if use_reranker and not reranker_compressor:
+            logging.warning("Reranker was requested but is not available. Falling back to standard retrieval.")
+    if hybrid is not None:
+        retriever_used += " + BM25 (RRF)"
+    if use_mmr:
+        retriever_used += " + MMR"
+
+    retrieval_duration = time.time() - retrieval_start_time
+    logging.info(f"[Timing] Async document retrieval finished in {retrieval_duration:.2f} seconds. Found {len(docs)} documents.")
+
+    return docs, retrieval_duration, retriever_used
+
 def format_sources(docs: List[Document]) -> str:
     sources = []
     for i, doc in enumerate(docs):
         source_info = f"Source {i+1}:\n"
         source_info += f"Titre: {doc.metadata.get('title', 'Non disponible')}\n"
         source_info += f"URL: {doc.metadata.get('url', 'Non disponible')}\n"
+        # Chunk canonique d'un contenu publié sur plusieurs pages (RAG/dedup.py)
+        other_urls = [url for url in doc.metadata.get("source_urls", "").split() if url != doc.metadata.get("url")]
+        if other_urls:
+            source_info += f"Aussi sur: {', '.join(other_urls)}\n"
         source_info += f"Contenu: {doc.page_content[:200]}...\n"
         sources.append(source_info)
     return "\n".join(sources)
@@ -0,0 +1,173 @@
+"""
+Cache sémantique des réponses du système RAG.
+
+Les questions reformulées (« frais de scolarité ING1 ? » / « combien coûte l'ING1 ? »)
+sont rapprochées par similarité cosinus de leurs embeddings : au-dessus d'un seuil,
+la réponse déjà générée (et ses sources) est renvoyée sans retrieval ni appel LLM.
+
+La similarité seule ne distingue pas deux questions qui ne diffèrent que par un code de
+programme ou un sigle (« frais ING1 » / « frais ING2 ») : une entrée n'est réutilisée que si
+la question contient exactement les mêmes nombres, codes et sigles (`key_terms`).
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Hashable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .lexical import FRENCH_STOPWORDS, _strip_accents
+
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+
+def key_terms(question: str) -> FrozenSet[str]:
+    """Nombres, codes de programme et sigles de la question, en minuscules et sans accents.
+
+    Comme pour BM25 (`lexical.tokenize`), un nombre précédé d'un sigle ou d'un mot court est
+    collé à celui-ci : « ING 2 » et « ing2 » donnent le même terme « ing2 ».
+    """
+    words = _WORD_RE.findall(_strip_accents(question))
+    terms = set()
+    for i, word in enumerate(words):
+        previous = words[i - 1] if i > 0 else ""
+        following = words[i + 1] if i + 1 < len(words) else ""
+        if word.isdigit() and previous.isalpha() and (previous.isupper() or len(previous) <= 4) \
+                and previous.lower() not in FRENCH_STOPWORDS:
+            terms.add(previous.lower() + word)
+        elif any(char.isdigit() for char in word):
+            terms.add(word.lower())
+        elif len(word) >= 2 and word.isupper() and not following.isdigit():
+            # Sigle (« MBA », « BTS ») ; suivi d'un nombre, il est compté avec lui
+            terms.add(word.lower())
+    return frozenset(terms)
+
+
+class SemanticCache:
+    """Cache LRU/TTL borné, indexé par l'embedding de la question.
+
+    Les entrées sont regroupées par « partition » (modèle, paramètres d'échantillonnage,
+    options de retrieval) : une réponse n'est réutilisée que pour des flags identiques.
+    Les vecteurs sont stockés dans une matrice préallouée de `max_entries` lignes, la
+    mémoire est donc bornée quel que soit le trafic.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        *,
+        threshold: float = 0.95,
+        max_entries: int = 1000,
+        ttl_seconds: Optional[float] = 86400,
+        fingerprint_fn: Optional[Callable[[], Optional[Hashable]]] = None,
+    ):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._fingerprint_fn = fingerprint_fn
+        self._fingerprint = fingerprint_fn() if fingerprint_fn else None
+
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None  # (max_entries, dim), alloué au premier store
+        # slot -> (partition, termes clés, payload, created_at) ; l'ordre reflète l'usage (LRU en tête)
+        self._entries: "OrderedDict[int, Tuple[Hashable, FrozenSet[str], Dict[str, Any], float]]" = OrderedDict()
+        self._free_slots: List[int] = list(range(max_entries - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+
+    # ------------------------------------------------------------------
+    def embed(self, question: str) -> np.ndarray:
+        """Calcule l'embedding normalisé de la question (réutilisable pour `store`)."""
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    async def aembed(self, question: str) -> np.ndarray:
+        """Variante asynchrone de `embed`."""
+        vector = np.asarray(await self.embeddings.aembed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, vector: np.ndarray, partition: Hashable, question: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Retourne `(payload, similarité)` de la meilleure entrée au-dessus du seuil, sinon None.
+
+        Seules les entrées dont la question a les mêmes termes clés (`key_terms`) sont candidates.
+        """
+        terms = key_terms(question)
+        with self._lock:
+            self._check_fingerprint()
+            self._evict_expired()
+
+            slots = [
+                slot for slot, (entry_partition, entry_terms, _, _) in self._entries.items()
+                if entry_partition == partition and entry_terms == terms
+            ]
+            if not slots or self._vectors is None:
+                self.misses += 1
+                return None
+
+            similarities = self._vectors[slots] @ vector
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            slot = slots[best]
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            return self._entries[slot][2], similarity
+
+    def store(self, vector: np.ndarray, partition: Hashable, question: str, payload: Dict[str, Any]) -> None:
+        """Ajoute une réponse au cache, en évinçant l'entrée la moins récemment utilisée si plein."""
+        terms = key_terms(question)
+        with self._lock:
+            self._check_fingerprint()
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+
+            if not self._free_slots:
+                evicted_slot, _ = self._entries.popitem(last=False)
+                self._free_slots.append(evicted_slot)
+
+            slot = self._free_slots.pop()
+            self._vectors[slot] = vector
+            self._entries[slot] = (partition, terms, payload, time.monotonic())
+
+    def invalidate(self) -> None:
+        """Vide le cache (ex. après reconstruction du vectorstore)."""
+        with self._lock:
+            self._clear()
+        logging.info("Semantic cache invalidated.")
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    # ------------------------------------------------------------------
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+
+    def _check_fingerprint(self) -> None:
+        """Invalide le cache si l'empreinte du vectorstore a changé depuis le dernier accès."""
+        if self._fingerprint_fn is None:
+            return
+        fingerprint = self._fingerprint_fn()
+        if fingerprint != self._fingerprint:
+            logging.info("Vectorstore change detected, clearing semantic cache.")
+            self._fingerprint = fingerprint
+            self._clear()
+
+    def _evict_expired(self) -> None:
+        if not self.ttl_seconds:
+            return
+        deadline = time.monotonic() - self.ttl_seconds
+        expired = [slot for slot, (_, _, _, created_at) in self._entries.items() if created_at < deadline]
+        for slot in expired:
+            del self._entries[slot]
+            self._free_slots.append(slot)
@@ -3,8 +3,9 @@ from langchain_community.vectorstores import Chroma
 from langchain_openai import OpenAIEmbeddings
 from .config import Config
 from langchain_pinecone import Pinecone as LangchainPinecone 
-from typing import Union, List
+from typing import Union, List, Optional, Tuple
 from langchain_core.embeddings import Embeddings
+from .local_index import LocalVectorIndex, local_index_exists
 
 class NoOpEmbeddings(Embeddings):
     """Classe d'embedding fictive qui ne fait rien, si Langchain l'exige pour un index à embedding intégré."""
@@ -16,8 +17,8 @@ class NoOpEmbeddings(Embeddings):
         logging.warning("NoOpEmbeddings.embed_query a été appelé - ceci est inattendu.")
         return [0.0] * 1024
 
-def initialize_vectorstore(embeddings_for_chroma: OpenAIEmbeddings) -> Union[Chroma, LangchainPinecone]:
-    """Initialise et retourne le vectorstore configuré (Chroma ou Pinecone)."""
+def initialize_vectorstore(embeddings_for_chroma: OpenAIEmbeddings) -> Union[Chroma, LangchainPinecone, LocalVectorIndex]:
+    """Initialise et retourne le vectorstore configuré (Chroma, Pinecone ou Local)."""
     
     provider = Config.BDD_PROVIDER
     logging.info(f"Initialisation du vectorstore avec le fournisseur : {provider}")
@@ -72,7 +73,41 @@ def initialize_vectorstore(embeddings_for_chroma: OpenAIEmbeddings) -> Union[Chr
         )
         logging.info("Vectorstore Chroma chargé avec succès.")
         return vectorstore
+
+    elif provider == "Local":
+        logging.info(f"Chargement de l'index vectoriel local depuis {Config.LOCAL_INDEX_DIR}...")
+        if not local_index_exists(Config.LOCAL_INDEX_DIR):
+            logging.error(f"L'index local {Config.LOCAL_INDEX_DIR} n'existe pas. Lancez scripts/preprocessing/create_vectorstore.py avec BDD_PROVIDER=Local.")
+            raise FileNotFoundError(f"Index local non trouvé: {Config.LOCAL_INDEX_DIR}")
+        return LocalVectorIndex(Config.LOCAL_INDEX_DIR, embeddings_for_chroma)
     
     else:
-        logging.error(f"Fournisseur BDD inconnu : {provider}. Choix valides : 'Chroma', 'Pinecone'.")
-        raise ValueError(f"Fournisseur BDD non supporté : {provider}") 
\ No newline at end of file
+        logging.error(f"Fournisseur BDD inconnu : {provider}. Choix valides : 'Chroma', 'Pinecone', 'Local'.")
+        raise ValueError(f"Fournisseur BDD non supporté : {provider}")
+
+def vectorstore_fingerprint() -> Optional[Tuple]:
+    """Empreinte légère du vectorstore local, utilisée pour invalider les caches dérivés.
+
+    Pour Chroma et l'index local, la date de modification et la taille des fichiers
+    persistés changent à chaque reconstruction de l'index. Pinecone étant distant, on
+    utilise le manifeste écrit par le script d'indexation (RAG/indexing.py) s'il est
+    présent sur cette machine ; sinon aucune empreinte n'est calculée (retourne None) et
+    l'invalidation se fait explicitement.
+    """
+    if Config.BDD_PROVIDER == "Pinecone":
+        paths = [Config.INDEX_MANIFEST_DIR / "pinecone.json"]
+    else:
+        index_dir = {"Chroma": Config.VECTORSTORE_DIR, "Local": Config.LOCAL_INDEX_DIR}.get(Config.BDD_PROVIDER)
+        if index_dir is None or not index_dir.exists():
+            return None
+        paths = sorted(index_dir.iterdir())
+    try:
+        return tuple(
+            (path.name, stat.st_mtime_ns, stat.st_size)
+            for path in paths
+            if path.is_file()
+            for stat in (path.stat(),)
+        ) or None
+    except OSError as e:
+        logging.warning(f"Impossible de calculer l'empreinte du vectorstore: {e}")
+        return None
@@ -0,0 +1,197 @@
+"""
+Contrôle d'admission des endpoints de chat.
+
+Chaque endpoint dispose d'un nombre limité d'exécutions simultanées du pipeline RAG
+et d'une file d'attente bornée. Au-delà, la requête est refusée immédiatement
+(429 si la file est pleine, 503 si le délai d'attente est dépassé) avec un en-tête
+`Retry-After`, plutôt que d'accumuler des threads qui finiront tous en timeout.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict
+
+from RAG import metrics
+
+
+class AdmissionRejected(Exception):
+    """Requête refusée par le contrôle d'admission (à convertir en réponse HTTP)."""
+
+    def __init__(self, status_code: int, message: str, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.retry_after = retry_after
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"error": self.message, "retry_after": self.retry_after}
+
+
+class _AdmissionBase:
+    """Compteurs et estimation de `Retry-After` communs aux variantes sync et async."""
+
+    # Poids de la moyenne glissante de la durée d'occupation d'un slot
+    _EWMA_ALPHA = 0.2
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.service_time_avg = 0.0
+
+    def _retry_after(self) -> int:
+        """Estimation du délai avant qu'un slot se libère pour une nouvelle requête."""
+        estimate = self.service_time_avg * (self.waiting + 1) / self.max_concurrent
+        return max(1, math.ceil(estimate))
+
+    def _queue_full(self) -> AdmissionRejected:
+        self.rejected_queue_full += 1
+        metrics.ADMISSION_REJECTED.labels(endpoint=self.name, reason="queue_full").inc()
+        return AdmissionRejected(429, f"Server busy ({self.name}): request queue is full, retry later.", self._retry_after())
+
+    def _queue_timeout(self) -> AdmissionRejected:
+        self.rejected_timeout += 1
+        metrics.ADMISSION_REJECTED.labels(endpoint=self.name, reason="queue_timeout").inc()
+        return AdmissionRejected(
+            503, f"Server busy ({self.name}): no slot freed within {self.queue_timeout:.0f}s, retry later.", self._retry_after()
+        )
+
+    def _record_admission(self, wait_time: float) -> None:
+        self.admitted += 1
+        self.wait_time_total += wait_time
+        self.wait_time_max = max(self.wait_time_max, wait_time)
+        metrics.ADMISSION_WAIT.labels(endpoint=self.name).observe(wait_time)
+
+    def _record_release(self, service_time: float) -> None:
+        self.active -= 1
+        if self.service_time_avg == 0.0:
+            self.service_time_avg = service_time
+        else:
+            self.service_time_avg += self._EWMA_ALPHA * (service_time - self.service_time_avg)
+
+    def export_metrics(self) -> None:
+        """Met à jour les jauges instantanées avant un rendu de `/api/metrics`."""
+        metrics.ADMISSION_ACTIVE.labels(endpoint=self.name).set(self.active)
+        metrics.ADMISSION_QUEUE_DEPTH.labels(endpoint=self.name).set(self.waiting)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout_s": self.queue_timeout,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "wait_time_avg_s": self.wait_time_total / self.admitted if self.admitted else 0.0,
+            "wait_time_max_s": self.wait_time_max,
+            "service_time_avg_s": self.service_time_avg,
+        }
+
+
+class AdmissionController(_AdmissionBase):
+    """Limiteur pour les serveurs à threads (Flask/waitress).
+
+    `acquire` retourne l'instant d'admission, à repasser à `release`.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        super().__init__(name, max_concurrent, max_queue, queue_timeout)
+        self._cond = threading.Condition()
+
+    def acquire(self) -> float:
+        arrival = time.monotonic()
+        with self._cond:
+            if self.active >= self.max_concurrent:
+                if self.waiting >= self.max_queue:
+                    raise self._queue_full()
+                self.waiting += 1
+                deadline = arrival + self.queue_timeout
+                try:
+                    while self.active >= self.max_concurrent:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise self._queue_timeout()
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+            admitted_at = time.monotonic()
+            self._record_admission(admitted_at - arrival)
+            return admitted_at
+
+    def release(self, admitted_at: float) -> None:
+        with self._cond:
+            self._record_release(time.monotonic() - admitted_at)
+            self._cond.notify()
+
+
+class AsyncAdmissionController(_AdmissionBase):
+    """Limiteur pour le point d'entrée ASGI (toutes les opérations sur la boucle d'événements).
+
+    Les requêtes en attente sont servies dans l'ordre d'arrivée : `release` transmet
+    directement le slot au premier waiter. `release` est synchrone pour pouvoir être
+    appelé depuis le `finally` d'un générateur de streaming interrompu.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        super().__init__(name, max_concurrent, max_queue, queue_timeout)
+        self._waiters: Deque["asyncio.Future"] = deque()
+
+    async def acquire(self) -> float:
+        arrival = time.monotonic()
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+        else:
+            if self.waiting >= self.max_queue:
+                raise self._queue_full()
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+            except asyncio.TimeoutError:
+                if not waiter.done():
+                    waiter.cancel()
+                    raise self._queue_timeout()
+                # Slot attribué au moment même du timeout : on le conserve
+            except BaseException:
+                # Requête annulée pendant l'attente : rendre le slot s'il venait d'être attribué
+                if waiter.done() and not waiter.cancelled():
+                    self.active -= 1
+                    self._wake_next()
+                else:
+                    waiter.cancel()
+                raise
+            finally:
+                self.waiting -= 1
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        admitted_at = time.monotonic()
+        self._record_admission(admitted_at - arrival)
+        return admitted_at
+
+    def release(self, admitted_at: float) -> None:
+        self._record_release(time.monotonic() - admitted_at)
+        self._wake_next()
+
+    def _wake_next(self) -> None:
+        while self._waiters and self.active < self.max_concurrent:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Le slot est réservé avant le réveil : aucune nouvelle requête ne peut le prendre entre-temps
+                self.active += 1
+                waiter.set_result(None)
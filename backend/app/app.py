@@ -8,16 +8,18 @@ from pathlib import Path
 # Path(__file__).parent.parent est backend/
 sys.path.insert(0, str(Path(__file__).parent.parent)) # Assurez-vous que cette ligne est présente et non commentée
 
-from flask import Flask, request, jsonify, g
+from flask import Flask, request, jsonify, g, Response
 from flask_cors import CORS
 import logging
 import time
 from functools import wraps
-import json
 # sys.path.append(str(Path(__file__).parent.parent.parent))
 
 from RAG.rag_core import AdvancedRAG
+from RAG import metrics
 from config import Config
+from app.common import get_cors_origins, parse_chat_request, format_sse
+from app.admission import AdmissionController, AdmissionRejected
 from dotenv import load_dotenv
 load_dotenv(dotenv_path=Path(__file__).parent.parent / ".env")
 
@@ -38,9 +40,7 @@ if not os.path.exists(vectorstore_path):
 
 app = Flask(__name__)
 # --- CORS Configuration ---
-raw_origins_string = os.getenv("CORS_ALLOWED_ORIGINS", "http://localhost:3000")
-# Nettoyer chaque URL : supprimer les espaces en début/fin et le point-virgule final éventuel
-cors_origins = [origin.strip().rstrip(';') for origin in raw_origins_string.split(',')]
+cors_origins = get_cors_origins()
 CORS(app, resources={r"/api/*": {"origins": cors_origins}})
 logging.info(f"CORS enabled for (cleaned) origins: {cors_origins}")
 
@@ -65,7 +65,10 @@ def track_api_performance(f):
         # Logger les performances
         endpoint = request.path
         method = request.method
-        status_code = result[1] if isinstance(result, tuple) and len(result) > 1 else 200
+        if hasattr(result, 'status_code'):
+            status_code = result.status_code
+        else:
+            status_code = result[1] if isinstance(result, tuple) and len(result) > 1 else 200
         logging.info(f"API Call: {method} {endpoint} | Status: {status_code} | Duration: {elapsed_time:.2f}s")
         
         if Config.USE_HELICONE and request_id:
@@ -74,6 +77,43 @@ def track_api_performance(f):
         return result
     return decorated_function
 
+# --- Contrôle d'admission : limite de requêtes simultanées et file bornée par endpoint ---
+chat_admission = AdmissionController(
+    "chat", Config.CHAT_MAX_CONCURRENT, Config.CHAT_MAX_QUEUE, Config.CHAT_QUEUE_TIMEOUT
+)
+stream_admission = AdmissionController(
+    "chat_stream", Config.STREAM_MAX_CONCURRENT, Config.STREAM_MAX_QUEUE, Config.STREAM_QUEUE_TIMEOUT
+)
+
+def admission_controlled(controller: AdmissionController):
+    """Réserve un slot du contrôleur pendant toute la durée de la réponse.
+
+    Le slot est libéré à la fermeture de la réponse WSGI : pour le streaming SSE,
+    cela correspond à la fin du générateur (ou à la déconnexion du client).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not Config.ADMISSION_CONTROL_ENABLED:
+                return f(*args, **kwargs)
+            try:
+                admitted_at = controller.acquire()
+            except AdmissionRejected as e:
+                logging.warning(f"Admission rejected for {request.path}: {e.message} (Retry-After: {e.retry_after}s)")
+                response = jsonify(e.to_dict())
+                response.status_code = e.status_code
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response
+            try:
+                response = app.make_response(f(*args, **kwargs))
+            except Exception:
+                controller.release(admitted_at)
+                raise
+            response.call_on_close(lambda: controller.release(admitted_at))
+            return response
+        return decorated_function
+    return decorator
+
 rag_instance = None
 try:
     logging.info("Initializing AdvancedRAG...")
@@ -84,36 +124,24 @@ except Exception as e:
 
 @app.route('/api/chat', methods=['POST'])
 @track_api_performance
+@admission_controlled(chat_admission)
 def chat_endpoint():
     if rag_instance is None:
         logging.error("Chat request received but RAG system is not initialized.")
         return jsonify({"error": "RAG system failed to initialize. Check backend logs."}), 500
 
-    data = request.get_json()
-    if not data or 'question' not in data or not data['question'].strip():
-        logging.warning("Received invalid chat request (missing or empty question).")
-        return jsonify({"error": "Missing or empty 'question' in request body"}), 400
-
-    question = data['question'].strip()
-    evaluate_sources = data.get('evaluate_sources', False)
-    use_reranker = data.get('use_reranker', False)
-    use_multi_query = data.get('use_multi_query', False)
-    model = data.get('model')
-    temperature = data.get('temperature', 1.0)  # Valeur par défaut de 1.0 selon la doc
-    
-    # Validation de la température
     try:
-        temperature = float(temperature)
-        if temperature < 0.0 or temperature > 2.0:
-            logging.warning(f"Temperature value out of range ({temperature}), using default 1.0")
-            temperature = 1.0
-    except (ValueError, TypeError):
-        logging.warning(f"Invalid temperature value ({temperature}), using default 1.0")
-        temperature = 1.0
-    
-    # Nouveaux paramètres de récupération (nombre de documents)
-    k = data.get('k')  # Nombre de documents à récupérer
-    rerank_k = data.get('rerank_k')  # Nombre de documents à récupérer avant reranking
+        params = parse_chat_request(request.get_json())
+    except ValueError as e:
+        logging.warning("Received invalid chat request (missing or empty question).")
+        return jsonify({"error": str(e)}), 400
+
+    question = params['question']
+    evaluate_sources = params['evaluate_sources']
+    use_reranker = params['use_reranker']
+    use_multi_query = params['use_multi_query']
+    model = params['model']
+    temperature = params['temperature']
     
     # Ajouter des métadonnées pour Helicone si configuré
     helicone_headers = {}
@@ -133,31 +161,16 @@ def chat_endpoint():
     
     logging.info(
         f"Received question: '{question}', EvalSources={evaluate_sources}, Reranker={use_reranker}, MultiQuery={use_multi_query}, Model={model or Config.DEFAULT_MODEL}, "
-        f"T={temperature}, top_p={data.get('top_p')}, top_k={data.get('top_k')}, freq_pen={data.get('frequency_penalty')}, pres_pen={data.get('presence_penalty')}, rep_pen={data.get('repetition_penalty')}, seed={data.get('seed')}, max_tokens={data.get('max_tokens')}, k={k}, rerank_k={rerank_k}"
+        f"T={temperature}, top_p={params['top_p']}, top_k={params['top_k']}, freq_pen={params['frequency_penalty']}, pres_pen={params['presence_penalty']}, rep_pen={params['repetition_penalty']}, seed={params['seed']}, max_tokens={params['max_tokens']}, k={params['k']}, rerank_k={params['rerank_k']}"
     )
 
     try:
-        result = rag_instance.answer_question(
-            question=question,
-            evaluate_sources=evaluate_sources,
-            use_reranker=use_reranker,
-            use_multi_query=use_multi_query,
-            model=model,
-            temperature=temperature,
-            top_p=data.get('top_p'),
-            top_k=data.get('top_k'),
-            frequency_penalty=data.get('frequency_penalty'),
-            presence_penalty=data.get('presence_penalty'),
-            repetition_penalty=data.get('repetition_penalty'),
-            seed=data.get('seed'),
-            max_tokens=data.get('max_tokens'),
-            k=k,
-            rerank_k=rerank_k,
-        )
+        result = rag_instance.answer_question(**params)
         logging.info(f"Successfully generated answer for question: '{question}'")
         print('Réponse envoyée au frontend:', result)
         return jsonify(result)
     except Exception as e:
+        metrics.ERRORS.labels(stage="request").inc()
         logging.exception(f"Error processing question '{question}': {e}")
         return jsonify({"error": f"An internal error occurred while processing the request: {e}"}), 500
 
@@ -181,11 +194,28 @@ def helicone_status():
     }
     return jsonify(status)
 
+# Endpoint pour suivre la saturation des endpoints de chat (file d'attente, temps d'attente)
+@app.route('/api/admission/status', methods=['GET'])
+def admission_status():
+    return jsonify({
+        "enabled": Config.ADMISSION_CONTROL_ENABLED,
+        "chat": chat_admission.stats(),
+        "chat_stream": stream_admission.stats(),
+    })
+
+# Endpoint Prometheus : histogrammes de latence par étape et compteurs (tokens, coût, erreurs, cache)
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    chat_admission.export_metrics()
+    stream_admission.export_metrics()
+    return Response(metrics.generate_latest(), mimetype=metrics.CONTENT_TYPE)
+
 # -------------------------------------------------------------------------
 # Streaming endpoint ------------------------------------------------------
 # -------------------------------------------------------------------------
 
 @app.route('/api/chat/stream', methods=['POST'])
+@admission_controlled(stream_admission)
 def chat_stream_endpoint():
     """Endpoint that streams the answer using Server-Sent Events (SSE).
     """
@@ -193,89 +223,29 @@ def chat_stream_endpoint():
         logging.error("Chat stream request received but RAG system is not initialized.")
         return jsonify({"error": "RAG system failed to initialize. Check backend logs."}), 500
 
-    # Ensure mimetype is text/event-stream for SSE
-    def generate_sse(data: str, event: str = None):
-        """Utility: formats a data string as SSE."""
-        msg = ""
-        if event:
-            msg += f"event: {event}\n"
-        for line in data.split("\n"):
-            msg += f"data: {line}\n"
-        msg += "\n"
-        return msg
-
-    data = request.get_json()
-    if not data or 'question' not in data or not data['question'].strip():
-        return jsonify({"error": "Missing or empty 'question' in request body"}), 400
-
-    question = data['question'].strip()
-    evaluate_sources = data.get('evaluate_sources', False)
-    use_reranker = data.get('use_reranker', False)
-    use_multi_query = data.get('use_multi_query', False)
-    model = data.get('model')
-    temperature = data.get('temperature', 1.0)  # Valeur par défaut de 1.0 selon la doc
-    
-    # Validation de la température
     try:
-        temperature = float(temperature)
-        if temperature < 0.0 or temperature > 2.0:
-            logging.warning(f"Temperature value out of range ({temperature}), using default 1.0")
-            temperature = 1.0
-    except (ValueError, TypeError):
-        logging.warning(f"Invalid temperature value ({temperature}), using default 1.0")
-        temperature = 1.0
-
-    # Nouveaux paramètres de récupération (nombre de documents)
-    k = data.get('k')  # Nombre de documents à récupérer
-    rerank_k = data.get('rerank_k')  # Nombre de documents à récupérer avant reranking
-
-    # New sampling parameters
-    top_p = data.get('top_p')
-    top_k = data.get('top_k')
-    frequency_penalty = data.get('frequency_penalty')
-    presence_penalty = data.get('presence_penalty')
-    repetition_penalty = data.get('repetition_penalty')
-    seed = data.get('seed')
-    max_tokens = data.get('max_tokens')
+        params = parse_chat_request(request.get_json())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    logging.info(f"[SSE] Streaming answer for question: '{question[:80]}...' (Reranker={use_reranker}, MultiQuery={use_multi_query}, Evaluate={evaluate_sources}, Model={model}, T={temperature}, top_p={top_p}, top_k={top_k}, freq_pen={frequency_penalty}, pres_pen={presence_penalty}, rep_pen={repetition_penalty}, seed={seed}, max_tokens={max_tokens})")
+    question = params['question']
+    logging.info(f"[SSE] Streaming answer for question: '{question[:80]}...' (Reranker={params['use_reranker']}, MultiQuery={params['use_multi_query']}, Evaluate={params['evaluate_sources']}, Model={params['model']}, T={params['temperature']}, top_p={params['top_p']}, top_k={params['top_k']}, freq_pen={params['frequency_penalty']}, pres_pen={params['presence_penalty']}, rep_pen={params['repetition_penalty']}, seed={params['seed']}, max_tokens={params['max_tokens']})")
 
     def event_stream():
         # Stream chunks from RAG
         try:
-            answer_gen = rag_instance.answer_question_stream(
-                question=question,
-                use_reranker=use_reranker,
-                use_multi_query=use_multi_query,
-                evaluate_sources=evaluate_sources,
-                model=model,
-                temperature=temperature,
-                top_p=top_p,
-                top_k=top_k,
-                frequency_penalty=frequency_penalty,
-                presence_penalty=presence_penalty,
-                repetition_penalty=repetition_penalty,
-                seed=seed,
-                max_tokens=max_tokens,
-                k=k,
-                rerank_k=rerank_k,
-            )
+            answer_gen = rag_instance.answer_question_stream(**params)
 
             for chunk in answer_gen:
-                # If the backend sent a metadata JSON (no newline), wrap it as SSE
-                try:
-                    # Detect if chunk looks like JSON
-                    json.loads(chunk)
-                    yield generate_sse(chunk)  # already JSON string
-                except Exception:
-                    # Regular text chunk
-                    yield generate_sse(chunk)
+                # Text chunks and metadata JSON are both forwarded as plain SSE data lines
+                yield format_sse(chunk)
 
             # End of stream marker per SSE convention
-            yield generate_sse("[DONE]", event="done")
+            yield format_sse("[DONE]", event="done")
         except Exception as e:
+            metrics.ERRORS.labels(stage="request").inc()
             logging.exception(f"Error during streaming: {e}")
-            yield generate_sse(f"Error: {str(e)}", event="error")
+            yield format_sse(f"Error: {str(e)}", event="error")
 
     # Return a streaming response
     return app.response_class(event_stream(), mimetype='text/event-stream')
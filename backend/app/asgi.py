@@ -0,0 +1,195 @@
+"""
+Point d'entrée ASGI de l'API de chat (alternative au serveur Flask/WSGI de `app.app`).
+
+Expose les mêmes contrats (`/api/chat`, `/api/chat/stream`, `/api/models`,
+`/api/helicone/status`) mais s'appuie sur le pipeline asynchrone d'AdvancedRAG :
+un flux SSE ouvert n'occupe plus un thread, seulement une coroutine.
+
+Lancement :
+    uvicorn app.asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import sys
+import os
+import logging
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from RAG.rag_core import AdvancedRAG
+from RAG import metrics
+from config import Config
+from app.common import get_cors_origins, parse_chat_request, format_sse
+from app.admission import AsyncAdmissionController, AdmissionRejected
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+rag_instance = None
+try:
+    logging.info("Initializing AdvancedRAG (ASGI)...")
+    rag_instance = AdvancedRAG()
+    logging.info("AdvancedRAG initialized successfully.")
+except Exception as e:
+    logging.exception(f"Critical Error initializing AdvancedRAG: {e}")
+
+# Mêmes limites par endpoint que le serveur Flask
+chat_admission = AsyncAdmissionController(
+    "chat", Config.CHAT_MAX_CONCURRENT, Config.CHAT_MAX_QUEUE, Config.CHAT_QUEUE_TIMEOUT
+)
+stream_admission = AsyncAdmissionController(
+    "chat_stream", Config.STREAM_MAX_CONCURRENT, Config.STREAM_MAX_QUEUE, Config.STREAM_QUEUE_TIMEOUT
+)
+
+def _rejection_response(request: Request, rejection: AdmissionRejected) -> JSONResponse:
+    logging.warning(f"Admission rejected for {request.url.path}: {rejection.message} (Retry-After: {rejection.retry_after}s)")
+    return JSONResponse(
+        rejection.to_dict(), status_code=rejection.status_code, headers={"Retry-After": str(rejection.retry_after)}
+    )
+
+async def _read_chat_params(request: Request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    return parse_chat_request(data)
+
+async def chat_endpoint(request: Request) -> JSONResponse:
+    start_time = time.time()
+    if rag_instance is None:
+        logging.error("Chat request received but RAG system is not initialized.")
+        return JSONResponse({"error": "RAG system failed to initialize. Check backend logs."}, status_code=500)
+
+    try:
+        params = await _read_chat_params(request)
+    except ValueError as e:
+        logging.warning("Received invalid chat request (missing or empty question).")
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    question = params['question']
+    logging.info(f"Received question (ASGI): '{question}' (Model={params['model'] or Config.DEFAULT_MODEL}, T={params['temperature']})")
+
+    admitted_at = None
+    if Config.ADMISSION_CONTROL_ENABLED:
+        try:
+            admitted_at = await chat_admission.acquire()
+        except AdmissionRejected as e:
+            return _rejection_response(request, e)
+
+    try:
+        result = await rag_instance.aanswer_question(**params)
+        logging.info(f"API Call: POST /api/chat | Status: 200 | Duration: {time.time() - start_time:.2f}s")
+        return JSONResponse(result)
+    except Exception as e:
+        metrics.ERRORS.labels(stage="request").inc()
+        logging.exception(f"Error processing question '{question}': {e}")
+        return JSONResponse({"error": f"An internal error occurred while processing the request: {e}"}, status_code=500)
+    finally:
+        if admitted_at is not None:
+            chat_admission.release(admitted_at)
+
+class _AdmittedStreamingResponse(StreamingResponse):
+    """StreamingResponse qui appelle `release` une fois la réponse terminée, quelle qu'en soit la raison."""
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
+
+async def chat_stream_endpoint(request: Request):
+    """Endpoint that streams the answer using Server-Sent Events (SSE)."""
+    if rag_instance is None:
+        logging.error("Chat stream request received but RAG system is not initialized.")
+        return JSONResponse({"error": "RAG system failed to initialize. Check backend logs."}, status_code=500)
+
+    try:
+        params = await _read_chat_params(request)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    logging.info(f"[SSE] Streaming answer (ASGI) for question: '{params['question'][:80]}...' (Model={params['model']}, T={params['temperature']})")
+
+    admitted_at = None
+    if Config.ADMISSION_CONTROL_ENABLED:
+        try:
+            admitted_at = await stream_admission.acquire()
+        except AdmissionRejected as e:
+            return _rejection_response(request, e)
+
+    async def event_stream():
+        try:
+            async for chunk in rag_instance.aanswer_question_stream(**params):
+                yield format_sse(chunk)
+
+            # End of stream marker per SSE convention
+            yield format_sse("[DONE]", event="done")
+        except Exception as e:
+            metrics.ERRORS.labels(stage="request").inc()
+            logging.exception(f"Error during streaming: {e}")
+            yield format_sse(f"Error: {str(e)}", event="error")
+
+    if admitted_at is None:
+        return StreamingResponse(event_stream(), media_type='text/event-stream')
+    # Le slot reste réservé jusqu'à la fin de la réponse, y compris si le client se
+    # déconnecte avant que le générateur ait démarré (son finally ne s'exécuterait pas)
+    return _AdmittedStreamingResponse(event_stream(), lambda: stream_admission.release(admitted_at), media_type='text/event-stream')
+
+async def get_models(request: Request) -> JSONResponse:
+    return JSONResponse({
+        "models": Config.AVAILABLE_MODELS,
+        "default": Config.DEFAULT_MODEL
+    })
+
+async def helicone_status(request: Request) -> JSONResponse:
+    return JSONResponse({
+        "enabled": Config.USE_HELICONE,
+        "api_key_configured": Config.HELICONE_API_KEY is not None,
+        "environment": "production" if not os.getenv("FLASK_ENV") == "development" else "development"
+    })
+
+async def admission_status(request: Request) -> JSONResponse:
+    return JSONResponse({
+        "enabled": Config.ADMISSION_CONTROL_ENABLED,
+        "chat": chat_admission.stats(),
+        "chat_stream": stream_admission.stats(),
+    })
+
+async def metrics_endpoint(request: Request) -> Response:
+    chat_admission.export_metrics()
+    stream_admission.export_metrics()
+    return Response(metrics.generate_latest(), media_type=metrics.CONTENT_TYPE)
+
+cors_origins = get_cors_origins()
+logging.info(f"CORS enabled for (cleaned) origins: {cors_origins}")
+
+app = Starlette(
+    routes=[
+        Route('/api/chat', chat_endpoint, methods=['POST']),
+        Route('/api/chat/stream', chat_stream_endpoint, methods=['POST']),
+        Route('/api/models', get_models, methods=['GET']),
+        Route('/api/helicone/status', helicone_status, methods=['GET']),
+        Route('/api/admission/status', admission_status, methods=['GET']),
+        Route('/api/metrics', metrics_endpoint, methods=['GET']),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=cors_origins, allow_methods=["*"], allow_headers=["*"]),
+    ],
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    logging.info("Starting ASGI server (uvicorn)...")
+    uvicorn.run(app, host='0.0.0.0', port=5000)
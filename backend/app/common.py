@@ -0,0 +1,66 @@
+"""
+Éléments partagés par les points d'entrée HTTP (Flask/WSGI et ASGI) :
+validation du corps des requêtes de chat, format SSE et configuration CORS.
+"""
+
+import os
+import logging
+from typing import Any, Dict, List, Optional
+
+def get_cors_origins() -> List[str]:
+    raw_origins_string = os.getenv("CORS_ALLOWED_ORIGINS", "http://localhost:3000")
+    # Nettoyer chaque URL : supprimer les espaces en début/fin et le point-virgule final éventuel
+    return [origin.strip().rstrip(';') for origin in raw_origins_string.split(',')]
+
+def parse_chat_request(data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Valide le corps JSON d'une requête de chat et retourne les arguments de `answer_question`.
+
+    Raises:
+        ValueError: si la question est absente ou vide.
+    """
+    if not data or 'question' not in data or not str(data['question']).strip():
+        raise ValueError("Missing or empty 'question' in request body")
+
+    temperature = data.get('temperature', 1.0)  # Valeur par défaut de 1.0 selon la doc
+
+    # Validation de la température
+    try:
+        temperature = float(temperature)
+        if temperature < 0.0 or temperature > 2.0:
+            logging.warning(f"Temperature value out of range ({temperature}), using default 1.0")
+            temperature = 1.0
+    except (ValueError, TypeError):
+        logging.warning(f"Invalid temperature value ({temperature}), using default 1.0")
+        temperature = 1.0
+
+    return {
+        "question": str(data['question']).strip(),
+        "evaluate_sources": data.get('evaluate_sources', False),
+        "use_reranker": data.get('use_reranker', False),
+        "use_multi_query": data.get('use_multi_query', False),
+        "use_hybrid": data.get('use_hybrid'),  # None : valeur par défaut du serveur (HYBRID_SEARCH_DEFAULT)
+        "use_mmr": data.get('use_mmr'),  # None : valeur par défaut du serveur (MMR_DEFAULT)
+        "model": data.get('model'),
+        "temperature": temperature,
+        "top_p": data.get('top_p'),
+        "top_k": data.get('top_k'),
+        "frequency_penalty": data.get('frequency_penalty'),
+        "presence_penalty": data.get('presence_penalty'),
+        "repetition_penalty": data.get('repetition_penalty'),
+        "seed": data.get('seed'),
+        "max_tokens": data.get('max_tokens'),
+        # Paramètres de récupération (nombre de documents avant/après reranking)
+        "k": data.get('k'),
+        "rerank_k": data.get('rerank_k'),
+        "use_cache": data.get('use_cache', True),
+    }
+
+def format_sse(data: str, event: Optional[str] = None) -> str:
+    """Utility: formats a data string as SSE."""
+    msg = ""
+    if event:
+        msg += f"event: {event}\n"
+    for line in data.split("\n"):
+        msg += f"data: {line}\n"
+    msg += "\n"
+    return msg
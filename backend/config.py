@@ -1,7 +1,7 @@
 import os
 import logging
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Any, Optional, Dict, List
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -22,8 +22,19 @@ class Config:
     LONG_FILES_DIR: Path = PREPROCESSED_DIR / "long_files"
     SHORT_FILES_DIR: Path = PREPROCESSED_DIR / "short_files"
     VECTORSTORE_DIR: Path = DATA_DIR / "vectorstore"
+    LOCAL_INDEX_DIR: Path = DATA_DIR / "local_index"  # Index vectoriel mappé en mémoire (BDD_PROVIDER=Local)
+    INDEX_MANIFEST_DIR: Path = DATA_DIR / "index_manifests"  # Empreintes des documents/chunks indexés, une par backend
+    EMBEDDING_CACHE_DIR: Path = DATA_DIR / "embedding_cache"  # Cache disque des embeddings (modèle, dimensions, hash du texte)
+    PIPELINE_DIR: Path = DATA_DIR / "pipeline"  # État des étapes de scripts/run_pipeline.py et chunks découpés
     LOGS_DIR: Path = BACKEND_DIR / "logs"
-    LOG_FILE: Path = LOGS_DIR / f"rag_session_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    LOG_FILE: Path = LOGS_DIR / f"rag_session_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+    # Journal des interactions : écriture en arrière-plan, fsync par lots et rotation
+    LOG_QUEUE_MAX: int = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+    LOG_FSYNC_EVERY: int = int(os.getenv("LOG_FSYNC_EVERY", "50"))  # Nombre d'interactions entre deux fsync
+    LOG_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("LOG_FLUSH_INTERVAL_SECONDS", "1"))
+    LOG_ROTATE_MAX_BYTES: int = int(os.getenv("LOG_ROTATE_MAX_BYTES", str(50 * 1024 * 1024)))  # 0 = pas de rotation par taille
+    LOG_ROTATE_INTERVAL_SECONDS: int = int(os.getenv("LOG_ROTATE_INTERVAL_SECONDS", "86400"))  # 0 = pas de rotation par durée
+    LOG_ROTATE_GZIP: bool = os.getenv("LOG_ROTATE_GZIP", "true").lower() == "true"
     
     # Module paths
     RAG_DIR: Path = BACKEND_DIR / "RAG"    # RAG components
@@ -35,6 +46,10 @@ class Config:
     PINECONE_API_KEY: Optional[str] = os.getenv("PINECONE_API_KEY")
     PINECONE_ENVIRONMENT: Optional[str] = os.getenv("PINECONE_ENVIRONMENT", "us-east-1") # Défaut si non défini
     PINECONE_INDEX_NAME: Optional[str] = os.getenv("PINECONE_INDEX_NAME", "cyia")       # Défaut si non défini
+    # Ingestion Pinecone (embedding intégré) : quota réel du plan, lots en parallèle et retries
+    PINECONE_TOKENS_PER_MINUTE: int = int(os.getenv("PINECONE_TOKENS_PER_MINUTE", "250000"))
+    PINECONE_UPSERT_CONCURRENCY: int = int(os.getenv("PINECONE_UPSERT_CONCURRENCY", "4"))
+    PINECONE_MAX_RETRIES: int = int(os.getenv("PINECONE_MAX_RETRIES", "6"))
     OPENROUTER_API_KEY: Optional[str] = os.getenv("OPENROUTER_API_KEY")
     COHERE_API_KEY: Optional[str] = os.getenv("COHERE_API_KEY")
     GOOGLE_API_KEY: Optional[str] = os.getenv("GOOGLE_API_KEY")
@@ -53,10 +68,87 @@ class Config:
     # RAG Parameters
     DEFAULT_K: int = 20  # Default number of documents to retrieve without reranking
     # Choix du fournisseur de BDD vectorielle (ajouté)
-    # Valeurs possibles: "Chroma", "Pinecone"
+    # Valeurs possibles: "Chroma", "Pinecone", "Local"
     BDD_PROVIDER: str = os.getenv("BDD_PROVIDER", "Chroma") 
+    LOCAL_INDEX_DTYPE: str = os.getenv("LOCAL_INDEX_DTYPE", "float32")  # "float32" ou "float16" (moitié moins de disque, float32 en mémoire)
+    # Quantification de l'index local : "none", "int8" ou "binary". Recherche en deux temps : les codes, 4x (int8)
+    # ou 32x (binary) plus petits que float32, sélectionnent k × LOCAL_INDEX_RESCORE_FACTOR candidats, reclassés
+    # avec vectors.npy (lu sur disque). Le parcours int8 (produits entiers sans BLAS) est ~3x plus lent que
+    # la recherche float32 exacte : sans reclassement, int8 n'économise que le disque et la mémoire (recall@4 ~0.9)
+    LOCAL_INDEX_QUANTIZATION: str = os.getenv("LOCAL_INDEX_QUANTIZATION", "none")
+    LOCAL_INDEX_RESCORE_FACTOR: int = int(os.getenv("LOCAL_INDEX_RESCORE_FACTOR", "8"))  # Candidats reclassés = k × facteur
+    LOCAL_INDEX_INT8_RESCORE: bool = os.getenv("LOCAL_INDEX_INT8_RESCORE", "true").lower() == "true"  # false : int8 en une passe, sans vectors.npy (binary : toujours reclassé)
     RERANK_K: int = 20  # Number of documents to retrieve *before* reranking
+    # Découpage des documents (doit être identique pour le vectorstore et l'index BM25)
+    # "markdown_tokens" : sections markdown, chunks mesurés en tokens (RAG/chunking.py) ; "characters" : ancien découpage
+    CHUNK_STRATEGY: str = os.getenv("CHUNK_STRATEGY", "markdown_tokens")
+    CHUNK_TOKENS: int = int(os.getenv("CHUNK_TOKENS", "300"))
+    CHUNK_OVERLAP_TOKENS: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "30"))  # Phrases entières, au sein d'une section
+    CHUNK_TOKENIZER: str = os.getenv("CHUNK_TOKENIZER", "cl100k_base")  # Encodage tiktoken de text-embedding-3-small
+    CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", "800"))  # Caractères, stratégie "characters"
+    CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "300"))
+    # Quasi-doublons entre pages (MinHash + LSH) : un seul chunk canonique indexé, avec les URLs des copies
+    DEDUP_ENABLED: bool = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+    DEDUP_THRESHOLD: float = float(os.getenv("DEDUP_THRESHOLD", "0.9"))  # Jaccard estimée des 5-grammes de mots
+    DEDUP_NUM_PERM: int = int(os.getenv("DEDUP_NUM_PERM", "128"))
+    DEDUP_BANDS: int = int(os.getenv("DEDUP_BANDS", "16"))  # Bandes LSH (num_perm / bands lignes chacune)
+
+    # Recherche hybride : index lexical BM25 en mémoire fusionné avec le vectorstore (RRF)
+    BM25_ENABLED: bool = os.getenv("BM25_ENABLED", "true").lower() == "true"
+    BM25_INDEX_PATH: Path = DATA_DIR / "bm25" / "bm25_index.pkl"
+    BM25_K1: float = float(os.getenv("BM25_K1", "1.2"))
+    BM25_B: float = float(os.getenv("BM25_B", "0.75"))
+    HYBRID_SEARCH_DEFAULT: bool = os.getenv("HYBRID_SEARCH_DEFAULT", "false").lower() == "true"  # Si `use_hybrid` n'est pas fourni
+    HYBRID_FETCH_K: int = int(os.getenv("HYBRID_FETCH_K", "40"))  # Candidats par liste avant fusion
+    HYBRID_RRF_K: int = int(os.getenv("HYBRID_RRF_K", "60"))
+    HYBRID_VECTOR_WEIGHT: float = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+    HYBRID_LEXICAL_WEIGHT: float = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0"))
+
+    # Diversité des résultats : MMR sur les vecteurs renvoyés avec les candidats, plafond de chunks par URL
+    MMR_DEFAULT: bool = os.getenv("MMR_DEFAULT", "false").lower() == "true"  # Si `use_mmr` n'est pas fourni
+    MMR_LAMBDA: float = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1 = pertinence seule, 0 = diversité seule
+    MMR_FETCH_FACTOR: int = int(os.getenv("MMR_FETCH_FACTOR", "3"))  # Candidats récupérés = k × facteur
+    MAX_CHUNKS_PER_URL: int = int(os.getenv("MAX_CHUNKS_PER_URL", "3"))  # 0 = pas de plafond
+
+    # Assemblage du contexte : fusion des chunks qui se chevauchent, quasi-doublons retirés, budget de tokens
+    CONTEXT_BUILDER_ENABLED: bool = os.getenv("CONTEXT_BUILDER_ENABLED", "true").lower() == "true"
+    CONTEXT_MAX_TOKENS: int = int(os.getenv("CONTEXT_MAX_TOKENS", "6000"))  # Plafond, quelle que soit la fenêtre du modèle
+    CONTEXT_ANSWER_RESERVE_TOKENS: int = int(os.getenv("CONTEXT_ANSWER_RESERVE_TOKENS", "4096"))  # Si max_tokens n'est pas fourni
+    CONTEXT_PROMPT_RESERVE_TOKENS: int = int(os.getenv("CONTEXT_PROMPT_RESERVE_TOKENS", "1000"))  # Instructions + question
+    CONTEXT_DEDUP_THRESHOLD: float = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))  # Jaccard des shingles de mots
+    CONTEXT_MIN_OVERLAP_CHARS: int = int(os.getenv("CONTEXT_MIN_OVERLAP_CHARS", "40"))
+
+    # Embedding cache
+    # Cache disque des embeddings : reconstructions d'index sans appel API une fois rempli
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_QUERIES: bool = os.getenv("EMBEDDING_CACHE_QUERIES", "false").lower() == "true"  # Questions aussi
+
+    # Semantic answer cache
+    # Désactivé par défaut : une réponse est réutilisée sur la seule similarité des questions
+    # (mêmes nombres, codes et sigles exigés, voir RAG/semantic_cache.py)
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))  # Cosine similarity
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+    SEMANTIC_CACHE_TTL_SECONDS: int = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))  # 0 = no expiry
+    # Requêtes identiques simultanées : une seule exécution du pipeline partagée
+    REQUEST_COALESCING_ENABLED: bool = os.getenv("REQUEST_COALESCING_ENABLED", "true").lower() == "true"
     LLM_MODEL: str = os.getenv("LLM_MODEL", "gpt-4o")
+    EVALUATION_WORKERS: int = int(os.getenv("EVALUATION_WORKERS", "8"))  # Évaluations de sources exécutées en parallèle
+    
+    # Pools de connexions HTTP partagés par les clients LLM (une paire par base URL)
+    LLM_HTTP_MAX_CONNECTIONS: int = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+    LLM_HTTP_MAX_KEEPALIVE: int = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+    LLM_HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60"))
+    LLM_HTTP_TIMEOUT: float = float(os.getenv("LLM_HTTP_TIMEOUT", "600"))
+    
+    # Contrôle d'admission des endpoints de chat (requêtes simultanées, file d'attente bornée)
+    ADMISSION_CONTROL_ENABLED: bool = os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() == "true"
+    CHAT_MAX_CONCURRENT: int = int(os.getenv("CHAT_MAX_CONCURRENT", "8"))
+    CHAT_MAX_QUEUE: int = int(os.getenv("CHAT_MAX_QUEUE", "8"))
+    CHAT_QUEUE_TIMEOUT: float = float(os.getenv("CHAT_QUEUE_TIMEOUT", "10"))  # Secondes d'attente max avant 503
+    STREAM_MAX_CONCURRENT: int = int(os.getenv("STREAM_MAX_CONCURRENT", "8"))
+    STREAM_MAX_QUEUE: int = int(os.getenv("STREAM_MAX_QUEUE", "8"))
+    STREAM_QUEUE_TIMEOUT: float = float(os.getenv("STREAM_QUEUE_TIMEOUT", "10"))
     
     # OpenRouter Headers
     SITE_URL: str = os.getenv("YOUR_SITE_URL", "http://localhost:3000")
@@ -66,62 +158,72 @@ class Config:
     RERANKER_MODEL: str = "rerank-v3.5"
     
     # Modèles disponibles
-    AVAILABLE_MODELS: Dict[str, Dict[str, str]] = {
+    # `context_window` : taille de la fenêtre de contexte en tokens (budget du contexte RAG, voir RAG/context.py)
+    AVAILABLE_MODELS: Dict[str, Dict[str, Any]] = {
         # OpenAI models
         "gpt-4o": {
             "name": "GPT-4o",
             "provider": "openai",
-            "description": "Modèle le plus avancé d'OpenAI, équilibrant performance et coût"
+            "description": "Modèle le plus avancé d'OpenAI, équilibrant performance et coût",
+            "context_window": 128000
         },
         "gpt-4-turbo": {
             "name": "GPT-4 Turbo",
             "provider": "openai",
-            "description": "Version optimisée du GPT-4, plus rapide que l'original"
+            "description": "Version optimisée du GPT-4, plus rapide que l'original",
+            "context_window": 128000
         },
         
         # Anthropic models
         "anthropic/claude-3.7-sonnet": {
             "name": "Claude 3.7 Sonnet",
             "provider": "anthropic",
-            "description": "Modèle intermédiaire d'Anthropic, équilibrant performance et coût"
+            "description": "Modèle intermédiaire d'Anthropic, équilibrant performance et coût",
+            "context_window": 200000
         },
         
         # Mistral models
         "mistralai/ministral-8b": {
             "name": "Mistral 8B",
             "provider": "mistralai",
-            "description": "Modèle Mistral compact et rapide (Ministral 8B)"
+            "description": "Modèle Mistral compact et rapide (Ministral 8B)",
+            "context_window": 128000
         },
         
         # Google models - Identifiants corrects pour OpenRouter
         "google/gemini-2.0-flash-lite-001": {
             "name": "Gemini 2.0 Flash Lite",
             "provider": "google",
-            "description": "Version économique du modèle Gemini 2.0 Flash"
+            "description": "Version économique du modèle Gemini 2.0 Flash",
+            "context_window": 1048576
         },
         
         # xAI models
         "x-ai/grok-3-mini-beta": {
             "name": "grok-3-mini-beta",
             "provider": "xai",
-            "description": "Le premier modèle de xAI (Elon Musk), via OpenRouter"
+            "description": "Le premier modèle de xAI (Elon Musk), via OpenRouter",
+            "context_window": 131072
         },
         
         # Nouveaux modèles OpenRouter
         "gpt-4.1": {
             "name": "GPT-4.1",
             "provider": "openai",
-            "description": "Modèle GPT-4.1 d'OpenAI avec capacités Vision"
+            "description": "Modèle GPT-4.1 d'OpenAI avec capacités Vision",
+            "context_window": 1047576
         },
         "deepseek/deepseek-r1:free": {
             "name": "Deepseek R1",
             "provider": "deepseek",
-            "description": "Modèle performant de Deepseek avec version gratuite"
+            "description": "Modèle performant de Deepseek avec version gratuite",
+            "context_window": 163840
         },
         "qwen/qwen-2.5-7b-instruct": {
             "name": "Qwen 2.5 7B",
             "provider": "qwen",
-            "description": "Modèle économique de Qwen, bonne performance pour son coût"
+            "description": "Modèle économique de Qwen, bonne performance pour son coût",
+            "context_window": 32768
         }
     }
     
@@ -143,8 +245,8 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 def validate_environment() -> None:
     """Validate required environment variables and exit if critical ones are missing."""
     # OpenAI API key est requis si Chroma est utilisé (pour les embeddings), ou pour les appels LLM directs
-    if Config.BDD_PROVIDER == "Chroma" and not Config.OPENAI_API_KEY:
-        logging.critical("CRITICAL: OPENAI_API_KEY not found in .env file (required for Chroma embeddings). Exiting.")
+    if Config.BDD_PROVIDER in ("Chroma", "Local") and not Config.OPENAI_API_KEY:
+        logging.critical(f"CRITICAL: OPENAI_API_KEY not found in .env file (required for {Config.BDD_PROVIDER} embeddings). Exiting.")
         exit(1)
     elif not Config.OPENAI_API_KEY and not Config.OPENROUTER_API_KEY:
         # Si ni OpenAI ni OpenRouter n'est configuré pour le LLM, c'est un problème aussi
@@ -179,6 +281,9 @@ def validate_environment() -> None:
         if not Config.VECTORSTORE_DIR.exists():
             logging.error(f"Répertoire Vectorstore Chroma non trouvé à {Config.VECTORSTORE_DIR}")
             logging.warning(f"AVERTISSEMENT: Répertoire Vectorstore Chroma non trouvé à {Config.VECTORSTORE_DIR}. L'initialisation de Chroma pourrait échouer.")
+    elif Config.BDD_PROVIDER == "Local":
+        if not ((Config.LOCAL_INDEX_DIR / "CURRENT").exists() or (Config.LOCAL_INDEX_DIR / "manifest.json").exists()):
+            logging.warning(f"AVERTISSEMENT: Index vectoriel local non trouvé à {Config.LOCAL_INDEX_DIR}. Lancez scripts/preprocessing/create_vectorstore.py.")
 
 # Run validation during import
 validate_environment() 
\ No newline at end of file
@@ -0,0 +1,3 @@
+"""
+Offline benchmarks of the RAG query path (stub providers, no network calls)
+"""
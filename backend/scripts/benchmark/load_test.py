@@ -0,0 +1,334 @@
+"""
+Test de charge de l'API HTTP par rejeu des sessions journalisées.
+
+Les questions et les flags sont lus dans `logs/rag_session_*.jsonl(.gz)` (ainsi que
+les anciens `rag_session_*.json`), puis envoyés à `/api/chat` et `/api/chat/stream`
+selon un processus d'arrivées de Poisson en boucle ouverte : le rythme d'envoi ne
+dépend pas des temps de réponse du serveur. La latence est mesurée depuis l'instant
+d'envoi prévu, pour que la saturation côté client apparaisse dans les résultats.
+
+Usage:
+    # Contre un serveur déjà lancé
+    python scripts/benchmark/load_test.py --url http://localhost:5000 --rate 2 --duration 120
+
+    # Contre l'API Flask avec fournisseurs simulés (lance stub_server.py)
+    python scripts/benchmark/load_test.py --serve-stub --rate 10 --duration 60 --stream-ratio 0.8
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+
+APP_ROOT_DIR = Path(__file__).resolve().parent.parent.parent  # scripts/benchmark/ -> backend/
+sys.path.insert(0, str(APP_ROOT_DIR))
+
+# Flags journalisés qui correspondent à des champs du corps de /api/chat
+REQUEST_FIELDS = (
+    "use_reranker", "use_multi_query", "use_hybrid", "use_mmr", "evaluate_sources", "model", "temperature", "top_p", "top_k",
+    "frequency_penalty", "presence_penalty", "repetition_penalty", "seed", "max_tokens", "k", "rerank_k",
+)
+
+
+def _read_log_file(path: Path) -> Iterator[Dict[str, Any]]:
+    if path.suffix == ".json":
+        # Ancien format : un document JSON {"session_id": ..., "interactions": [...]}
+        with open(path, encoding="utf-8") as f:
+            yield from json.load(f).get("interactions", [])
+        return
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Dernière ligne tronquée d'un fichier en cours d'écriture
+
+
+def load_interactions(logs_dir: Path, pattern: str) -> List[Dict[str, Any]]:
+    """Construit les corps de requête à rejouer (les interactions en erreur sont ignorées)."""
+    payloads = []
+    for path in sorted(logs_dir.glob(pattern)):
+        try:
+            for interaction in _read_log_file(path):
+                question = interaction.get("question")
+                if not question or interaction.get("error"):
+                    continue
+                flags = interaction.get("flags_used") or {}
+                payload = {field: flags[field] for field in REQUEST_FIELDS if flags.get(field) is not None}
+                payload["question"] = question
+                payloads.append(payload)
+        except (OSError, ValueError) as e:
+            print(f"Fichier ignoré {path}: {e}")
+    return payloads
+
+
+def _parse_sse_event(lines: List[str]) -> Dict[str, Any]:
+    event, data = "message", []
+    for line in lines:
+        if line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[6:] if line.startswith("data: ") else line[5:])
+    return {"event": event, "data": "\n".join(data)}
+
+
+async def send_chat(client: httpx.AsyncClient, payload: Dict[str, Any]) -> Dict[str, Any]:
+    response = await client.post("/api/chat", json=payload)
+    result: Dict[str, Any] = {"status": response.status_code, "ttft": None}
+    if response.status_code != 200:
+        result["error"] = f"HTTP {response.status_code}"
+    else:
+        body = response.json()
+        if body.get("error"):
+            result["error"] = "pipeline error"
+        result["cache_hit"] = bool((body.get("cache") or {}).get("hit"))
+    return result
+
+
+async def send_stream(client: httpx.AsyncClient, payload: Dict[str, Any], start: float) -> Dict[str, Any]:
+    result: Dict[str, Any] = {"ttft": None}
+    async with client.stream("POST", "/api/chat/stream", json=payload) as response:
+        result["status"] = response.status_code
+        if response.status_code != 200:
+            await response.aread()
+            result["error"] = f"HTTP {response.status_code}"
+            return result
+        pending: List[str] = []
+        done = False
+        async for line in response.aiter_lines():
+            if line:
+                pending.append(line)
+                continue
+            if not pending:
+                continue
+            event = _parse_sse_event(pending)
+            pending = []
+            if event["event"] == "done":
+                done = True
+                break
+            if event["event"] == "error":
+                result["error"] = "stream error"
+                break
+            data = event["data"]
+            if data.startswith("{"):
+                # Évaluation des sources ou métadonnées finales
+                try:
+                    metadata = json.loads(data)
+                    if "cache" in metadata:
+                        result["cache_hit"] = bool((metadata.get("cache") or {}).get("hit"))
+                    continue
+                except json.JSONDecodeError:
+                    pass
+            if result["ttft"] is None:
+                result["ttft"] = time.perf_counter() - start
+        if not done and "error" not in result:
+            result["error"] = "stream truncated"
+    return result
+
+
+async def run_request(
+    client: httpx.AsyncClient, semaphore: asyncio.Semaphore, payload: Dict[str, Any], stream: bool, scheduled: float
+) -> Dict[str, Any]:
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            if stream:
+                result = await send_stream(client, payload, scheduled)
+            else:
+                result = await send_chat(client, payload)
+        except httpx.HTTPError as e:
+            result = {"status": None, "ttft": None, "error": type(e).__name__}
+    result["endpoint"] = "stream" if stream else "chat"
+    result["client_queue_s"] = started - scheduled
+    result["latency"] = time.perf_counter() - scheduled
+    return result
+
+
+async def run_load(payloads: List[Dict[str, Any]], args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    if args.shuffle:
+        rng.shuffle(payloads)
+    total = args.requests or int(args.rate * args.duration)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout, connect=10.0)
+
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout) as client:
+        tasks = []
+        start = time.perf_counter()
+        next_arrival = start
+        for i in range(total):
+            # Boucle ouverte : les arrivées suivent le planning, quel que soit l'état du serveur
+            next_arrival += rng.expovariate(args.rate)
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            payload = dict(payloads[i % len(payloads)])
+            if args.no_cache:
+                payload["use_cache"] = False
+            stream = rng.random() < args.stream_ratio
+            tasks.append(asyncio.create_task(run_request(client, semaphore, payload, stream, next_arrival)))
+            if args.progress and (i + 1) % args.progress == 0:
+                print(f"  {i + 1}/{total} requêtes envoyées", flush=True)
+        results = await asyncio.gather(*tasks)
+        wall = time.perf_counter() - start
+    return {"results": results, "wall_s": wall, "offered_rate": args.rate, "sent": total}
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(results: List[Dict[str, Any]], wall: float) -> Dict[str, Any]:
+    ok = [r for r in results if "error" not in r]
+    latencies = [r["latency"] for r in ok]
+    ttfts = [r["ttft"] for r in ok if r["ttft"] is not None]
+    rejected = [r for r in results if r.get("status") in (429, 503)]
+    return {
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "error_rate": (len(results) - len(ok)) / len(results) if results else 0.0,
+        "rejected_429_503": len(rejected),
+        "errors_by_kind": dict(Counter(r["error"] for r in results if "error" in r)),
+        "cache_hits": sum(1 for r in ok if r.get("cache_hit")),
+        "goodput_rps": len(ok) / wall if wall > 0 else 0.0,
+        "latency_mean_s": statistics.fmean(latencies) if latencies else None,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p95_s": percentile(latencies, 95),
+        "latency_p99_s": percentile(latencies, 99),
+        "latency_max_s": max(latencies) if latencies else None,
+        "ttft_p50_s": percentile(ttfts, 50),
+        "ttft_p95_s": percentile(ttfts, 95),
+        "ttft_p99_s": percentile(ttfts, 99),
+        "client_queue_p95_s": percentile([r["client_queue_s"] for r in results], 95),
+    }
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.0f}"
+
+
+def print_report(summaries: Dict[str, Dict[str, Any]], run: Dict[str, Any]) -> None:
+    print(f"\n{run['sent']} requêtes envoyées à {run['offered_rate']:.2f} req/s (offert) en {run['wall_s']:.1f} s")
+    header = f"{'endpoint':<8} {'req':>6} {'ok':>6} {'err %':>6} {'429/503':>7} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttft50':>7} {'ttft95':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, s in summaries.items():
+        print(
+            f"{name:<8} {s['requests']:>6} {s['ok']:>6} {s['error_rate'] * 100:>6.1f} {s['rejected_429_503']:>7} "
+            f"{s['goodput_rps']:>7.2f} {_fmt(s['latency_p50_s']):>8} {_fmt(s['latency_p95_s']):>8} "
+            f"{_fmt(s['latency_p99_s']):>8} {_fmt(s['ttft_p50_s']):>7} {_fmt(s['ttft_p95_s']):>7}"
+        )
+        if s["errors_by_kind"]:
+            print(f"         erreurs: {s['errors_by_kind']}")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stub_server(args: argparse.Namespace) -> subprocess.Popen:
+    """Lance stub_server.py dans un sous-processus et attend qu'il réponde."""
+    port = _free_port()
+    command = [
+        sys.executable, str(Path(__file__).with_name("stub_server.py")), "--port", str(port),
+        "--threads", str(args.stub_threads), *args.stub_args,
+    ]
+    print(f"Démarrage du serveur simulé: {' '.join(command)}")
+    process = subprocess.Popen(command, cwd=APP_ROOT_DIR)
+    args.url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Le serveur simulé s'est arrêté (code {process.returncode})")
+        try:
+            if httpx.get(f"{args.url}/api/models", timeout=1.0).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("Le serveur simulé n'a pas démarré à temps")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Rejeu des sessions journalisées contre l'API de chat.")
+    parser.add_argument("--url", default="http://localhost:5000", help="URL de base de l'API")
+    parser.add_argument("--logs-dir", type=Path, default=APP_ROOT_DIR / "logs")
+    parser.add_argument("--pattern", default="rag_session_*.json*", help="Fichiers de session à rejouer")
+    parser.add_argument("--rate", type=float, default=2.0, help="Taux d'arrivée moyen (req/s, Poisson)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Durée d'envoi (s) si --requests n'est pas fourni")
+    parser.add_argument("--requests", type=int, help="Nombre total de requêtes à envoyer")
+    parser.add_argument("--concurrency", type=int, default=64, help="Requêtes simultanées maximum côté client")
+    parser.add_argument("--stream-ratio", type=float, default=0.5, help="Part des requêtes envoyées à /api/chat/stream")
+    parser.add_argument("--timeout", type=float, default=180.0, help="Timeout de lecture par requête (s)")
+    parser.add_argument("--no-cache", action="store_true", help="Envoyer use_cache=false (pas de hit du cache sémantique)")
+    parser.add_argument("--shuffle", action="store_true", help="Mélanger l'ordre des interactions")
+    parser.add_argument("--seed", type=int, default=1, help="Graine des arrivées et du choix d'endpoint")
+    parser.add_argument("--progress", type=int, default=0, help="Afficher l'avancement toutes les N requêtes")
+    parser.add_argument("--serve-stub", action="store_true", help="Lancer l'API Flask avec fournisseurs simulés")
+    parser.add_argument("--stub-threads", type=int, default=32, help="Threads waitress du serveur simulé")
+    parser.add_argument("--stub-args", nargs=argparse.REMAINDER, default=[],
+                        help="Options transmises à stub_server.py (ex. --stub-args --llm-latency 0.8)")
+    parser.add_argument("--json", type=Path, help="Écrire le résumé et les mesures par requête dans ce fichier")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    payloads = load_interactions(args.logs_dir, args.pattern)
+    if not payloads:
+        if not args.serve_stub:
+            print(f"Aucune interaction trouvée dans {args.logs_dir}/{args.pattern}")
+            return 1
+        # Pas de logs disponibles : questions synthétiques alignées sur le corpus simulé
+        from scripts.benchmark.stubs import build_questions
+        payloads = [{"question": q} for q in build_questions(200)]
+    print(f"{len(payloads)} interactions chargées")
+
+    server = start_stub_server(args) if args.serve_stub else None
+    try:
+        run = asyncio.run(run_load(payloads, args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    results = run["results"]
+    summaries = {
+        "all": summarize(results, run["wall_s"]),
+        "chat": summarize([r for r in results if r["endpoint"] == "chat"], run["wall_s"]),
+        "stream": summarize([r for r in results if r["endpoint"] == "stream"], run["wall_s"]),
+    }
+    print_report(summaries, run)
+
+    if args.json:
+        report = {"url": args.url, "offered_rate": args.rate, "wall_s": run["wall_s"], "summary": summaries, "requests": results}
+        args.json.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\nRésultats écrits dans {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
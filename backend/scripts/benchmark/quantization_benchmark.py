@@ -0,0 +1,233 @@
+"""
+Recall@k et latence de l'index vectoriel local quantifié (`RAG/local_index.py`).
+
+Pour chaque mode (float32, float16, int8, binaire, avec ou sans reclassement en pleine
+précision) et pour Chroma (HNSW) lorsque chromadb est installé, on mesure sur les mêmes vecteurs :
+    - recall@k par rapport à la recherche exacte en float32 ;
+    - la latence de recherche par requête (p50 / p95 / p99, embedding de la question exclu) ;
+    - la taille des données parcourues à chaque requête, et celle de l'index sur disque.
+
+Les requêtes sont des chunks du corpus tirés au hasard (leave-one-out : le chunk
+lui-même est retiré des résultats), l'embedding des questions n'est donc pas nécessaire.
+
+Sources des vecteurs :
+    --source chroma      vecteurs et documents du vectorstore Chroma existant (data/vectorstore) ;
+                         corpus synthétique si chromadb n'est pas installé
+    --source synthetic   corpus synthétique de `stubs.py` (embeddings par hachage, hors-ligne)
+    --no-chroma          sans la comparaison avec Chroma (HNSW)
+
+Usage:
+    python scripts/benchmark/quantization_benchmark.py
+    python scripts/benchmark/quantization_benchmark.py --source synthetic --docs 5000 --dimensions 1536
+    python scripts/benchmark/quantization_benchmark.py --k 4 20 --rescore-factors 2 4 8 --json quant.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+APP_ROOT_DIR = Path(__file__).resolve().parent.parent.parent  # scripts/benchmark/ -> backend/
+sys.path.insert(0, str(APP_ROOT_DIR))
+
+# config.py refuse de démarrer sans clé OpenAI ; elle n'est jamais utilisée ici
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark-offline")
+
+from config import Config
+from RAG.local_index import LocalVectorIndex, write_local_index
+from scripts.benchmark.stubs import HashEmbeddings, build_corpus
+from scripts.benchmark.rag_benchmark import percentile
+
+SearchFn = Callable[[np.ndarray, int], np.ndarray]
+
+
+def chromadb_available() -> bool:
+    try:
+        import chromadb  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def load_chroma_corpus() -> Tuple[np.ndarray, List[str], List[dict], Any]:
+    """Vecteurs, textes et métadonnées du vectorstore Chroma persistant, et sa collection."""
+    from langchain_community.vectorstores import Chroma
+
+    if not Config.VECTORSTORE_DIR.exists():
+        raise SystemExit(f"Vectorstore Chroma introuvable: {Config.VECTORSTORE_DIR}")
+    collection = Chroma(persist_directory=str(Config.VECTORSTORE_DIR))._collection
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    vectors = np.asarray(data["embeddings"], dtype=np.float32)
+    if not len(vectors):
+        raise SystemExit(f"Le vectorstore Chroma {Config.VECTORSTORE_DIR} est vide")
+    collection.benchmark_ids = {chroma_id: i for i, chroma_id in enumerate(data["ids"])}
+    return vectors, data["documents"], [m or {} for m in data["metadatas"]], collection
+
+
+def build_synthetic_corpus(n_docs: int, dimensions: int, with_chroma: bool = True) -> Tuple[np.ndarray, List[str], List[dict], Any]:
+    """Corpus synthétique ; une collection Chroma éphémère est créée si demandé (chromadb requis)."""
+    texts, metadatas = build_corpus(n_docs)
+    vectors = np.asarray(HashEmbeddings(dimensions=dimensions).embed_documents(texts), dtype=np.float32)
+    if not with_chroma:
+        return vectors, texts, metadatas, None
+    import chromadb
+    collection = chromadb.EphemeralClient().create_collection(
+        f"quantization_benchmark_{os.getpid()}", metadata={"hnsw:space": "cosine"},
+    )
+    ids = [str(i) for i in range(len(texts))]
+    for start in range(0, len(ids), 5000):
+        collection.add(
+            ids=ids[start:start + 5000],
+            embeddings=vectors[start:start + 5000].tolist(),
+            documents=texts[start:start + 5000],
+        )
+    collection.benchmark_ids = {chroma_id: i for i, chroma_id in enumerate(ids)}
+    return vectors, texts, metadatas, collection
+
+
+def chroma_search(collection: Any) -> SearchFn:
+    def search(query: np.ndarray, k: int) -> np.ndarray:
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+        return np.array([collection.benchmark_ids[i] for i in result["ids"][0]], dtype=np.int64)
+    return search
+
+
+def local_search(index: LocalVectorIndex, **search_kwargs: Any) -> SearchFn:
+    def search(query: np.ndarray, k: int) -> np.ndarray:
+        return index.search_ids(query, k, **search_kwargs)[0]
+    return search
+
+
+def evaluate(name: str, search: SearchFn, queries: np.ndarray, query_ids: np.ndarray,
+             truth: List[np.ndarray], k_values: List[int], scanned_bytes: Optional[int]) -> Dict[str, Any]:
+    """Recall@k (leave-one-out) et latence de `search` sur toutes les requêtes."""
+    max_k = max(k_values)
+    latencies = []
+    recalls = {k: [] for k in k_values}
+    for query, query_id, expected in zip(queries, query_ids, truth):
+        start = time.perf_counter()
+        found = search(query, max_k + 1)
+        latencies.append(time.perf_counter() - start)
+        found = found[found != query_id][:max_k]
+        for k in k_values:
+            expected_k = set(expected[:k].tolist())
+            recalls[k].append(len(expected_k & set(found[:k].tolist())) / len(expected_k))
+    return {
+        "name": name,
+        "recall": {f"@{k}": statistics.fmean(recalls[k]) for k in k_values},
+        "latency_ms": {
+            "p50": percentile(latencies, 50) * 1000,
+            "p95": percentile(latencies, 95) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "mean": statistics.fmean(latencies) * 1000,
+        },
+        "scanned_mb": scanned_bytes / 1e6 if scanned_bytes is not None else None,
+    }
+
+
+def print_report(results: List[Dict[str, Any]], k_values: List[int]) -> None:
+    recall_headers = "".join(f"{'R@' + str(k):>8}" for k in k_values)
+    print(f"\n{'mode':<32}{recall_headers}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'scan MB':>9}")
+    print("-" * (32 + 8 * len(k_values) + 36))
+    for r in results:
+        recalls = "".join(f"{r['recall'][f'@{k}']:>8.3f}" for k in k_values)
+        lat = r["latency_ms"]
+        scanned = f"{r['scanned_mb']:>9.1f}" if r["scanned_mb"] is not None else f"{'-':>9}"
+        print(f"{r['name']:<32}{recalls}{lat['p50']:>9.3f}{lat['p95']:>9.3f}{lat['p99']:>9.3f}{scanned}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recall@k et latence de l'index local quantifié (vs float32 exact et Chroma).")
+    parser.add_argument("--source", choices=["chroma", "synthetic"], default="chroma")
+    parser.add_argument("--docs", type=int, default=5000, help="Taille du corpus synthétique")
+    parser.add_argument("--dimensions", type=int, default=1536, help="Dimension des embeddings synthétiques")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, nargs="+", default=[4, Config.DEFAULT_K])
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-chroma", dest="chroma", action="store_false", help="Ne pas comparer avec Chroma (HNSW)")
+    parser.add_argument("--json", type=Path, help="Écrit les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    if (args.source == "chroma" or args.chroma) and not chromadb_available():
+        print("chromadb non installé : corpus synthétique, comparaison avec Chroma ignorée")
+        args.source, args.chroma = "synthetic", False
+    if args.source == "chroma":
+        vectors, texts, metadatas, collection = load_chroma_corpus()
+        if not args.chroma:
+            collection = None
+    else:
+        vectors, texts, metadatas, collection = build_synthetic_corpus(args.docs, args.dimensions, with_chroma=args.chroma)
+    n, dim = vectors.shape
+    print(f"{n} vecteurs de dimension {dim} ({args.source})")
+
+    rng = np.random.default_rng(args.seed)
+    query_ids = rng.choice(n, size=min(args.queries, n), replace=False)
+    queries = vectors[query_ids]
+    k_values = sorted(set(min(k, n - 1) for k in args.k))
+    max_k = max(k_values)
+
+    work_dir = Path(tempfile.mkdtemp(prefix="quantization_benchmark_"))
+    embedding = HashEmbeddings(dimensions=dim)
+    indexes: Dict[str, LocalVectorIndex] = {}
+    variants = (
+        ("float32", "float32", "none", None),
+        ("float16", "float16", "none", None),
+        ("int8", "float32", "int8", False),  # codes seuls
+        ("int8 + vecteurs", "float32", "int8", True),  # vectors.npy conservé pour le reclassement
+        ("binary", "float32", "binary", True),
+    )
+    for name, dtype, quantization, rescore in variants:
+        write_local_index(work_dir / name, vectors, texts, metadatas, dtype=dtype, quantization=quantization, rescore=rescore)
+        indexes[name] = LocalVectorIndex(work_dir / name, embedding, check_embedding_model=False)
+
+    # Vérité terrain : recherche exacte float32, leave-one-out
+    exact = indexes["float32"]
+    truth = []
+    for query, query_id in zip(queries, query_ids):
+        found = exact.search_ids(query, max_k + 1)[0]
+        truth.append(found[found != query_id][:max_k])
+
+    float32_bytes = n * dim * 4
+    results = [
+        evaluate("float32 (exact)", local_search(exact), queries, query_ids, truth, k_values, float32_bytes),
+        # float16 : reconverti en float32 au chargement, seule la taille sur disque est réduite
+        evaluate("float16", local_search(indexes["float16"]), queries, query_ids, truth, k_values, float32_bytes),
+    ]
+    for quantization, name in (("int8", "int8 + vecteurs"), ("binary", "binary")):
+        index = indexes[name]
+        codes_bytes = index._codes.nbytes
+        results.append(evaluate(f"{quantization} (sans reclassement)", local_search(indexes[quantization], rescore=False),
+                                queries, query_ids, truth, k_values, codes_bytes))
+        for factor in args.rescore_factors:
+            index.rescore_factor = factor
+            # Candidats reclassés : (k + 1) × facteur lignes float32 lues depuis le disque
+            rescored_bytes = codes_bytes + (max_k + 1) * factor * dim * 4
+            results.append(evaluate(f"{quantization} + reclassement x{factor}", local_search(index),
+                                    queries, query_ids, truth, k_values, rescored_bytes))
+    if collection is not None:
+        results.append(evaluate("chroma (HNSW)", chroma_search(collection), queries, query_ids, truth, k_values, None))
+
+    print_report(results, k_values)
+    sizes = {name: sum(f.stat().st_size for f in (work_dir / name).rglob("*") if f.is_file()) for name in indexes}
+    shutil.rmtree(work_dir, ignore_errors=True)
+    print("\nTaille sur disque : " + ", ".join(f"{name} {size / 1e6:.1f} MB" for name, size in sizes.items()))
+
+    if args.json:
+        args.json.write_text(json.dumps({
+            "source": args.source, "vectors": n, "dimensions": dim, "queries": len(query_ids),
+            "disk_mb": {name: size / 1e6 for name, size in sizes.items()}, "results": results,
+        }, indent=2), encoding="utf-8")
+        print(f"Résultats écrits dans {args.json}")
+
+
+if __name__ == "__main__":
+    main()
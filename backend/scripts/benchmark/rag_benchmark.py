@@ -0,0 +1,283 @@
+"""
+Benchmark hors-ligne du chemin de requête d'AdvancedRAG.
+
+Embeddings, LLM, reranker et vectorstore sont remplacés par les stubs de `stubs.py` :
+aucun appel aux fournisseurs, aucun coût, résultats reproductibles. Seul l'encodeur
+tiktoken est téléchargé, avant les mesures, s'il n'est pas déjà en cache ; hors ligne,
+les tokens sont estimés (~4 caractères par token). Chaque scénario (mode answer/stream
+× reranker × multi-query × hybride × MMR × évaluation des sources × k) est exécuté
+avec un pool de threads et on mesure débit, percentiles de latence, time-to-first-token
+et allocations mémoire (tracemalloc).
+
+Usage:
+    python scripts/benchmark/rag_benchmark.py
+    python scripts/benchmark/rag_benchmark.py --quick --requests 20 --concurrency 4
+    python scripts/benchmark/rag_benchmark.py --json bench_before.json
+    python scripts/benchmark/rag_benchmark.py --baseline bench_before.json --threshold 0.1
+"""
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+APP_ROOT_DIR = Path(__file__).resolve().parent.parent.parent  # scripts/benchmark/ -> backend/
+sys.path.insert(0, str(APP_ROOT_DIR))
+
+# config.py refuse de démarrer sans clé OpenAI ; elle n'est jamais utilisée ici
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark-offline")
+
+from langchain.retrievers.multi_query import MultiQueryRetriever
+from langchain_core.documents import Document
+
+from config import Config
+from RAG.lexical import BM25Index
+from RAG.llm import get_token_encoding, register_llm_client, clear_llm_clients
+from RAG.rag_core import AdvancedRAG
+from RAG.retrieval import HybridRetriever
+from scripts.benchmark.stubs import (
+    FakeChatModel, HashEmbeddings, InMemoryVectorStore, KeywordReranker, build_corpus, build_questions,
+)
+
+
+def build_rag(args: argparse.Namespace) -> AdvancedRAG:
+    """Construit un AdvancedRAG dont tous les fournisseurs externes sont des stubs."""
+    Config.SEMANTIC_CACHE_ENABLED = args.cache
+    Config.REQUEST_COALESCING_ENABLED = args.coalescing
+    # Les journaux de session du benchmark ne doivent pas se mélanger aux vrais logs
+    Config.LOG_FILE = Path(tempfile.mkdtemp(prefix="rag_benchmark_")) / "rag_session_benchmark.jsonl"
+
+    embeddings = HashEmbeddings(dimensions=args.dimensions, latency_s=args.embedding_latency)
+    texts, metadatas = build_corpus(args.docs)
+    vectorstore = InMemoryVectorStore.from_texts(texts, embeddings, metadatas, latency_s=args.search_latency)
+
+    llm = FakeChatModel(
+        model=Config.DEFAULT_MODEL,
+        latency_s=args.llm_latency,
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+    )
+    clear_llm_clients()
+    # Chargé ici pour que l'éventuel téléchargement (ou son échec hors ligne) ne soit pas mesuré
+    get_token_encoding(Config.DEFAULT_MODEL)
+    register_llm_client(Config.DEFAULT_MODEL, llm)
+    register_llm_client(Config.DEFAULT_MODEL, llm, streaming=True)
+
+    bm25_index = BM25Index([Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas)])
+    retrievers = {
+        "multi_query": MultiQueryRetriever.from_llm(retriever=vectorstore.as_retriever(), llm=llm),
+        "hybrid": HybridRetriever(vectorstore=vectorstore, bm25_index=bm25_index),
+    }
+    return AdvancedRAG(
+        embeddings=embeddings,
+        vectorstore=vectorstore,
+        retrievers=retrievers,
+        reranker_compressor=KeywordReranker(latency_s=args.rerank_latency),
+    )
+
+
+def build_scenarios(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    if args.quick:
+        combos = [
+            (False, False, False, False, False), (True, False, False, False, False), (False, True, False, False, False),
+            (False, False, True, False, False), (False, False, False, True, False), (False, False, False, False, True),
+        ]
+        k_values = [Config.DEFAULT_K]
+    else:
+        combos = [
+            (reranker, multi_query, hybrid, mmr, evaluate)
+            for reranker, multi_query, hybrid, mmr, evaluate in itertools.product((False, True), repeat=5)
+            # Le reranker est prioritaire sur le multi-query dans retrieve_documents
+            if not (reranker and multi_query)
+        ]
+        k_values = args.k
+    scenarios = []
+    for mode, (reranker, multi_query, hybrid, mmr, evaluate), k in itertools.product(args.modes, combos, k_values):
+        scenarios.append({
+            "name": f"{mode}|rerank={int(reranker)}|mq={int(multi_query)}|hyb={int(hybrid)}|mmr={int(mmr)}|eval={int(evaluate)}|k={k}",
+            "mode": mode,
+            "flags": {
+                "use_reranker": reranker, "use_multi_query": multi_query, "use_hybrid": hybrid, "use_mmr": mmr,
+                "evaluate_sources": evaluate, "k": k,
+            },
+        })
+    return scenarios
+
+
+def run_request(rag: AdvancedRAG, mode: str, question: str, flags: Dict[str, Any]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    ttft = None
+    try:
+        if mode == "stream":
+            for chunk in rag.answer_question_stream(question, **flags):
+                # Les chunks JSON (évaluation, métadonnées) ne comptent pas comme premier token
+                if ttft is None and not chunk.startswith("{"):
+                    ttft = time.perf_counter() - start
+        else:
+            result = rag.answer_question(question, **flags)
+            if result.get("error"):
+                raise RuntimeError(result["error"])
+    except Exception as e:
+        return {"latency": time.perf_counter() - start, "ttft": ttft, "error": str(e)}
+    return {"latency": time.perf_counter() - start, "ttft": ttft, "error": None}
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def run_scenario(rag: AdvancedRAG, scenario: Dict[str, Any], questions: List[str], args: argparse.Namespace) -> Dict[str, Any]:
+    mode, flags = scenario["mode"], scenario["flags"]
+    for i in range(args.warmup):
+        run_request(rag, mode, f"warmup {i} {questions[i % len(questions)]}", flags)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+        baseline_bytes, _ = tracemalloc.get_traced_memory()
+
+    batch = [questions[i % len(questions)] for i in range(args.requests)]
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda q: run_request(rag, mode, q, flags), batch))
+    wall = time.perf_counter() - wall_start
+
+    summary: Dict[str, Any] = {}
+    if args.tracemalloc:
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        summary["peak_alloc_kib"] = (peak_bytes - baseline_bytes) / 1024
+        summary["retained_kib"] = (current_bytes - baseline_bytes) / 1024
+        summary["alloc_per_request_kib"] = summary["peak_alloc_kib"] / max(1, args.concurrency)
+
+    latencies = [r["latency"] for r in results if r["error"] is None]
+    ttfts = [r["ttft"] for r in results if r["error"] is None and r["ttft"] is not None]
+    errors = [r["error"] for r in results if r["error"] is not None]
+    summary.update({
+        "requests": len(results),
+        "errors": len(errors),
+        "throughput_rps": len(latencies) / wall if wall > 0 else 0.0,
+        "latency_mean_s": statistics.fmean(latencies) if latencies else None,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p95_s": percentile(latencies, 95),
+        "latency_p99_s": percentile(latencies, 99),
+        "ttft_p50_s": percentile(ttfts, 50),
+        "ttft_p95_s": percentile(ttfts, 95),
+    })
+    if errors:
+        summary["first_error"] = errors[0]
+    return summary
+
+
+def _fmt(value: Optional[float], scale: float = 1000.0, digits: int = 0) -> str:
+    return "-" if value is None else f"{value * scale:.{digits}f}"
+
+
+def print_report(results: Dict[str, Dict[str, Any]]) -> None:
+    header = f"{'scenario':<50} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttft50':>7} {'ttft95':>7} {'peak KiB':>9} {'err':>4}"
+    print(header)
+    print("-" * len(header))
+    for name, s in results.items():
+        print(
+            f"{name:<50} {s['throughput_rps']:>7.2f} {_fmt(s['latency_p50_s']):>8} {_fmt(s['latency_p95_s']):>8} "
+            f"{_fmt(s['latency_p99_s']):>8} {_fmt(s['ttft_p50_s']):>7} {_fmt(s['ttft_p95_s']):>7} "
+            f"{_fmt(s.get('peak_alloc_kib'), 1.0):>9} {s['errors']:>4}"
+        )
+        if s.get("first_error"):
+            print(f"    première erreur: {s['first_error']}")
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], threshold: float) -> List[str]:
+    """Retourne la liste des régressions (latence plus haute / débit plus bas au-delà du seuil)."""
+    regressions = []
+    print(f"\nComparaison avec la référence (seuil {threshold:.0%}):")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric, higher_is_worse in (("latency_p50_s", True), ("latency_p95_s", True), ("ttft_p50_s", True), ("throughput_rps", False)):
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            delta = (new - old) / old
+            worse = delta > threshold if higher_is_worse else delta < -threshold
+            marker = "  <-- régression" if worse else ""
+            print(f"  {name:<50} {metric:<15} {old:>10.4f} -> {new:>10.4f} ({delta:+.1%}){marker}")
+            if worse:
+                regressions.append(f"{name} {metric} {delta:+.1%}")
+    return regressions
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options des fournisseurs simulés (partagées avec `stub_server.py`)."""
+    parser.add_argument("--docs", type=int, default=2000, help="Taille du corpus synthétique")
+    parser.add_argument("--dimensions", type=int, default=256, help="Dimension des embeddings simulés")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Délai avant le premier token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--search-latency", type=float, default=0.02)
+    parser.add_argument("--rerank-latency", type=float, default=0.1)
+    parser.add_argument("--cache", action="store_true", help="Activer le cache sémantique (désactivé par défaut)")
+    parser.add_argument("--no-coalescing", dest="coalescing", action="store_false", help="Désactiver le regroupement des requêtes")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark hors-ligne d'AdvancedRAG (fournisseurs simulés).")
+    parser.add_argument("--requests", type=int, default=40, help="Requêtes mesurées par scénario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requêtes simultanées")
+    parser.add_argument("--warmup", type=int, default=2, help="Requêtes d'échauffement (non mesurées) par scénario")
+    parser.add_argument("--modes", nargs="+", choices=["answer", "stream"], default=["answer", "stream"])
+    parser.add_argument("--k", type=int, nargs="+", default=[5, Config.DEFAULT_K], help="Valeurs de k à tester")
+    parser.add_argument("--quick", action="store_true", help="Un scénario par option (k par défaut)")
+    add_stub_arguments(parser)
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false",
+                        help="Ne pas mesurer les allocations (tracemalloc ralentit l'exécution)")
+    parser.add_argument("--json", type=Path, help="Écrire les résultats dans ce fichier JSON")
+    parser.add_argument("--baseline", type=Path, help="Fichier JSON d'un run précédent à comparer")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Variation relative considérée comme régression")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    print("Initialisation du RAG avec les fournisseurs simulés...")
+    rag = build_rag(args)
+    questions = build_questions(max(args.requests, 50))
+    scenarios = build_scenarios(args)
+    print(f"{len(scenarios)} scénarios, {args.requests} requêtes chacun, concurrence {args.concurrency}\n")
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for scenario in scenarios:
+        print(f"-> {scenario['name']}", flush=True)
+        results[scenario["name"]] = run_scenario(rag, scenario, questions, args)
+    print()
+    print_report(results)
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\nRésultats écrits dans {args.json}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} régression(s) détectée(s).")
+            return 1
+        print("\nAucune régression détectée.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""
+Lance l'API Flask (`app.app`) avec les fournisseurs simulés de `stubs.py`.
+
+Sert de cible aux tests de charge (`load_test.py`) : toute la pile HTTP (waitress,
+contrôle d'admission, SSE, cache, regroupement) est réelle, seuls les appels
+OpenAI/Cohere/vectorstore sont remplacés.
+
+Usage:
+    python scripts/benchmark/stub_server.py --port 5001 --threads 32 --llm-latency 0.5
+"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+APP_ROOT_DIR = Path(__file__).resolve().parent.parent.parent  # scripts/benchmark/ -> backend/
+sys.path.insert(0, str(APP_ROOT_DIR))
+
+from scripts.benchmark.rag_benchmark import add_stub_arguments, build_rag
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="API Flask avec fournisseurs simulés (tests de charge).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--threads", type=int, default=32, help="Threads waitress (comme dans le Procfile)")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    stub_rag = build_rag(args)
+
+    # app.app instancie AdvancedRAG() à l'import : on lui fournit l'instance simulée
+    import RAG.rag_core
+    RAG.rag_core.AdvancedRAG = lambda: stub_rag
+    from app.app import app
+
+    from waitress import serve
+    logging.info(f"Stub API listening on http://{args.host}:{args.port} ({args.threads} threads)")
+    serve(app, host=args.host, port=args.port, threads=args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Composants factices et déterministes pour mesurer AdvancedRAG hors-ligne.
+
+Chaque stub remplace un fournisseur payant (OpenAI, Cohere, Pinecone/Chroma) en
+conservant l'interface utilisée par le code RAG, avec une latence configurable
+pour reproduire le profil temporel des vrais appels réseau.
+"""
+
+import asyncio
+import hashlib
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict, Iterable, Iterator, AsyncIterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.vectorstores import VectorStore
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _tokens(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def _stable_hash(text: str) -> int:
+    # hash() est salé par processus : blake2b garantit des résultats identiques d'un run à l'autre
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class HashEmbeddings(Embeddings):
+    """Embeddings « sac de mots haché » : des textes proches donnent des vecteurs proches."""
+
+    def __init__(self, dimensions: int = 256, latency_s: float = 0.0):
+        self.dimensions = dimensions
+        self.latency_s = latency_s
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in _tokens(text):
+            h = _stable_hash(token)
+            vector[h % self.dimensions] += 1.0 if (h >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm > 0 else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return self._embed(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        return self._embed(text)
+
+
+class FakeChatModel(BaseChatModel):
+    """Modèle de chat factice : délai avant le premier token puis débit de tokens constant.
+
+    La réponse est construite de façon déterministe à partir des mots du prompt. Pour le
+    prompt de MultiQueryRetriever, trois reformulations (une par ligne) sont renvoyées.
+    """
+
+    model: str = "gpt-4o"
+    latency_s: float = 0.3          # Délai avant le premier token
+    tokens_per_second: float = 80.0
+    answer_tokens: int = 120
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake-chat"
+
+    @property
+    def model_name(self) -> str:
+        # Lu par `get_model_name` (comptage des tokens et calcul du coût)
+        return self.model
+
+    def _response_tokens(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = " ".join(str(message.content) for message in messages)
+        words = _tokens(prompt) or ["réponse"]
+        rng = random.Random(_stable_hash(prompt))
+        if "different versions" in prompt:
+            question_words = _tokens(prompt.rsplit(":", 1)[-1]) or words
+            return [" ".join(rng.sample(question_words, len(question_words))) + "\n" for _ in range(3)]
+        return [rng.choice(words) + " " for _ in range(self.answer_tokens)]
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tokens = self._response_tokens(messages)
+        time.sleep(self.latency_s + len(tokens) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tokens = self._response_tokens(messages)
+        await asyncio.sleep(self.latency_s + len(tokens) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        tokens = self._response_tokens(messages)
+        time.sleep(self.latency_s)
+        for token in tokens:
+            time.sleep(1.0 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        tokens = self._response_tokens(messages)
+        await asyncio.sleep(self.latency_s)
+        for token in tokens:
+            await asyncio.sleep(1.0 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+class KeywordReranker:
+    """Remplace CohereRerank : score = proportion des mots de la question présents dans le document."""
+
+    def __init__(self, latency_s: float = 0.1):
+        self.latency_s = latency_s
+
+    def rerank(self, documents: List[Document], query: str, top_n: int = 3) -> List[Dict[str, Any]]:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        query_tokens = set(_tokens(query))
+        results = []
+        for index, doc in enumerate(documents):
+            doc_tokens = set(_tokens(doc.page_content))
+            score = len(query_tokens & doc_tokens) / len(query_tokens) if query_tokens else 0.0
+            results.append({"index": index, "relevance_score": score})
+        results.sort(key=lambda r: r["relevance_score"], reverse=True)
+        return results[:top_n]
+
+
+class InMemoryVectorStore(VectorStore):
+    """Vectorstore en mémoire (recherche exacte par produit scalaire) avec latence simulée."""
+
+    def __init__(self, embedding: Embeddings, latency_s: float = 0.0):
+        self._embedding = embedding
+        self.latency_s = latency_s
+        self._documents: List[Document] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = np.asarray(self._embedding.embed_documents(texts), dtype=np.float32)
+        self._matrix = vectors if self._matrix is None else np.vstack([self._matrix, vectors])
+        ids = []
+        for text, metadata in zip(texts, metadatas):
+            ids.append(str(uuid.uuid4()))
+            self._documents.append(Document(page_content=text, metadata=dict(metadata)))
+        return ids
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        latency_s: float = 0.0,
+        **kwargs: Any,
+    ) -> "InMemoryVectorStore":
+        store = cls(embedding, latency_s=latency_s)
+        store.add_texts(texts, metadatas)
+        return store
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return self._search_vector(self._embedding.embed_query(query), k)
+
+    def _search_vector(self, vector: List[float], k: int) -> List[Tuple[Document, float]]:
+        if self._matrix is None:
+            return []
+        scores = self._matrix @ np.asarray(vector, dtype=np.float32)
+        k = min(k, len(self._documents))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._documents[i], float(scores[i])) for i in top]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return [doc for doc, _ in self._search_vector(embedding, k)]
+
+
+# ---------------------------------------------------------------------------
+# Corpus synthétique ---------------------------------------------------------
+# ---------------------------------------------------------------------------
+
+TOPICS = [
+    "frais de scolarité", "admission", "stages", "mobilité internationale", "logement",
+    "bourses", "calendrier universitaire", "associations étudiantes", "double diplôme", "alternance",
+]
+PROGRAMS = ["ING1", "ING2", "ING3", "classe préparatoire", "master"]
+VOCABULARY = [
+    "étudiants", "campus", "dossier", "candidature", "semestre", "crédits", "ECTS", "entreprise",
+    "contrat", "jury", "examen", "inscription", "paiement", "échéance", "formulaire", "service",
+    "scolarité", "pédagogique", "spécialisation", "option", "partenaire", "université", "durée",
+]
+
+
+def build_corpus(n_docs: int = 500, seed: int = 42) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Génère `n_docs` pages factices (texte, métadonnées url/title) de façon reproductible."""
+    rng = random.Random(seed)
+    texts, metadatas = [], []
+    for i in range(n_docs):
+        topic = TOPICS[i % len(TOPICS)]
+        program = PROGRAMS[(i // len(TOPICS)) % len(PROGRAMS)]
+        sentences = [f"Informations sur {topic} pour le cycle {program}."]
+        for _ in range(rng.randint(6, 12)):
+            sentences.append(" ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(8, 16))).capitalize() + ".")
+        texts.append(" ".join(sentences))
+        slug = f"{topic.replace(' ', '-')}-{program.replace(' ', '-').lower()}-{i}"
+        metadatas.append({"url": f"https://example.org/{slug}", "title": f"{topic.capitalize()} - {program}"})
+    return texts, metadatas
+
+
+def build_questions(n_questions: int = 50, seed: int = 7) -> List[str]:
+    """Questions distinctes (pas de hit de cache ni de regroupement sauf si on les répète)."""
+    rng = random.Random(seed)
+    templates = [
+        "Quelles sont les informations sur {topic} en {program} ?",
+        "Comment fonctionnent les {topic} pour le cycle {program} ?",
+        "Où trouver le {extra} concernant {topic} en {program} ?",
+    ]
+    questions = []
+    for i in range(n_questions):
+        questions.append(rng.choice(templates).format(
+            topic=TOPICS[i % len(TOPICS)],
+            program=PROGRAMS[rng.randrange(len(PROGRAMS))],
+            extra=rng.choice(VOCABULARY),
+        ) + f" (#{i})")
+    return questions
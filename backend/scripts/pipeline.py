@@ -0,0 +1,243 @@
+"""
+Exécution d'étapes déclarées avec cache de leurs sorties et reprise après une interruption.
+
+Chaque étape (`Stage`) déclare ses entrées et ses sorties (fichiers ou répertoires), ses
+paramètres et les fichiers de code dont dépend son résultat. Sa clé est l'empreinte du
+contenu des entrées, des paramètres et du code ; le fichier d'état (`Pipeline.state_path`)
+conserve, par étape, la clé de la dernière exécution réussie et l'empreinte de ses sorties.
+Une étape est ignorée si sa clé est inchangée et si ses sorties n'ont été ni modifiées ni
+supprimées depuis. Les sorties d'une étape étant les entrées de la suivante, un changement
+se propage vers l'aval, et s'arrête dès qu'une étape produit les mêmes sorties qu'avant.
+
+L'état est écrit au début et à la fin de chaque étape : après un arrêt (erreur, Ctrl-C,
+machine redémarrée), une nouvelle exécution ignore les étapes terminées et relance la
+première étape inachevée, avec la date de la tentative interrompue (`resume_since`) pour
+reprendre là où elle s'était arrêtée.
+"""
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class StageFailed(RuntimeError):
+    """Étape terminée sans avoir produit un résultat complet (elle sera relancée)."""
+
+
+def path_digest(path: Path) -> str:
+    """Empreinte du contenu d'un fichier, ou des fichiers d'un répertoire (noms relatifs et contenus)."""
+    path = Path(path)
+    if path.is_file():
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    if not path.is_dir():
+        return "absent"
+    digest = hashlib.sha256()
+    for file in sorted(file for file in path.rglob("*") if file.is_file()):
+        digest.update(f"{file.relative_to(path).as_posix()}\0".encode("utf-8"))
+        digest.update(hashlib.sha256(file.read_bytes()).digest())
+    return digest.hexdigest()
+
+
+class Stage:
+    """Étape du pipeline : `run(resume_since)` produit `outputs` à partir de `inputs` et `params()`.
+
+    `run` reçoit la date (timestamp) de la tentative interrompue qu'elle reprend, ou None,
+    et lève une exception (ou retourne False) si son résultat est incomplet. `required` : sorties
+    dont seule la présence est vérifiée (base SQLite de Chroma, modifiée hors du pipeline et
+    donc non hachée). `max_age_hours`
+    périme le résultat d'une étape sans entrée locale (crawl) ; `enabled()` retourne None si
+    l'étape s'exécute, sinon la raison pour laquelle elle est ignorée.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[Optional[float]], Any],
+        *,
+        description: str = "",
+        inputs: Sequence[Path] = (),
+        outputs: Sequence[Path] = (),
+        required: Sequence[Path] = (),
+        params: Optional[Callable[[], Dict[str, Any]]] = None,
+        code: Sequence[Path] = (),
+        max_age_hours: Optional[float] = None,
+        enabled: Optional[Callable[[], Optional[str]]] = None,
+    ):
+        self.name = name
+        self.run = run
+        self.description = description or name
+        self.inputs = [Path(path) for path in inputs]
+        self.outputs = [Path(path) for path in outputs]
+        self.required = [Path(path) for path in required]
+        self.params = params or dict
+        self.code = [Path(path) for path in code]
+        self.max_age_hours = max_age_hours
+        self.enabled = enabled or (lambda: None)
+
+
+class Pipeline:
+    """Enchaîne les étapes dans l'ordre de déclaration (voir le module)."""
+
+    def __init__(self, stages: List[Stage], state_path: Path, root: Optional[Path] = None):
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate stage names: {names}")
+        self.stages = stages
+        self.state_path = Path(state_path)
+        # Chemins enregistrés relativement à `root` : l'état ne dépend pas de l'emplacement du dépôt
+        self.root = Path(root) if root else None
+        self.state = self._load_state()
+        self._digests: Dict[Path, str] = {}
+
+    # ------------------------------------------------------------------
+    # État
+    # ------------------------------------------------------------------
+    def _load_state(self) -> Dict[str, Dict[str, Any]]:
+        if not self.state_path.exists():
+            return {}
+        try:
+            return json.loads(self.state_path.read_text(encoding="utf-8")).get("stages", {})
+        except (OSError, ValueError) as e:
+            print(f"État du pipeline illisible ({self.state_path}: {e}) : toutes les étapes seront exécutées")
+            return {}
+
+    def _save_state(self) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix(self.state_path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps({"stages": self.state}, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.state_path)
+
+    def _label(self, path: Path) -> str:
+        if self.root is not None:
+            try:
+                return path.resolve().relative_to(self.root.resolve()).as_posix()
+            except ValueError:
+                pass
+        return str(path)
+
+    def _digest(self, path: Path) -> str:
+        # Mémorisé jusqu'à la prochaine étape exécutée : les sorties d'une étape sont hachées une fois
+        if path not in self._digests:
+            self._digests[path] = path_digest(path)
+        return self._digests[path]
+
+    def stage_key(self, stage: Stage) -> str:
+        payload = {
+            "inputs": {self._label(path): self._digest(path) for path in stage.inputs},
+            "params": stage.params(),
+            "code": {self._label(path): self._digest(path) for path in stage.code},
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _outputs(self, stage: Stage) -> Dict[str, str]:
+        return {self._label(path): self._digest(path) for path in stage.outputs}
+
+    def stale_reason(self, stage: Stage, key: str) -> Optional[str]:
+        """Raison de (ré)exécuter l'étape, ou None si son résultat est à jour."""
+        entry = self.state.get(stage.name)
+        if entry is None:
+            return "jamais exécutée"
+        if entry["status"] != DONE:
+            return "interrompue" if entry["status"] == RUNNING else "en échec"
+        if entry["key"] != key:
+            return "entrées, paramètres ou code modifiés"
+        if entry.get("outputs") != self._outputs(stage):
+            return "sorties modifiées ou supprimées"
+        missing = [self._label(path) for path in stage.required if not path.exists()]
+        if missing:
+            return f"sorties absentes : {', '.join(missing)}"
+        if stage.max_age_hours is not None and time.time() - entry["finished_at"] > stage.max_age_hours * 3600:
+            return f"plus ancienne que {stage.max_age_hours:g} h"
+        return None
+
+    # ------------------------------------------------------------------
+    # Exécution
+    # ------------------------------------------------------------------
+    def select(self, only: Optional[Iterable[str]] = None, start: Optional[str] = None) -> List[Stage]:
+        names = [stage.name for stage in self.stages]
+        for name in list(only or []) + ([start] if start else []):
+            if name not in names:
+                raise ValueError(f"Unknown stage '{name}' (expected one of {names})")
+        stages = self.stages[names.index(start):] if start else self.stages
+        return [stage for stage in stages if not only or stage.name in only]
+
+    def run(self, stages: Optional[List[Stage]] = None, *, force: Iterable[str] = (), dry_run: bool = False) -> bool:
+        """Exécute les étapes qui ne sont pas à jour ; s'arrête à la première étape en échec."""
+        force = set(force)
+        for stage in stages if stages is not None else self.stages:
+            skipped = stage.enabled()
+            if skipped:
+                print(f"[{stage.name}] ignorée : {skipped}")
+                continue
+            key = self.stage_key(stage)
+            reason = "forcée" if stage.name in force else self.stale_reason(stage, key)
+            if reason is None:
+                print(f"[{stage.name}] à jour ({self.state[stage.name]['finished']})")
+                continue
+            if dry_run:
+                print(f"[{stage.name}] à exécuter : {reason}")
+                continue
+            if not self._run_stage(stage, key, reason):
+                return False
+        return True
+
+    def _run_stage(self, stage: Stage, key: str, reason: str) -> bool:
+        previous = self.state.get(stage.name) or {}
+        # Reprise : date de la première tentative inachevée avec la même clé
+        resume_since = None
+        if previous.get("status") in (RUNNING, FAILED) and previous.get("key") == key:
+            resume_since = previous.get("started_at")
+        started_at = resume_since or time.time()
+        self.state[stage.name] = {"status": RUNNING, "key": key, "started_at": started_at}
+        self._save_state()
+
+        resumed = f", reprise de la tentative du {datetime.fromtimestamp(resume_since):%Y-%m-%d %H:%M}" if resume_since else ""
+        print(f"\n--- [{stage.name}] {stage.description} ({reason}{resumed}) ---")
+        start = time.time()
+        try:
+            if stage.run(resume_since) is False:
+                raise StageFailed("résultat incomplet")
+        except BaseException as e:
+            # Ctrl-C compris : l'étape sera reprise à la prochaine exécution
+            self.state[stage.name].update({"status": FAILED, "error": f"{type(e).__name__}: {e}"})
+            self._save_state()
+            print(f"--- [{stage.name}] échec après {time.time() - start:.1f}s : {e} ---")
+            if isinstance(e, StageFailed):
+                return False
+            raise
+        finally:
+            self._digests.clear()
+
+        self.state[stage.name].update({
+            "status": DONE,
+            "outputs": self._outputs(stage),
+            "finished_at": time.time(),
+            "finished": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "duration_s": round(time.time() - start, 1),
+        })
+        self._save_state()
+        print(f"--- [{stage.name}] terminée en {time.time() - start:.1f}s ---")
+        return True
+
+    def status_lines(self) -> List[str]:
+        """Une ligne par étape : état enregistré et raison d'une prochaine exécution."""
+        lines = []
+        for stage in self.stages:
+            entry = self.state.get(stage.name, {})
+            skipped = stage.enabled()
+            if skipped:
+                detail = f"ignorée ({skipped})"
+            else:
+                reason = self.stale_reason(stage, self.stage_key(stage))
+                detail = "à jour" if reason is None else f"à exécuter ({reason})"
+            when = entry.get("finished") or "-"
+            lines.append(f"  {stage.name:<16} {entry.get('status', '-'):<8} {when:<20} {detail}")
+        return lines
@@ -0,0 +1,166 @@
+"""
+Détection du gabarit du site (bannière cookies, menus, boutons de partage, pied de page)
+à partir des lignes répétées sur de nombreuses pages de `data/raw`.
+
+Les expressions régulières de `cleaning.PAGE_RULES` décrivent le gabarit actuel du site :
+elles cassent sans bruit lorsqu'il change et laissent passer les menus qu'elles ne
+connaissent pas. Ici, le gabarit est appris sur le corpus :
+    1. chaque ligne est normalisée (espaces, URLs des liens masquées) puis hachée ;
+    2. une ligne présente sur au moins `min_pages` pages et `min_fraction` du corpus
+       fait partie du gabarit ;
+    3. chaque page est nettoyée en une passe linéaire (une recherche dans un ensemble
+       par ligne). Un titre répété n'est retiré que s'il précède une ligne du gabarit,
+       la hiérarchie des sections du contenu est donc conservée.
+"""
+
+import hashlib
+import json
+import math
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from config import Config
+
+# Liens de partage et de navigation : l'URL varie d'une page à l'autre, pas le texte
+_LINK_TARGET_RE = re.compile(r'\]\([^)]*\)|https?://\S+')
+_BLANK_RUN_RE = re.compile(r'\n{3,}')
+
+DEFAULT_MIN_PAGES = 5
+DEFAULT_MIN_FRACTION = 0.05
+
+# Estimation du nombre de chunks avec les paramètres de découpage de l'indexation (pour le
+# découpage en tokens, environ 4 caractères par token)
+if Config.CHUNK_STRATEGY == "characters":
+    _CHUNK_SIZE = Config.CHUNK_SIZE
+    _CHUNK_OVERLAP = Config.CHUNK_OVERLAP
+else:
+    _CHUNK_SIZE = 4 * Config.CHUNK_TOKENS
+    _CHUNK_OVERLAP = 4 * Config.CHUNK_OVERLAP_TOKENS
+
+
+def _normalize(line: str) -> str:
+    return " ".join(_LINK_TARGET_RE.sub("]", line).split())
+
+
+def _fingerprint(normalized: str) -> bytes:
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest()
+
+
+def estimate_chunks(length: int, chunk_size: int = _CHUNK_SIZE, chunk_overlap: int = _CHUNK_OVERLAP) -> int:
+    """Nombre approximatif de chunks d'un texte de `length` caractères (découpage à fenêtre glissante)."""
+    if length <= 0:
+        return 0
+    if length <= chunk_size:
+        return 1
+    return 1 + math.ceil((length - chunk_size) / max(1, chunk_size - chunk_overlap))
+
+
+class BoilerplateTemplate:
+    """Ensemble des empreintes de lignes du gabarit, appris sur un corpus de pages."""
+
+    def __init__(self, fingerprints: Set[bytes], pages: int, threshold: int, samples: Optional[List[Tuple[int, str]]] = None):
+        self.fingerprints = fingerprints
+        self.pages = pages
+        self.threshold = threshold
+        # (nombre de pages, ligne) des lignes du gabarit les plus fréquentes, pour le rapport
+        self.samples = samples or []
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
+
+    @classmethod
+    def learn(cls, texts: Iterable[str], min_pages: int = DEFAULT_MIN_PAGES,
+              min_fraction: float = DEFAULT_MIN_FRACTION) -> "BoilerplateTemplate":
+        """Lignes présentes sur au moins `max(min_pages, min_fraction × pages)` pages (une fois par page)."""
+        counts: Dict[bytes, int] = {}
+        samples: Dict[bytes, str] = {}
+        pages = 0
+        for text in texts:
+            pages += 1
+            seen = set()
+            for line in text.split("\n"):
+                normalized = _normalize(line)
+                if not normalized:
+                    continue
+                fingerprint = _fingerprint(normalized)
+                if fingerprint not in seen:
+                    seen.add(fingerprint)
+                    counts[fingerprint] = counts.get(fingerprint, 0) + 1
+                    samples.setdefault(fingerprint, normalized)
+        threshold = max(min_pages, math.ceil(min_fraction * pages))
+        fingerprints = {fingerprint for fingerprint, count in counts.items() if count >= threshold}
+        top = sorted(((counts[f], samples[f]) for f in fingerprints), reverse=True)[:50]
+        return cls(fingerprints, pages, threshold, top)
+
+    @classmethod
+    def learn_from_files(cls, paths: Iterable[Path], **kwargs) -> "BoilerplateTemplate":
+        def texts():
+            for path in paths:
+                try:
+                    yield path.read_text(encoding="utf-8")
+                except (OSError, UnicodeDecodeError):
+                    continue
+        return cls.learn(texts(), **kwargs)
+
+    def strip(self, text: str) -> str:
+        """Retire les lignes du gabarit en une passe ; un texte sans gabarit est renvoyé tel quel."""
+        lines = text.split("\n")
+        drop = [False] * len(lines)
+        dropped_any = False
+        next_kept_is_template = True  # Fin de page : un titre isolé en dernière ligne est du gabarit
+        # Parcours à rebours : on connaît l'état de la ligne non vide suivante pour les titres
+        for i in range(len(lines) - 1, -1, -1):
+            normalized = _normalize(lines[i])
+            if not normalized:
+                continue
+            is_template = _fingerprint(normalized) in self.fingerprints
+            if is_template and normalized.startswith("#") and not next_kept_is_template:
+                is_template = False
+            drop[i] = is_template
+            dropped_any = dropped_any or is_template
+            next_kept_is_template = is_template
+        if not dropped_any:
+            return text
+        stripped = "\n".join(line for line, dropped in zip(lines, drop) if not dropped)
+        # Les blocs retirés laissent des lignes vides consécutives
+        return _BLANK_RUN_RE.sub("\n\n", stripped).strip("\n")
+
+    def report(self) -> Dict[str, object]:
+        return {
+            "pages": self.pages,
+            "threshold_pages": self.threshold,
+            "template_lines": len(self),
+            "top_lines": [{"pages": count, "line": line} for count, line in self.samples],
+        }
+
+
+def write_report(path: Path, template: BoilerplateTemplate, page_stats: List[Dict[str, object]]) -> Dict[str, int]:
+    """Rapport JSON (gabarit appris et gain par page) ; retourne les totaux."""
+    totals = {
+        "pages": len(page_stats),
+        "chars_before": sum(stat["chars_before"] for stat in page_stats),
+        "chars_removed": sum(stat["chars_removed"] for stat in page_stats),
+        "chunks_before": sum(stat["chunks_before"] for stat in page_stats),
+        "chunks_after": sum(stat["chunks_after"] for stat in page_stats),
+    }
+    payload = {
+        "template": template.report(),
+        "totals": totals,
+        "pages": sorted(page_stats, key=lambda stat: stat["chars_removed"], reverse=True),
+    }
+    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    return totals
+
+
+def format_report(totals: Dict[str, int], report_path: Path) -> List[str]:
+    """Lignes de résumé du retrait du gabarit (caractères et chunks estimés)."""
+    chars_before = totals["chars_before"] or 1
+    chunks_before = totals["chunks_before"] or 1
+    chunks_removed = totals["chunks_before"] - totals["chunks_after"]
+    return [
+        f"\nGabarit retiré sur {totals['pages']} pages :",
+        f"  Caractères retirés:    {totals['chars_removed']:,} ({totals['chars_removed'] / chars_before * 100:.1f}%)",
+        f"  Chunks évités (est.):  {chunks_removed:,} ({chunks_removed / chunks_before * 100:.1f}%)",
+        f"  Détail par page:       {report_path}",
+    ]
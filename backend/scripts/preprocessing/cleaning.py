@@ -0,0 +1,298 @@
+"""
+Nettoyage des pages markdown scrapées, partagé par `preprocess.py` et `preprocess_and_index.py`.
+
+Les règles (expressions régulières) sont compilées une seule fois à l'import du module,
+donc une fois par processus du pool. `preprocess_files` répartit les fichiers sur un pool
+de processus ; les résultats (et les messages de log) sont consommés dans l'ordre des
+fichiers, la sortie est donc identique octet pour octet à un traitement séquentiel.
+
+Avec un gabarit appris (`boilerplate.BoilerplateTemplate`), les lignes répétées sur le
+corpus sont retirées à la place des règles `PAGE_RULES` ; le gabarit est transmis une
+fois à chaque processus du pool (initialiseur) plutôt qu'avec chaque fichier.
+"""
+
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from scripts.preprocessing.boilerplate import BoilerplateTemplate, estimate_chunks
+
+# Règles appliquées à la page entière, dans l'ordre
+PAGE_RULES: List[Tuple[str, "re.Pattern[str]"]] = [
+    # Supprimer bannières cookies et navigation
+    ("cookies", re.compile(r'# Ce site web utilise des cookies.*?Personnaliser', flags=re.DOTALL)),
+    # Supprimer menus et liens de navigation
+    ("navigation", re.compile(r'\[Aller au contenu\].*?\[Alumni\]', flags=re.DOTALL)),
+    # Supprimer les boutons de partage et liens sociaux
+    ("partage", re.compile(r'[\*\s]*Imprimer[\s\S]*?Linkedin \]\([^\)]+\)', flags=re.DOTALL)),
+    # Supprimer pieds de page
+    ("pied_de_page", re.compile(r'PROGRAMMES.*$', flags=re.DOTALL)),
+]
+TITLE_RE = re.compile(r'# ([^\n]+)')
+CONTENT_RE = re.compile(r'# [^\n]+\n(.*?)(\n\!\[\]|\nPROGRAMMES|$)', flags=re.DOTALL)
+# Règles appliquées au contenu principal extrait
+IMAGES_RE = re.compile(r'\!\[([^\]]*)\]\([^\)]+\)(\s+\1\s*-\s*)?')
+EN_SAVOIR_PLUS_RE = re.compile(r'\*\*En savoir plus :\*\*[\s\S]*?$')
+SENTENCE_RE = re.compile(r'[^.!?]+[.!?]')
+
+MIN_CONTENT_LENGTH = 200
+
+# En dessous, le démarrage du pool coûte plus qu'il ne rapporte
+_MIN_FILES_PER_WORKER = 20
+
+# Gabarit appris, fixé par `_init_worker` dans chaque processus (None : règles PAGE_RULES)
+_TEMPLATE: Optional[BoilerplateTemplate] = None
+
+
+def _init_worker(template: Optional[BoilerplateTemplate]) -> None:
+    global _TEMPLATE
+    _TEMPLATE = template
+
+
+def default_workers() -> int:
+    """Cœurs réellement disponibles (affinité CPU du conteneur si connue)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def _timed(timings: Optional[Dict[str, float]], name: str, start: float) -> None:
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def clean_markdown(text: str, file_path: str = "", log: Optional[Callable[[str], None]] = None,
+                   timings: Optional[Dict[str, float]] = None,
+                   rules: Sequence[Tuple[str, "re.Pattern[str]"]] = PAGE_RULES) -> Dict[str, str]:
+    """Titre et contenu principal d'une page ; `timings` cumule le temps passé par règle.
+
+    `rules=()` quand le gabarit a déjà été retiré par un `BoilerplateTemplate`.
+    """
+    log = log or print
+    for name, pattern in rules:
+        start = time.perf_counter()
+        text = pattern.sub('', text)
+        _timed(timings, name, start)
+
+    # Extraire le titre principal
+    start = time.perf_counter()
+    title_match = TITLE_RE.search(text)
+    _timed(timings, "titre", start)
+    if title_match:
+        title = title_match.group(1)
+    else:
+        # Essayer de trouver un titre dans le nom du fichier
+        filename = Path(file_path).stem
+        title = filename.replace('_', ' ').replace('-', ' ')
+        log(f"ℹ️ Pas de titre trouvé dans {file_path}, utilisation du nom de fichier")
+
+    # Extraire le contenu principal
+    start = time.perf_counter()
+    content_match = CONTENT_RE.search(text)
+    _timed(timings, "contenu", start)
+
+    if content_match:
+        content = content_match.group(1).strip()
+    else:
+        # Si la regex ne trouve pas de contenu, prendre tout après le titre
+        title_pos = text.find('# ')
+        if title_pos >= 0:
+            newline_pos = text.find('\n', title_pos)
+            if newline_pos >= 0:
+                content = text[newline_pos:].strip()
+            else:
+                content = ""
+        else:
+            content = text.strip()
+
+        if not content:
+            log(f"ℹ️ Pas de contenu extrait de {file_path}")
+
+    # Nettoyer le contenu
+    if content:
+        # Supprimer les images et légendes
+        start = time.perf_counter()
+        content = IMAGES_RE.sub('', content)
+        _timed(timings, "images", start)
+
+        # Supprimer la partie "En savoir plus" et liens associés
+        start = time.perf_counter()
+        content = EN_SAVOIR_PLUS_RE.sub('', content)
+        _timed(timings, "en_savoir_plus", start)
+
+        # Supprimer les descriptions dupliquées
+        start = time.perf_counter()
+        sentences = SENTENCE_RE.findall(content)
+        if len(sentences) > 1:
+            # Vérifier si la première phrase est répétée immédiatement
+            if sentences[0].strip() == sentences[1].strip():
+                # Supprimer la répétition
+                content = content.replace(sentences[0] + ' ' + sentences[1], sentences[0])
+        _timed(timings, "doublons", start)
+
+    return {"title": title, "content": content}
+
+
+def process_file(md_file: Path, long_files_dir: Path, short_files_dir: Path,
+                 min_content_length: int = MIN_CONTENT_LENGTH) -> Dict[str, Any]:
+    """Nettoie un fichier et écrit le résultat ; retourne le statut, les messages et les temps par règle.
+
+    Exécutée dans les processus du pool : aucun état global n'est modifié, les messages
+    sont renvoyés pour être journalisés dans l'ordre par le processus principal. Avec un
+    gabarit appris, `boilerplate` donne les caractères et chunks retirés de la page.
+    """
+    messages: List[str] = []
+    timings: Dict[str, float] = {}
+    boilerplate: Optional[Dict[str, Any]] = None
+    try:
+        # Lire le contenu du fichier
+        start = time.perf_counter()
+        with open(md_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        # Si le contenu est vide, ignorer le fichier
+        if not content.strip():
+            messages.append(f"ℹ️ Fichier vide: {md_file}")
+            return {"status": "short", "written": False, "messages": messages, "timings": timings, "boilerplate": None}
+
+        # Récupérer les métadonnées associées
+        json_file = md_file.with_suffix('.json')
+        if json_file.exists():
+            with open(json_file, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        else:
+            metadata = {}
+            messages.append(f"ℹ️ Pas de métadonnées pour: {md_file}")
+        _timed(timings, "lecture", start)
+
+        # Nettoyer le contenu
+        if _TEMPLATE is not None:
+            start = time.perf_counter()
+            stripped = _TEMPLATE.strip(content)
+            _timed(timings, "gabarit", start)
+            boilerplate = {
+                "file": md_file.name,
+                "chars_before": len(content),
+                "chars_removed": len(content) - len(stripped),
+                "chunks_before": estimate_chunks(len(content)),
+                "chunks_after": estimate_chunks(len(stripped)),
+            }
+            cleaned = clean_markdown(stripped, str(md_file), log=messages.append, timings=timings, rules=())
+        else:
+            cleaned = clean_markdown(content, str(md_file), log=messages.append, timings=timings)
+
+        # Fusionner avec les métadonnées
+        cleaned.update(metadata)
+
+        # Déterminer le répertoire de destination en fonction de la longueur du contenu
+        is_short = len(cleaned["content"]) < min_content_length
+
+        if is_short:
+            messages.append(f"ℹ️ Contenu court ({len(cleaned['content'])} caractères): {md_file}")
+            target_dir = short_files_dir
+        else:
+            target_dir = long_files_dir
+
+        # Sauvegarder le résultat MD
+        start = time.perf_counter()
+        output_file = target_dir / md_file.name
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(f"# {cleaned['title']}\n\n{cleaned['content']}")
+
+        # Sauvegarder les métadonnées enrichies
+        output_meta = target_dir / f"{md_file.stem}.json"
+        with open(output_meta, 'w', encoding='utf-8') as f:
+            json.dump(cleaned, f, ensure_ascii=False, indent=2)
+        _timed(timings, "ecriture", start)
+
+        return {"status": "short" if is_short else "long", "written": True, "messages": messages,
+                "timings": timings, "boilerplate": boilerplate}
+
+    except Exception as e:
+        messages.append(f"❌ Erreur de traitement pour {md_file}: {str(e)}")
+        return {"status": "error", "written": False, "messages": messages, "timings": timings, "boilerplate": boilerplate}
+
+
+def _process_file_args(args: Tuple[Path, Path, Path, int]) -> Dict[str, Any]:
+    return process_file(*args)
+
+
+def preprocess_files(
+    md_files: List[Path],
+    long_files_dir: Path,
+    short_files_dir: Path,
+    log: Callable[[str], None],
+    *,
+    workers: Optional[int] = None,
+    min_content_length: int = MIN_CONTENT_LENGTH,
+    progress: Callable = lambda iterable, **kwargs: iterable,
+    template: Optional[BoilerplateTemplate] = None,
+) -> Tuple[Dict[str, int], Dict[str, float], int, List[Dict[str, Any]]]:
+    """Traite `md_files` (en parallèle si `workers` > 1) ; retourne les compteurs, le temps par règle,
+    le nombre de processus utilisés et, avec `template`, le gain par page du retrait du gabarit."""
+    workers = workers or default_workers()
+    workers = max(1, min(workers, len(md_files) // _MIN_FILES_PER_WORKER))
+    counts = {"long": 0, "short": 0, "error": 0}
+    rule_timings: Dict[str, float] = {}
+    page_stats: List[Dict[str, Any]] = []
+    tasks = [(md_file, long_files_dir, short_files_dir, min_content_length) for md_file in md_files]
+
+    def consume(results):
+        for result in progress(results, total=len(tasks), desc="Prétraitement des fichiers"):
+            # Messages journalisés dans l'ordre des fichiers, comme en séquentiel
+            for message in result["messages"]:
+                log(message)
+            counts[result["status"]] += 1
+            for name, seconds in result["timings"].items():
+                rule_timings[name] = rule_timings.get(name, 0.0) + seconds
+            if result["boilerplate"] is not None:
+                page_stats.append(result["boilerplate"])
+
+    if workers == 1:
+        _init_worker(template)
+        try:
+            consume(map(_process_file_args, tasks))
+        finally:
+            _init_worker(None)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(template,)) as executor:
+            consume(executor.map(_process_file_args, tasks, chunksize=max(1, len(tasks) // (workers * 8))))
+    return counts, rule_timings, workers, page_stats
+
+
+def format_rule_timings(rule_timings: Dict[str, float], wall_seconds: float, files: int, workers: int) -> List[str]:
+    """Lignes de résumé : temps cumulé par règle (tous processus confondus) et débit global."""
+    total = sum(rule_timings.values()) or 1e-9
+    lines = [f"\nTemps par règle ({files} fichiers, {workers} processus, {wall_seconds:.2f}s, "
+             f"{files / max(wall_seconds, 1e-9):.0f} fichiers/s):"]
+    for name, seconds in sorted(rule_timings.items(), key=lambda item: item[1], reverse=True):
+        lines.append(f"  {name:<16} {seconds * 1000:>10.1f} ms  {seconds / total * 100:5.1f}%")
+    return lines
+
+
+class BufferedLog:
+    """Journal console + fichier : le fichier est ouvert une fois, les écritures sont bufferisées."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = None
+
+    def start(self, header: str) -> None:
+        self.close()
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write(header)
+
+    def __call__(self, message: str) -> None:
+        print(message)
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(f"{message}\n")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
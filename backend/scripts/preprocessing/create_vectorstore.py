@@ -1,12 +1,7 @@
+import argparse
 import os
 import sys
 from dotenv import load_dotenv
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
-import json
-from tqdm import tqdm
 from pathlib import Path
 
 # Path(__file__) est /app/scripts/preprocessing/create_vectorstore.py
@@ -17,6 +12,11 @@ sys.path.insert(0, str(APP_ROOT_DIR))
 # Charger les variables d'environnement depuis backend/.env
 load_dotenv(dotenv_path=APP_ROOT_DIR / ".env")
 
+from config import Config
+from RAG.embeddings import initialize_embeddings
+from RAG.indexing import sync_chroma, sync_local_index
+from RAG.lexical import build_bm25_index
+
 assert os.getenv("OPENAI_API_KEY"), "La clé API OpenAI n'a pas été trouvée dans le fichier .env"
 
 # Les chemins sont maintenant relatifs à APP_ROOT_DIR (qui est /backend)
@@ -26,79 +26,31 @@ PREPROCESSED_DIR = DATA_DIR / "preprocessed"
 LONG_FILES_DIR = PREPROCESSED_DIR / "long_files"
 VECTORSTORE_DIR = DATA_DIR / "vectorstore"
 
-def load_md_with_metadata(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Vérifier si un fichier JSON de métadonnées existe
-    json_path = file_path.with_suffix('.json')
-    metadata = {
-        "source": str(file_path),
-        "filename": file_path.name,
-    }
-    
-    if json_path.exists():
-        try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                json_data = json.load(f)
-                # Ajouter des métadonnées utiles pour le RAG
-                if 'title' in json_data:
-                    metadata['title'] = json_data['title']
-                if 'url' in json_data:
-                    metadata['url'] = json_data['url']
-        except Exception as e:
-            print(f"Erreur lors du chargement des métadonnées pour {file_path}: {e}")
-    
-    return {"content": content, "metadata": metadata}
-
-def main():
-    print(f"Création de l'index vectoriel à partir des documents prétraités dans {LONG_FILES_DIR}")
+def main(full_rebuild=False):
+    print(f"Mise à jour de l'index vectoriel à partir des documents prétraités dans {LONG_FILES_DIR}")
     
     # Créer le répertoire de l'index vectoriel s'il n'existe pas
     VECTORSTORE_DIR.mkdir(exist_ok=True, parents=True)
     
-    # Collecter tous les fichiers markdown dans le répertoire des fichiers longs
-    md_files = list(LONG_FILES_DIR.glob("*.md"))
-    print(f"Trouvé {len(md_files)} fichiers markdown à traiter")
-    
-    # Charger les documents et leurs métadonnées
-    documents = []
-    for md_file in tqdm(md_files, desc="Chargement des documents"):
-        doc_with_metadata = load_md_with_metadata(md_file)
-        documents.append(doc_with_metadata)
-    
-    # Créer un text splitter pour diviser les documents en chunks
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=300,
-        length_function=len,
-    )
-    
-    # Diviser les documents en chunks
-    chunks = []
-    for doc in tqdm(documents, desc="Division des documents en chunks"):
-        split_docs = text_splitter.create_documents(
-            texts=[doc["content"]],
-            metadatas=[doc["metadata"]]
-        )
-        chunks.extend(split_docs)
-    
-    print(f"Créé {len(chunks)} chunks de texte à partir de {len(documents)} documents")
-    
-    # Créer les embeddings
-    embeddings = OpenAIEmbeddings()
-    
-    # Créer l'index vectoriel
-    print("Création de l'index vectoriel...")
-    vectorstore = Chroma.from_documents(
-        documents=chunks,
-        embedding=embeddings,
-        persist_directory=str(VECTORSTORE_DIR)
-    )
-    
-    # Sauvegarder l'index vectoriel
-    vectorstore.persist()
-    print(f"Index vectoriel créé et sauvegardé dans {VECTORSTORE_DIR}")
+    # Indexation incrémentale (RAG/indexing.py) : seuls les chunks nouveaux ou modifiés sont
+    # envoyés à l'API d'embedding, les chunks des pages modifiées ou supprimées sont retirés.
+    # Mêmes paramètres de découpage que l'index BM25 de la recherche hybride (RAG/lexical.py)
+    if Config.BDD_PROVIDER == "Local":
+        # Index mappé en mémoire, construit avec le modèle utilisé pour les requêtes (RAG/embeddings.py)
+        print(f"Index vectoriel local ({Config.LOCAL_INDEX_DTYPE}, quantification {Config.LOCAL_INDEX_QUANTIZATION})...")
+        plan = sync_local_index(initialize_embeddings(), Config.LOCAL_INDEX_DIR, LONG_FILES_DIR, full_rebuild=full_rebuild)
+        print(f"Index vectoriel local à jour ({plan.summary()}) dans {Config.LOCAL_INDEX_DIR}")
+    else:
+        # Même modèle que les requêtes (text-embedding-3-small), via le cache disque des embeddings
+        print("Index vectoriel Chroma...")
+        plan = sync_chroma(initialize_embeddings(), VECTORSTORE_DIR, LONG_FILES_DIR, full_rebuild=full_rebuild)
+        print(f"Index vectoriel à jour ({plan.summary()}) dans {VECTORSTORE_DIR}")
+
+    # Index lexical BM25 pour la recherche hybride (reconstruit sur les mêmes chunks)
+    bm25_index = build_bm25_index(LONG_FILES_DIR)
+    print(f"Index BM25 créé ({len(bm25_index)} chunks) et sauvegardé dans {Config.BM25_INDEX_PATH}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Indexe (de façon incrémentale) les documents prétraités.")
+    parser.add_argument("--full", action="store_true", help="Reconstruit l'index en entier au lieu de ne traiter que les changements")
+    main(full_rebuild=parser.parse_args().full)
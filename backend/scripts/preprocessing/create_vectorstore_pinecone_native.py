@@ -1,9 +1,8 @@
+import argparse
 import os
 import sys
-import uuid # For generating unique IDs for Pinecone records
 from dotenv import load_dotenv
 from langchain_community.document_loaders import DirectoryLoader, TextLoader # type: ignore
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 # OpenAIEmbeddings and Chroma are no longer needed as we focus on Pinecone native
 
 # PINECONE IMPORTS
@@ -13,9 +12,6 @@ from pinecone import Pinecone, ServerlessSpec # For direct Pinecone client usage
 import json
 from tqdm import tqdm # type: ignore
 from pathlib import Path
-import unicodedata
-import re
-import time # Ajout pour la temporisation
 
 # --- Configuration Globale ---
 # Path(__file__) est /app/scripts/preprocessing/create_vectorstore_pinecone_native.py
@@ -26,6 +22,13 @@ sys.path.insert(0, str(APP_ROOT_DIR))
 # Charger les variables d'environnement depuis backend/.env
 load_dotenv(dotenv_path=APP_ROOT_DIR / ".env")
 
+from config import Config
+from RAG.indexing import (
+    chunking_settings, load_manifest, make_deduplicator, make_splitter, manifest_path, mark_failed,
+    plan_index_update, save_dedup_report, save_manifest,
+)
+from scripts.preprocessing.pinecone_ingest import ingest_records, load_dead_letters, rewrite_dead_letters
+
 # --- Configuration OpenAI (pour Chroma local) --- Supprimée car Chroma est supprimé
 # OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 # assert OPENAI_API_KEY, "La clé API OpenAI (OPENAI_API_KEY) n'a pas été trouvée dans le fichier .env pour Chroma."
@@ -49,6 +52,9 @@ PREPROCESSED_DIR = DATA_DIR / "preprocessed"
 LONG_FILES_DIR = PREPROCESSED_DIR / "long_files"
 # VECTORSTORE_DIR_CHROMA = DATA_DIR / "vectorstore_chroma" # Supprimé
 
+# Lots en échec définitif lors de l'upsert, rejoués avec --resume
+DEAD_LETTER_PATH = DATA_DIR / "pinecone_dead_letter.jsonl"
+
 # --- Fonctions Utilitaires ---
 def load_md_with_metadata(file_path: Path):
     with open(file_path, 'r', encoding='utf-8') as f:
@@ -73,24 +79,18 @@ def load_md_with_metadata(file_path: Path):
     
     return {"content": content, "metadata": metadata}
 
-# Helper pour générer un ID ASCII compatible Pinecone
-def sanitize_id(raw: str, max_len: int = 256) -> str:
-    # Translittération ASCII puis remplacement des caractères non autorisés
-    normalized = unicodedata.normalize('NFKD', raw).encode('ascii', 'ignore').decode('ascii')
-    sanitized = re.sub(r'[^A-Za-z0-9_-]', '_', normalized)
-    return sanitized[:max_len]
-
 # --- Fonctions Principales du Pipeline --- Supprimée car Chroma est supprimé
 # def create_local_chroma_vectorstore(chunks, embeddings_openai):
 #     ...
 
-def upsert_to_pinecone_native(chunks_lc): 
+def connect_pinecone_index():
+    """Index Pinecone natif (embedding intégré), ou None s'il est inaccessible."""
     if not pinecone_enabled_native:
         # Cette vérification est déjà faite globalement, mais on la garde par sécurité
         print("\n--- Intégration Pinecone native désactivée (variables d'environnement manquantes) ---")
-        return
+        return None
 
-    print(f"\n--- Tentative d'upsert vers l'index Pinecone natif '{PINECONE_INDEX_NAME}' (région: {PINECONE_ENVIRONMENT}) ---")
+    print(f"\n--- Connexion à l'index Pinecone natif '{PINECONE_INDEX_NAME}' (région: {PINECONE_ENVIRONMENT}) ---")
     
     try:
         pc = Pinecone(api_key=PINECONE_API_KEY)
@@ -100,7 +100,7 @@ def upsert_to_pinecone_native(chunks_lc):
             raw_indexes = pc.list_indexes()
         except Exception as li_err:
             print(f"Impossible de lister les index Pinecone : {li_err}")
-            return
+            return None
 
         # Normaliser en liste de chaînes
         available_indexes = None
@@ -118,7 +118,7 @@ def upsert_to_pinecone_native(chunks_lc):
 
         if available_indexes is None:
             print(f"Format inattendu de retour pour list_indexes(): {raw_indexes}")
-            return
+            return None
 
         if PINECONE_INDEX_NAME not in available_indexes:
             print(f"L'index Pinecone '{PINECONE_INDEX_NAME}' n'existe pas.")
@@ -129,132 +129,248 @@ def upsert_to_pinecone_native(chunks_lc):
             print(f"  Métrique: cosine")
             print(f"  Cloud: aws, Région: {PINECONE_ENVIRONMENT}")
             print(f"  Modèle d'embedding intégré: ex: llama-text-embed-v2 (champ source 'text')")
-            return
+            return None
         
         pinecone_index = pc.Index(PINECONE_INDEX_NAME)
         print(f"Connecté à l'index Pinecone '{PINECONE_INDEX_NAME}'. Stats actuelles: {pinecone_index.describe_index_stats()}")
-
-        records_to_upsert = []
-        for i, chunk_doc in enumerate(tqdm(chunks_lc, desc="Préparation des données pour Pinecone")):
-            metadata_for_pinecone = chunk_doc.metadata.copy()  # autres champs deviendront metadata
-
-            for key, value in metadata_for_pinecone.items():
-                if isinstance(value, Path):
-                    metadata_for_pinecone[key] = str(value)
-                elif not isinstance(value, (str, int, float, bool, list)):
-                     metadata_for_pinecone[key] = str(value) 
-                elif isinstance(value, list) and not all(isinstance(item, str) for item in value):
-                    metadata_for_pinecone[key] = [str(item) for item in value]
-
-            record_id_base = metadata_for_pinecone.get("filename", f"doc_unknown_{i}")
-            record_id = sanitize_id(f"{record_id_base}_chunk_{i}")
-
-            record = {
-                "_id": record_id or str(uuid.uuid4()),  # Pinecone accepte '_id' ou 'id'
-                "text": chunk_doc.page_content,          # Champ texte pour l'embedding intégré
-            }
-            # ajouter le reste des métadonnées (titre, source, etc.)
-            record.update(metadata_for_pinecone)
-            records_to_upsert.append(record)
-
-        batch_size = 96
-        print(f"Upsert de {len(records_to_upsert)} chunks vers Pinecone (upsert_records) en lots de {batch_size}...")
-
-        # Estimation pour la temporisation afin de respecter les limites de tokens/minute
-        # (Ceci est une estimation, les longueurs réelles des chunks peuvent varier)
-        # Limite: 250,000 tokens/minute pour llama-text-embed-v2 sur le plan gratuit.
-        # Un chunk fait ~200-300 tokens en moyenne (chunk_size=1000 char ~ 250 tokens, plus overhead)
-        APPROX_TOKENS_PER_CHUNK = 250 
-        TOKENS_LIMIT_PER_MINUTE = 250000
-        SECONDS_IN_MINUTE = 60
-
-        # Nombre de lots que nous pouvons théoriquement envoyer par minute
-        # tokens_per_batch = APPROX_TOKENS_PER_CHUNK * batch_size
-        # batches_per_minute_limit = TOKENS_LIMIT_PER_MINUTE / tokens_per_batch
-        # sleep_duration_seconds = SECONDS_IN_MINUTE / batches_per_minute_limit if batches_per_minute_limit > 0 else SECONDS_IN_MINUTE
-        # Simplifié: chaque lot de 96 chunks * 250 tokens/chunk = 24000 tokens.
-        # 250000 / 24000 = ~10.4 lots par minute. Donc ~6 secondes par lot.
-        # On prend une marge de sécurité.
-        sleep_duration_seconds = 7.0 
-
-        for i in range(0, len(records_to_upsert), batch_size):
-            batch = records_to_upsert[i:i + batch_size]
-            try:
-                pinecone_index.upsert_records("", batch)  # namespace par défaut ""
-                print(f"Lot {i//batch_size + 1} / {len(records_to_upsert)//batch_size + 1} envoyé avec succès.")
-            except Exception as batch_e: # Idéalement, intercepter pinecone.core.client.exceptions.ApiException
-                print(f"Erreur lors de l'upsert_records du lot {i//batch_size + 1} : {batch_e}")
-                # Si c'est une erreur de type "Too Many Requests" (status 429)
-                if hasattr(batch_e, 'status') and batch_e.status == 429:
-                    print("Erreur 429 (Too Many Requests). Attente de 60 secondes avant de réessayer ce lot...")
-                    time.sleep(60) # Attente plus longue en cas de 429
-                    try:
-                        pinecone_index.upsert_records("", batch)
-                        print(f"Lot {i//batch_size + 1} (après retry) envoyé avec succès.")
-                    except Exception as retry_e:
-                        print(f"Échec du retry pour le lot {i//batch_size + 1}: {retry_e}. Passage au lot suivant.")
-                        continue # On pourrait aussi choisir de stopper tout le script ici
-                else:
-                    # Pour les autres erreurs, on pourrait vouloir stopper ou juste logguer et continuer
-                    print(f"Erreur non-429, passage au lot suivant pour le moment.")
-                    continue 
-            
-            # Temporisation avant le prochain lot pour ne pas surcharger l'API
-            if (i + batch_size) < len(records_to_upsert): # Ne pas dormir après le dernier lot
-                print(f"Attente de {sleep_duration_seconds:.1f} secondes avant le prochain lot...")
-                time.sleep(sleep_duration_seconds)
-        
-        print(f"Upsert_records vers Pinecone '{PINECONE_INDEX_NAME}' terminé.")
-        print(f"Nouvelles stats de l'index: {pinecone_index.describe_index_stats()}")
+        return pinecone_index
 
     except Exception as e:
         print(f"Erreur majeure lors de l'interaction avec Pinecone (natif): {e}")
         print("Veuillez vérifier vos identifiants Pinecone, le nom de l'index, la configuration réseau, et que l'index est bien configuré pour l'embedding intégré.")
+        return None
+
+def upsert_to_pinecone_native(pinecone_index, chunks_lc, document_hashes=None):
+    """Envoie les chunks (identifiant = `chunk_id`) ; retourne les documents dont un lot a échoué."""
+    records_to_upsert = []
+    for chunk_doc in tqdm(chunks_lc, desc="Préparation des données pour Pinecone"):
+        metadata_for_pinecone = chunk_doc.metadata.copy()  # autres champs deviendront metadata
+
+        for key, value in metadata_for_pinecone.items():
+            if isinstance(value, Path):
+                metadata_for_pinecone[key] = str(value)
+            elif not isinstance(value, (str, int, float, bool, list)):
+                 metadata_for_pinecone[key] = str(value) 
+            elif isinstance(value, list) and not all(isinstance(item, str) for item in value):
+                metadata_for_pinecone[key] = [str(item) for item in value]
+
+        record = {
+            "_id": chunk_doc.metadata["chunk_id"],  # Pinecone accepte '_id' ou 'id' ; stable tant que le chunk ne change pas
+            "text": chunk_doc.page_content,         # Champ texte pour l'embedding intégré
+        }
+        # ajouter le reste des métadonnées (titre, source, etc.)
+        record.update(metadata_for_pinecone)
+        records_to_upsert.append(record)
+
+    if not records_to_upsert:
+        print("Aucun chunk nouveau ou modifié à envoyer à Pinecone.")
+        return set()
+
+    # Lots de 96 (maximum d'upsert_records avec embedding intégré), en parallèle, au débit du quota
+    # réel de tokens/minute (seau à jetons, tokens comptés par lot) ; voir pinecone_ingest.py
+    _, failed_batches = ingest_records(
+        pinecone_index,
+        records_to_upsert,
+        namespace="",  # namespace par défaut
+        batch_size=96,
+        tokens_per_minute=Config.PINECONE_TOKENS_PER_MINUTE,
+        concurrency=Config.PINECONE_UPSERT_CONCURRENCY,
+        max_retries=Config.PINECONE_MAX_RETRIES,
+        dead_letter_path=DEAD_LETTER_PATH,
+        document_hashes=document_hashes,
+    )
+    print(f"Upsert_records vers Pinecone '{PINECONE_INDEX_NAME}' terminé.")
+    if failed_batches:
+        print(f"{len(failed_batches)} lots en échec enregistrés dans {DEAD_LETTER_PATH} (relancer avec --resume)")
+    # Documents renvoyés en entier à la prochaine exécution
+    return {record["filename"] for batch in failed_batches for record in batch}
+
+def delete_from_pinecone_native(pinecone_index, record_ids):
+    """Supprime les chunks des pages modifiées ou retirées ; retourne False en cas d'échec."""
+    if not record_ids:
+        return True
+    print(f"Suppression de {len(record_ids)} chunks obsolètes de Pinecone...")
+    try:
+        for i in range(0, len(record_ids), 1000):  # 1000 identifiants maximum par requête
+            pinecone_index.delete(ids=record_ids[i:i + 1000], namespace="")
+    except Exception as e:
+        print(f"Erreur lors de la suppression des chunks obsolètes : {e}")
+        return False
+    return True
+
+def live_dead_letters(entries, manifest):
+    """Lots en attente encore valides au regard du manifeste Pinecone.
+
+    Un chunk n'est conservé que si son document est marqué en échec dans le manifeste
+    (empreinte à None), que son identifiant figure parmi les chunks actuels du document et
+    que le lot porte la dernière empreinte enregistrée pour ce document. Les chunks des
+    documents réindexés, modifiés ou retirés depuis, et les doublons, sont abandonnés.
+    """
+    documents = manifest["documents"] if manifest else {}
+    current_chunks = {
+        doc_key: set(entry["chunks"]) for doc_key, entry in documents.items() if entry["hash"] is None
+    }
+    # Dernière empreinte connue de chaque document (les lots sont ajoutés dans l'ordre)
+    latest_hashes = {doc_key: doc_hash for entry in entries for doc_key, doc_hash in entry["documents"].items()}
+    kept, seen = [], set()
+    # Du plus récent au plus ancien : un chunk renvoyé plusieurs fois n'est gardé qu'une fois
+    for entry in reversed(entries):
+        records = []
+        for record in entry["records"]:
+            doc_key = record["filename"]
+            if (record["_id"] in current_chunks.get(doc_key, ())
+                    and entry["documents"].get(doc_key) == latest_hashes.get(doc_key)
+                    and record["_id"] not in seen):
+                seen.add(record["_id"])
+                records.append(record)
+        if records:
+            doc_keys = {record["filename"] for record in records}
+            kept.append({
+                **entry,
+                "documents": {doc_key: doc_hash for doc_key, doc_hash in entry["documents"].items() if doc_key in doc_keys},
+                "records": records,
+            })
+    kept.reverse()
+    return kept
+
+def prune_dead_letters(manifest):
+    """Réécrit le fichier de lettres mortes sans les lots obsolètes ou déjà rejoués ; retourne les lots restants."""
+    entries = load_dead_letters(DEAD_LETTER_PATH)
+    kept = live_dead_letters(entries, manifest)
+    dropped = sum(len(entry["records"]) for entry in entries) - sum(len(entry["records"]) for entry in kept)
+    if dropped:
+        rewrite_dead_letters(DEAD_LETTER_PATH, kept)
+        print(f"{dropped} chunks obsolètes ou déjà indexés retirés de {DEAD_LETTER_PATH}")
+    return kept
 
 # --- Exécution du Pipeline ---
-def main():
-    print(f"Démarrage du pipeline de création de vectorstore pour Pinecone uniquement...")
+def main(full_rebuild=False, chunks=None):
+    """Indexation incrémentale ; `chunks` : chunks déjà découpés (run_pipeline.py). Retourne False en cas d'échec."""
+    print(f"Démarrage du pipeline d'indexation incrémentale pour Pinecone uniquement...")
     print(f"Documents sources depuis: {LONG_FILES_DIR}")
 
-    md_files = list(LONG_FILES_DIR.glob("*.md"))
+    md_files = sorted(LONG_FILES_DIR.glob("*.md"))
     if not md_files:
         print(f"Aucun fichier .md trouvé dans {LONG_FILES_DIR}. Vérifiez que l'étape de prétraitement a bien fonctionné.")
-        return
+        return False
     print(f"Trouvé {len(md_files)} fichiers markdown à traiter.")
 
     documents_data = [] 
     for md_file in tqdm(md_files, desc="Chargement des documents Markdown"):
         doc_data = load_md_with_metadata(md_file)
-        documents_data.append(doc_data)
-
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000, 
-        chunk_overlap=200,
-        length_function=len,
+        documents_data.append((md_file.name, doc_data["content"], doc_data["metadata"]))
+
+    # Même découpage que Chroma, l'index local et BM25 (CHUNK_STRATEGY, voir RAG/chunking.py) ;
+    # les tailles en tokens cl100k restent bien en deçà de la limite de l'embedding intégré
+    text_splitter = make_splitter()
+
+    # Comparaison avec le manifeste de la dernière indexation : seuls les chunks nouveaux
+    # ou modifiés sont envoyés (et embeddés par Pinecone), les chunks obsolètes supprimés.
+    path = manifest_path("Pinecone")
+    settings = {
+        **chunking_settings(text_splitter),
+        "embedding_model": f"pinecone-integrated:{PINECONE_INDEX_NAME}",
+    }
+    if chunks is not None:
+        # Même `source` (chemin relatif) que les chunks découpés par ce script
+        sources = {doc_key: metadata["source"] for doc_key, _, metadata in documents_data}
+        for doc_key, doc_chunks in chunks.items():
+            for chunk in doc_chunks:
+                chunk.metadata["source"] = sources.get(doc_key, chunk.metadata.get("source"))
+    plan = plan_index_update(
+        documents_data, load_manifest(path), text_splitter, settings,
+        full_rebuild=full_rebuild, deduplicator=make_deduplicator(text_splitter), chunks=chunks,
     )
-
-    langchain_chunks = []
-    for doc_data in tqdm(documents_data, desc="Division en chunks Langchain"):
-        split_docs = text_splitter.create_documents(
-            texts=[doc_data["content"]],
-            metadatas=[doc_data["metadata"]]
-        )
-        langchain_chunks.extend(split_docs)
-    
-    print(f"Créé {len(langchain_chunks)} chunks de texte (objets Document Langchain) pour Pinecone.")
-
-    # Supprimé : Partie Chroma
-    # if OPENAI_API_KEY:
-    #     print("\n--- Préparation pour Chroma (Embeddings OpenAI) ---")
-    #     openai_embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY, model="text-embedding-ada-002")
-    #     create_local_chroma_vectorstore(langchain_chunks, openai_embeddings)
-    # else:
-    #     print("\n--- Clé API OpenAI manquante, l'étape Chroma est sautée. ---")
-
-    # Uniquement Upsert vers Pinecone
-    upsert_to_pinecone_native(langchain_chunks)
+    print(f"Plan d'indexation Pinecone : {plan.summary()}")
+    if plan.dedup is not None:
+        # Index 'cyia' : 1024 dimensions (llama-text-embed-v2)
+        report_path = save_dedup_report("Pinecone", plan.dedup, 1024)
+        print(f"Quasi-doublons : {plan.dedup.summary(1024)} (détail : {report_path})")
+
+    pinecone_index = connect_pinecone_index()
+    if pinecone_index is None:
+        return False
+
+    if plan.full_rebuild:
+        # Sans manifeste, les identifiants des chunks déjà indexés sont inconnus : le namespace est vidé
+        print("Reconstruction complète : suppression des chunks existants du namespace par défaut...")
+        try:
+            pinecone_index.delete(delete_all=True, namespace="")
+        except Exception as e:
+            print(f"Namespace par défaut non vidé (probablement vide) : {e}")
+
+    document_hashes = {doc_key: entry["hash"] for doc_key, entry in plan.manifest["documents"].items()}
+    failed_documents = upsert_to_pinecone_native(pinecone_index, plan.to_add, document_hashes)
+    # Suppression après l'upsert : une page modifiée n'est jamais absente de l'index
+    if not delete_from_pinecone_native(pinecone_index, plan.to_delete):
+        print("Manifeste non mis à jour : les suppressions seront retentées à la prochaine exécution.")
+        return False
+    if failed_documents:
+        print(f"{len(failed_documents)} documents n'ont pas été entièrement indexés ; ils seront renvoyés à la prochaine exécution.")
+        mark_failed(plan.manifest, failed_documents)
+    save_manifest(path, plan.manifest)
+    # Les documents en échec sont renvoyés en entier : les lots des exécutions précédentes
+    # sont remplacés par ceux de celle-ci, ceux des documents désormais indexés retirés
+    prune_dead_letters(plan.manifest)
+    print(f"Nouvelles stats de l'index: {pinecone_index.describe_index_stats()}")
     
     print("\nPipeline de création de vectorstore Pinecone terminé.")
+    return not failed_documents
+
+def resume_dead_letters():
+    """Rejoue les lots en échec du fichier de lettres mortes, sans recalculer le plan d'indexation."""
+    path = manifest_path("Pinecone")
+    # Lots des documents réindexés, modifiés ou retirés depuis l'échec : ignorés
+    entries = prune_dead_letters(load_manifest(path))
+    if not entries:
+        print(f"Aucun lot en attente dans {DEAD_LETTER_PATH}.")
+        return
+    pinecone_index = connect_pinecone_index()
+    if pinecone_index is None:
+        return
+
+    records = [record for entry in entries for record in entry["records"]]
+    document_hashes = {doc_key: doc_hash for entry in entries for doc_key, doc_hash in entry["documents"].items()}
+    print(f"Reprise de {len(entries)} lots ({len(records)} chunks) depuis {DEAD_LETTER_PATH}")
+    # Le fichier est remplacé par les lots qui échouent encore
+    pending_path = DEAD_LETTER_PATH.with_name(DEAD_LETTER_PATH.name + ".resume")
+    pending_path.unlink(missing_ok=True)
+    _, failed_batches = ingest_records(
+        pinecone_index,
+        records,
+        namespace="",
+        batch_size=96,
+        tokens_per_minute=Config.PINECONE_TOKENS_PER_MINUTE,
+        concurrency=Config.PINECONE_UPSERT_CONCURRENCY,
+        max_retries=Config.PINECONE_MAX_RETRIES,
+        dead_letter_path=pending_path,
+        document_hashes=document_hashes,
+    )
+    if pending_path.exists():
+        os.replace(pending_path, DEAD_LETTER_PATH)
+    else:
+        DEAD_LETTER_PATH.unlink()
+
+    # Documents entièrement indexés : leur empreinte est rétablie dans le manifeste
+    still_failed = {record["filename"] for batch in failed_batches for record in batch}
+    manifest = load_manifest(path)
+    if manifest:
+        restored = 0
+        for doc_key, doc_hash in document_hashes.items():
+            entry = manifest["documents"].get(doc_key)
+            if doc_key not in still_failed and doc_hash and entry and entry["hash"] is None:
+                entry["hash"] = doc_hash
+                restored += 1
+        save_manifest(path, manifest)
+        print(f"{restored} documents marqués comme indexés dans le manifeste.")
+    print(f"Reprise terminée : {len(failed_batches)} lots encore en échec.")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Indexe (de façon incrémentale) les documents prétraités dans Pinecone.")
+    parser.add_argument("--full", action="store_true", help="Vide le namespace et réindexe tous les documents")
+    parser.add_argument("--resume", action="store_true", help="Rejoue uniquement les lots du fichier de lettres mortes")
+    args = parser.parse_args()
+    if args.resume:
+        resume_dead_letters()
+    else:
+        main(full_rebuild=args.full)
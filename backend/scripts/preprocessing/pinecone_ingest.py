@@ -0,0 +1,249 @@
+"""
+Envoi concurrent et limité en débit des chunks vers un index Pinecone à embedding intégré.
+
+Le quota de l'embedding intégré est exprimé en tokens par minute. Plutôt qu'une pause
+fixe entre deux lots (calculée sur une taille de chunk supposée), chaque lot réserve ses
+tokens réels (comptés avec tiktoken) dans un seau à jetons :
+    - plusieurs lots sont en vol en même temps (`concurrency`) tant que le seau le permet ;
+    - le débit est adaptatif : réduit à chaque 429 (Retry-After respecté), puis remonté
+      progressivement vers le quota configuré après des succès ;
+    - les erreurs transitoires (429, 5xx, réseau) sont retentées avec un backoff exponentiel
+      et une gigue aléatoire ;
+    - les lots en échec définitif sont ajoutés au fichier de lettres mortes (JSONL), rejoué
+      par `create_vectorstore_pinecone_native.py --resume`.
+"""
+
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception as e:  # tiktoken absent ou encodage non téléchargeable (hors-ligne)
+    print(f"Encodage tiktoken indisponible ({e}) : tokens estimés à 4 caractères par token")
+    _ENCODING = None
+
+
+def count_tokens(text: str) -> int:
+    if _ENCODING is None:
+        return len(text) // 4 + 1
+    return len(_ENCODING.encode(text, disallowed_special=()))
+
+
+class TokenBucket:
+    """Seau à jetons thread-safe dont le débit s'adapte aux réponses 429.
+
+    `capacity` borne la rafale (par défaut 10 secondes de débit) ; un lot plus gros que le
+    seau passe dès que celui-ci est plein (le solde devient négatif).
+    """
+
+    def __init__(self, tokens_per_minute: float, capacity: Optional[float] = None, min_rate_fraction: float = 0.1):
+        self.max_rate = tokens_per_minute / 60.0
+        self.rate = self.max_rate
+        self.min_rate = self.max_rate * min_rate_fraction
+        self.capacity = capacity or self.max_rate * 10
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: int) -> float:
+        """Bloque jusqu'à disposer de `tokens` ; retourne le temps d'attente."""
+        start = time.monotonic()
+        needed = min(tokens, self.capacity)
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = max(self._paused_until - now, (needed - self._tokens) / self.rate)
+                if wait <= 0:
+                    self._tokens -= tokens
+                    return now - start
+                self._condition.wait(wait)
+
+    def throttle(self, retry_after: Optional[float] = None) -> None:
+        """429 : débit réduit d'un quart, seau vidé et envoi suspendu `retry_after` secondes."""
+        with self._condition:
+            self.rate = max(self.min_rate, self.rate * 0.75)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            self._condition.notify_all()
+
+    def succeed(self) -> None:
+        """Succès : le débit remonte de 5 % du quota, sans le dépasser."""
+        with self._condition:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+def _status(error: Exception) -> Optional[int]:
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    return int(status) if status is not None else None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(error, "headers", None) or {}
+    try:
+        value = headers.get("Retry-After") or headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    status = _status(error)
+    # Sans statut HTTP : erreur réseau ou de connexion, retentée
+    return status is None or status == 429 or status >= 500
+
+
+def backoff_delay(attempt: int, base: float = 1.0, max_delay: float = 60.0) -> float:
+    """Backoff exponentiel avec gigue (« full jitter » borné à [50 %, 150 %])."""
+    return min(max_delay, base * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def _send_batch(index: Any, namespace: str, batch: List[Dict[str, Any]], tokens: int,
+                bucket: TokenBucket, max_retries: int) -> Tuple[bool, int, Optional[str]]:
+    """Envoie un lot avec retries ; retourne `(succès, tentatives, dernière erreur)`."""
+    for attempt in range(max_retries + 1):
+        bucket.acquire(tokens)
+        try:
+            index.upsert_records(namespace, batch)
+            bucket.succeed()
+            return True, attempt + 1, None
+        except Exception as e:  # Idéalement pinecone.exceptions.PineconeApiException
+            error = f"{type(e).__name__}: {e}"
+            if not _is_retryable(e) or attempt == max_retries:
+                return False, attempt + 1, error
+            retry_after = _retry_after(e)
+            if _status(e) == 429:
+                bucket.throttle(retry_after)
+            delay = retry_after if retry_after is not None else backoff_delay(attempt)
+            print(f"  Lot de {len(batch)} chunks : {error[:120]} ; nouvel essai dans {delay:.1f}s "
+                  f"(tentative {attempt + 2}/{max_retries + 1}, débit {bucket.rate * 60:,.0f} tokens/min)")
+            time.sleep(delay)
+    return False, max_retries + 1, "max retries exceeded"
+
+
+def make_batches(records: List[Dict[str, Any]], batch_size: int) -> List[Tuple[List[Dict[str, Any]], int]]:
+    """Lots de `batch_size` enregistrements au plus, avec leur nombre de tokens."""
+    batches = []
+    batch: List[Dict[str, Any]] = []
+    batch_tokens = 0
+    for record in records:
+        tokens = count_tokens(record["text"])
+        if len(batch) >= batch_size:
+            batches.append((batch, batch_tokens))
+            batch, batch_tokens = [], 0
+        batch.append(record)
+        batch_tokens += tokens
+    if batch:
+        batches.append((batch, batch_tokens))
+    return batches
+
+
+def ingest_records(
+    index: Any,
+    records: List[Dict[str, Any]],
+    *,
+    namespace: str = "",
+    batch_size: int = 96,
+    tokens_per_minute: float = 250_000,
+    concurrency: int = 4,
+    max_retries: int = 6,
+    dead_letter_path: Optional[Path] = None,
+    document_hashes: Optional[Dict[str, Optional[str]]] = None,
+) -> Tuple[List[List[Dict[str, Any]]], List[List[Dict[str, Any]]]]:
+    """Envoie `records` par lots concurrents ; retourne `(lots envoyés, lots en échec)`.
+
+    Les lots en échec sont ajoutés à `dead_letter_path` avec l'empreinte des documents
+    concernés (`document_hashes`, clé = `filename`), pour pouvoir être rejoués.
+    """
+    batches = make_batches(records, batch_size)
+    if not batches:
+        return [], []
+    bucket = TokenBucket(tokens_per_minute)
+    total_tokens = sum(tokens for _, tokens in batches)
+    print(f"Upsert de {len(records)} chunks ({total_tokens:,} tokens) en {len(batches)} lots, "
+          f"{concurrency} en parallèle, quota {tokens_per_minute:,.0f} tokens/min "
+          f"(durée minimale ~{max(0.0, total_tokens - bucket.capacity) / bucket.max_rate:.0f}s)")
+
+    start = time.time()
+    succeeded, failed = [], []
+    sent_tokens = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {
+            executor.submit(_send_batch, index, namespace, batch, tokens, bucket, max_retries): (batch, tokens)
+            for batch, tokens in batches
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            batch, tokens = futures[future]
+            ok, attempts, error = future.result()
+            if ok:
+                succeeded.append(batch)
+                sent_tokens += tokens
+            else:
+                failed.append(batch)
+                print(f"  Échec définitif d'un lot de {len(batch)} chunks après {attempts} tentatives : {error}")
+                if dead_letter_path is not None:
+                    append_dead_letter(dead_letter_path, batch, tokens, attempts, error, document_hashes)
+            if done % 10 == 0 or done == len(batches):
+                elapsed = time.time() - start
+                print(f"  {done}/{len(batches)} lots traités ({len(failed)} en échec), "
+                      f"{sent_tokens / max(elapsed, 1e-9) * 60:,.0f} tokens/min effectifs")
+    return succeeded, failed
+
+
+# ------------------------------------------------------------------
+# Lettres mortes
+# ------------------------------------------------------------------
+def append_dead_letter(path: Path, batch: List[Dict[str, Any]], tokens: int, attempts: int,
+                       error: Optional[str], document_hashes: Optional[Dict[str, Optional[str]]] = None) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    documents = sorted({record.get("filename", "") for record in batch})
+    entry = {
+        "failed_at": datetime.now().isoformat(),
+        "error": error,
+        "attempts": attempts,
+        "tokens": tokens,
+        "documents": {doc_key: (document_hashes or {}).get(doc_key) for doc_key in documents},
+        "records": batch,
+    }
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def load_dead_letters(path: Path) -> List[Dict[str, Any]]:
+    if not path.exists():
+        return []
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    print(f"Ligne illisible ignorée dans {path}")
+    return entries
+
+
+def rewrite_dead_letters(path: Path, entries: List[Dict[str, Any]]) -> None:
+    """Remplace le fichier de lettres mortes par `entries` (écriture atomique) ; le supprime s'il n'en reste aucune."""
+    if not entries:
+        path.unlink(missing_ok=True)
+        return
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    tmp_path.replace(path)
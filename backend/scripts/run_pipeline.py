@@ -1,14 +1,53 @@
-import sys
-import asyncio 
+"""
+Pipeline de données complet : crawl → nettoyage → découpage → embeddings → index → BM25.
+
+Les étapes sont déclarées avec leurs entrées, leurs sorties et leurs paramètres
+(scripts/pipeline.py) : une étape à jour est ignorée, et après une interruption le
+pipeline reprend à la première étape inachevée. Chaque étape reprend aussi son propre
+travail : le crawl ne redemande pas les pages déjà enregistrées par la tentative
+interrompue, les embeddings déjà calculés sont dans le cache disque
+(RAG/embedding_cache.py) et les index sont mis à jour de façon incrémentale
+(RAG/indexing.py). Les chunks sont découpés et dédupliqués une seule fois
+(`data/pipeline/chunks.jsonl`) pour tous les index.
+
+    python scripts/run_pipeline.py                    # étapes non à jour, backend BDD_PROVIDER
+    python scripts/run_pipeline.py --from clean       # sans crawl
+    python scripts/run_pipeline.py --target chroma pinecone --status
+"""
+
+import argparse
+import asyncio
+import os
 import subprocess
+import sys
+from functools import lru_cache
 from pathlib import Path
 
 APP_ROOT_DIR = Path(__file__).resolve().parent.parent # scripts/ -> backend/
 sys.path.insert(0, str(APP_ROOT_DIR))
 
-from scripts.scraping import all_pages_fast
-from scripts.preprocessing import preprocess
-from scripts.preprocessing import create_vectorstore 
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement depuis backend/.env
+load_dotenv(dotenv_path=APP_ROOT_DIR / ".env")
+
+from tqdm import tqdm
+
+from config import Config
+from RAG.indexing import (
+    chunk_corpus, chunking_settings, load_long_files, make_splitter, manifest_path, read_chunks,
+    save_dedup_report, write_chunks,
+)
+from RAG.local_index import CURRENT_FILE
+from scripts.pipeline import Pipeline, Stage, StageFailed
+from scripts.preprocessing.boilerplate import DEFAULT_MIN_FRACTION, DEFAULT_MIN_PAGES
+
+SCRIPTS_DIR = APP_ROOT_DIR / "scripts"
+RAG_DIR = APP_ROOT_DIR / "RAG"
+STATE_PATH = Config.PIPELINE_DIR / "state.json"
+CHUNKS_PATH = Config.PIPELINE_DIR / "chunks.jsonl"
+TARGETS = ("chroma", "local", "pinecone")
+EMBED_BATCH_SIZE = 512
 
 def ensure_playwright_browsers():
     """Installe Playwright ET ses dépendances système (librairies Linux)"""
@@ -24,28 +63,216 @@ def ensure_playwright_browsers():
         print("Échec de l'installation Playwright:", e)
         raise
 
-def run_scraping():
-    print("\n--- Étape 1: Scraping des données ---")
-    # S'assurer que Playwright est correctement installé
-    ensure_playwright_browsers()
-    asyncio.run(all_pages_fast.main()) 
-    print("--- Scraping terminé ---")
+@lru_cache(maxsize=1)
+def _embeddings():
+    # Même modèle (et même cache disque) que les requêtes du serveur
+    from RAG.embeddings import initialize_embeddings
+    return initialize_embeddings()
+
+def _all_chunks():
+    chunks = read_chunks(CHUNKS_PATH)
+    return [chunk for doc_key in sorted(chunks) for chunk in chunks[doc_key]]
+
+def build_pipeline(args) -> Pipeline:
+    """Étapes du pipeline, paramétrées par les options de la ligne de commande."""
+    targets = set(args.target)
+
+    # --- Crawl du site (sitemap) vers data/raw ---
+    def crawl(resume_since):
+        from scripts.scraping import all_pages_fast
+        # S'assurer que Playwright est correctement installé
+        ensure_playwright_browsers()
+        urls = all_pages_fast.get_pydantic_ai_docs_urls()
+        if not urls:
+            raise StageFailed("aucune URL trouvée dans le sitemap")
+        if resume_since:
+            # Pages enregistrées par la tentative interrompue : non redemandées
+            remaining = [
+                url for url in urls
+                if not (Config.RAW_DIR / f"{all_pages_fast.sanitize_filename(url)}.json").exists()
+                or (Config.RAW_DIR / f"{all_pages_fast.sanitize_filename(url)}.json").stat().st_mtime < resume_since
+            ]
+            print(f"{len(urls) - len(remaining)} pages déjà crawlées lors de la tentative interrompue, {len(remaining)} restantes")
+            urls = remaining
+        asyncio.run(all_pages_fast.crawl_parallel(urls, max_concurrent=args.crawl_concurrency))
+
+    # --- Nettoyage vers data/preprocessed/{long,short}_files ---
+    def clean(resume_since):
+        from scripts.preprocessing import preprocess
+        if not any(Config.RAW_DIR.glob("*.md")):
+            raise StageFailed(f"aucune page dans {Config.RAW_DIR}")
+        # Sorties régénérées en entier : une page retirée du site ou passée de longue à
+        # courte ne doit pas rester dans l'autre répertoire
+        for directory in (Config.LONG_FILES_DIR, Config.SHORT_FILES_DIR):
+            for path in list(directory.glob("*.md")) + list(directory.glob("*.json")):
+                path.unlink()
+        preprocess.main(workers=args.workers, boilerplate=args.boilerplate,
+                        min_pages=args.boilerplate_min_pages, min_fraction=args.boilerplate_min_fraction)
+        if preprocess.stats["long"] == 0:
+            raise StageFailed("aucun document long n'a été créé")
+
+    # --- Découpage et déduplication, communs à tous les index ---
+    def chunk(resume_since):
+        documents = load_long_files(Config.LONG_FILES_DIR)
+        if not documents:
+            raise StageFailed(f"aucun document dans {Config.LONG_FILES_DIR}")
+        chunks, report = chunk_corpus(documents)
+        write_chunks(CHUNKS_PATH, chunks)
+        print(f"{sum(len(doc_chunks) for doc_chunks in chunks.values())} chunks ({len(documents)} documents) dans {CHUNKS_PATH}")
+        if report is not None:
+            report_path = save_dedup_report("Pipeline", report)
+            print(f"Quasi-doublons : {report.summary()} (détail : {report_path})")
+
+    def chunk_params():
+        return {
+            **chunking_settings(make_splitter()),
+            "dedup": [Config.DEDUP_ENABLED, Config.DEDUP_THRESHOLD, Config.DEDUP_NUM_PERM, Config.DEDUP_BANDS],
+        }
+
+    # --- Embeddings dans le cache disque (repris lot par lot après une interruption) ---
+    def embed(resume_since):
+        embeddings = _embeddings()
+        texts = [chunk.page_content for chunk in _all_chunks()]
+        for start in tqdm(range(0, len(texts), EMBED_BATCH_SIZE), desc="Embeddings"):
+            embeddings.embed_documents(texts[start:start + EMBED_BATCH_SIZE])
+        print(f"{len(texts)} chunks : {embeddings.hits} embeddings déjà en cache, {embeddings.misses} calculés")
+
+    def embed_params():
+        embeddings = _embeddings()
+        return {"model": getattr(embeddings, "model", None), "dimensions": getattr(embeddings, "dimensions", None)}
+
+    def embed_enabled():
+        if not targets & {"chroma", "local"}:
+            return "Pinecone calcule lui-même les embeddings (embedding intégré)"
+        if not Config.EMBEDDING_CACHE_ENABLED:
+            return "cache des embeddings désactivé (EMBEDDING_CACHE_ENABLED=false), embeddings calculés à l'indexation"
+        return None
+
+    # --- Index vectoriels (mise à jour incrémentale, manifestes de RAG/indexing.py) ---
+    def index_chroma(resume_since):
+        from RAG.indexing import sync_chroma
+        plan = sync_chroma(_embeddings(), Config.VECTORSTORE_DIR, Config.LONG_FILES_DIR,
+                           full_rebuild=args.full, chunks=read_chunks(CHUNKS_PATH))
+        print(f"Index vectoriel à jour ({plan.summary()}) dans {Config.VECTORSTORE_DIR}")
+
+    def index_local(resume_since):
+        from RAG.indexing import sync_local_index
+        print(f"Index vectoriel local ({Config.LOCAL_INDEX_DTYPE}, quantification {Config.LOCAL_INDEX_QUANTIZATION})...")
+        plan = sync_local_index(_embeddings(), Config.LOCAL_INDEX_DIR, Config.LONG_FILES_DIR,
+                                full_rebuild=args.full, chunks=read_chunks(CHUNKS_PATH))
+        print(f"Index vectoriel local à jour ({plan.summary()}) dans {Config.LOCAL_INDEX_DIR}")
+
+    def index_pinecone(resume_since):
+        # Le module quitte le processus si les variables Pinecone sont absentes
+        from scripts.preprocessing import create_vectorstore_pinecone_native as pinecone_native
+        return pinecone_native.main(full_rebuild=args.full, chunks=read_chunks(CHUNKS_PATH))
+
+    def target_enabled(target):
+        return lambda: None if target in targets else f"backend non sélectionné (--target {' '.join(sorted(targets))})"
+
+    # --- Index lexical BM25 pour la recherche hybride ---
+    def bm25(resume_since):
+        from RAG.lexical import build_bm25_index
+        bm25_index = build_bm25_index(Config.LONG_FILES_DIR, chunks=_all_chunks())
+        print(f"Index BM25 créé ({len(bm25_index)} chunks) et sauvegardé dans {Config.BM25_INDEX_PATH}")
+
+    indexing_code = [RAG_DIR / "indexing.py", RAG_DIR / "embedding_cache.py"]
+    stages = [
+        Stage("crawl", crawl, description="Scraping des données",
+              outputs=[Config.RAW_DIR],
+              params=lambda: {"max_concurrent": args.crawl_concurrency},
+              code=[SCRIPTS_DIR / "scraping" / "all_pages_fast.py"],
+              max_age_hours=args.crawl_max_age),
+        Stage("clean", clean, description="Prétraitement des données",
+              inputs=[Config.RAW_DIR],
+              outputs=[Config.LONG_FILES_DIR, Config.SHORT_FILES_DIR],
+              params=lambda: {"boilerplate": args.boilerplate, "min_pages": args.boilerplate_min_pages,
+                              "min_fraction": args.boilerplate_min_fraction},
+              code=[SCRIPTS_DIR / "preprocessing" / name for name in ("preprocess.py", "cleaning.py", "boilerplate.py")]),
+        Stage("chunk", chunk, description="Découpage en chunks et quasi-doublons",
+              inputs=[Config.LONG_FILES_DIR],
+              outputs=[CHUNKS_PATH],
+              params=chunk_params,
+              code=[RAG_DIR / "chunking.py", RAG_DIR / "dedup.py", RAG_DIR / "indexing.py"]),
+        Stage("embed", embed, description="Calcul des embeddings",
+              inputs=[CHUNKS_PATH],
+              params=embed_params,
+              code=[RAG_DIR / "embeddings.py", RAG_DIR / "embedding_cache.py"],
+              enabled=embed_enabled),
+        Stage("index_chroma", index_chroma, description="Index vectoriel Chroma",
+              inputs=[CHUNKS_PATH],
+              outputs=[manifest_path("Chroma")],
+              required=[Config.VECTORSTORE_DIR / "chroma.sqlite3"],
+              params=lambda: {"persist_directory": str(Config.VECTORSTORE_DIR)},
+              code=indexing_code,
+              enabled=target_enabled("chroma")),
+        Stage("index_local", index_local, description="Index vectoriel local",
+              inputs=[CHUNKS_PATH],
+              outputs=[manifest_path("Local"), Config.LOCAL_INDEX_DIR / CURRENT_FILE],
+              params=lambda: {"dtype": Config.LOCAL_INDEX_DTYPE, "quantization": Config.LOCAL_INDEX_QUANTIZATION,
+                              "int8_rescore": Config.LOCAL_INDEX_INT8_RESCORE},
+              code=indexing_code + [RAG_DIR / "local_index.py"],
+              enabled=target_enabled("local")),
+        Stage("index_pinecone", index_pinecone, description="Index Pinecone (embedding intégré)",
+              inputs=[CHUNKS_PATH],
+              outputs=[manifest_path("Pinecone")],
+              params=lambda: {"index": os.getenv("PINECONE_INDEX_NAME", "cyia")},
+              code=[RAG_DIR / "indexing.py"] + [SCRIPTS_DIR / "preprocessing" / name for name in (
+                  "create_vectorstore_pinecone_native.py", "pinecone_ingest.py")],
+              enabled=target_enabled("pinecone")),
+        Stage("bm25", bm25, description="Index BM25",
+              # Les fichiers prétraités entrent dans l'empreinte vérifiée au démarrage du serveur
+              inputs=[CHUNKS_PATH, Config.LONG_FILES_DIR],
+              outputs=[Config.BM25_INDEX_PATH],
+              params=lambda: {"k1": Config.BM25_K1, "b": Config.BM25_B},
+              code=[RAG_DIR / "lexical.py"]),
+    ]
+    return Pipeline(stages, STATE_PATH, root=APP_ROOT_DIR)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Pipeline de données : seules les étapes qui ne sont pas à jour sont exécutées.")
+    parser.add_argument("--target", nargs="+", choices=TARGETS, default=[Config.BDD_PROVIDER.lower()],
+                        help=f"Index vectoriels à mettre à jour (défaut : BDD_PROVIDER={Config.BDD_PROVIDER})")
+    parser.add_argument("--from", dest="start", metavar="ÉTAPE", help="Commence à cette étape (ex. --from clean pour ne pas crawler)")
+    parser.add_argument("--only", nargs="+", metavar="ÉTAPE", help="N'exécute que ces étapes")
+    parser.add_argument("--force", nargs="+", metavar="ÉTAPE", default=[], help="Exécute ces étapes même si elles sont à jour ('all' : toutes)")
+    parser.add_argument("--full", action="store_true", help="Reconstruit les index vectoriels en entier (implique --force sur les étapes index_*)")
+    parser.add_argument("--status", action="store_true", help="Affiche l'état des étapes sans rien exécuter")
+    parser.add_argument("--dry-run", action="store_true", help="Affiche les étapes qui seraient exécutées")
+    parser.add_argument("--crawl-max-age", type=float, default=24.0,
+                        help="Âge (heures) au-delà duquel le site est crawlé à nouveau (défaut : 24)")
+    parser.add_argument("--crawl-concurrency", type=int, default=10, help="Pages crawlées en parallèle (défaut : 10)")
+    parser.add_argument("--workers", type=int, default=None, help="Processus de prétraitement (défaut : nombre de cœurs, 1 = séquentiel)")
+    parser.add_argument("--boilerplate", choices=("learned", "regex"), default="learned",
+                        help="Gabarit appris sur le corpus (défaut) ou règles regex historiques de cleaning.py")
+    parser.add_argument("--boilerplate-min-pages", type=int, default=DEFAULT_MIN_PAGES,
+                        help=f"Nombre minimal de pages où une ligne doit apparaître pour être du gabarit (défaut : {DEFAULT_MIN_PAGES})")
+    parser.add_argument("--boilerplate-min-fraction", type=float, default=DEFAULT_MIN_FRACTION,
+                        help=f"Fraction minimale des pages où une ligne doit apparaître (défaut : {DEFAULT_MIN_FRACTION})")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> bool:
+    args = parse_args(argv)
+    pipeline = build_pipeline(args)
+    if args.status:
+        print(f"État du pipeline ({STATE_PATH}) :")
+        for line in pipeline.status_lines():
+            print(line)
+        return True
 
-def run_preprocessing():
-    print("\n--- Étape 2: Prétraitement des données ---")
-    preprocess.main()
-    print("--- Prétraitement terminé ---")
+    stages = pipeline.select(only=args.only, start=args.start)
+    force = set(args.force)
+    if "all" in force:
+        force = {stage.name for stage in pipeline.stages}
+    if args.full:
+        force |= {f"index_{target}" for target in TARGETS}
 
-def run_vectorstore_creation():
-    print("\n--- Étape 3: Création du Vectorstore ---")
-    create_vectorstore.main() 
-    print("--- Création du Vectorstore terminée ---")
+    print("Démarrage du pipeline de données...")
+    if not pipeline.run(stages, force=force, dry_run=args.dry_run):
+        print(f"\nPipeline interrompu : relancez la commande pour reprendre (état : {STATE_PATH}).")
+        return False
+    print("\nPipeline de données terminé avec succès.")
+    return True
 
 if __name__ == "__main__":
-    print("Démarrage du pipeline de données complet...")
-    
-    run_scraping()
-    run_preprocessing()
-    run_vectorstore_creation()
-    
-    print("\nPipeline de données complet terminé avec succès.") 
\ No newline at end of file
+    sys.exit(0 if main() else 1)
@@ -408,9 +408,12 @@ export function useChat(initialChatId?: string | null) {
                 }
                 continue;
               }
-              
-              // Si on a des données de texte
-              if (jsonData.content) {
+
+              // Évaluation des sources émise dès qu'elle est prête, avant la fin du stream
+              if (jsonData.type === 'evaluation') {
+                if (jsonData.evaluation) evaluationData = jsonData.evaluation;
+              } else if (jsonData.content) {
+                // Si on a des données de texte
                 streamedText += jsonData.content;
               }
             } catch {